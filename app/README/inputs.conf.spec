@@ -0,0 +1,2 @@
+[databricks_run_status://<name>]
+account_name = <string> Configured account name whose runs submitted by databricksrun and databricksjob are updated.
@@ -9,4 +9,30 @@ proxy_rdns =
 use_for_oauth = 
 
 [logging]
-loglevel = 
\ No newline at end of file
+loglevel = 
+
+[performance]
+context_pool_enabled = <bool> Reuse execution contexts across the databricksquery searches of a Splunk user instead of creating a context per search.
+context_pool_max_per_cluster = <integer> Maximum number of pooled execution contexts per account, cluster and Splunk user.
+context_pool_idle_timeout = <integer> Time in seconds after which an unused pooled execution context is destroyed.
+cluster_cache_ttl = <integer> Time in seconds for which the cluster name to cluster ID map of a workspace is cached. Set 0 to disable the cache.
+config_cache_ttl = <integer> Time in seconds for which the resolved account and proxy configurations are cached. Set 0 to disable the cache.
+poll_initial_interval = <float> Time in seconds to wait before the second status poll of a Databricks operation.
+poll_max_interval = <float> Maximum time in seconds to wait between two status polls of a Databricks operation.
+poll_backoff_factor = <float> Factor by which the time between two status polls grows after each poll.
+http_pool_connections = <integer> Number of hosts for which HTTP connections are pooled and kept alive by each search process.
+http_pool_maxsize = <integer> Maximum number of pooled HTTP connections per host in each search process.
+fan_out_max_workers = <integer> Maximum number of accounts and clusters on which a databricksquery search given a list of them executes the query concurrently.
+result_cache_max_size_mb = <integer> Maximum size in MB of the databricksquery results cached on disk. The least recently used results are evicted beyond it.
+single_flight_enabled = <bool> Share the result of a databricksquery search with the identical searches started while it is executing, instead of executing the query again. Only the read-only statements are shared.
+arrow_results_enabled = <bool> Download the databricksquery results of SQL warehouses in the Arrow format when pyarrow is available, JSON otherwise.
+prefetch_queue_depth = <integer> Number of result chunks of a SQL warehouse downloaded ahead of the databricksquery output and held in memory. Set 0 to disable the prefetching.
+prefetch_spill_max_mb = <integer> Maximum size in MB of the prefetched result chunks spilled to a temporary file once prefetch_queue_depth chunks are held in memory.
+retry_budget = <integer> Maximum time in seconds spent waiting between the retries of a failed request to Databricks.
+retry_base_interval = <float> Minimum time in seconds to wait before retrying a failed request to Databricks.
+retry_max_interval = <float> Maximum time in seconds to wait before retrying a failed request to Databricks.
+circuit_breaker_threshold = <integer> Number of consecutive failed requests to a Databricks instance after which the requests to it fail fast. Set 0 to disable the circuit breaker.
+circuit_breaker_cooldown = <integer> Time in seconds during which the requests to an unhealthy Databricks instance fail fast.
+rate_limit_submit_per_second = <float> Maximum number of requests per second starting an execution (runs, jobs, commands, contexts and SQL statements) made to a Databricks instance by all the searches. Set 0 for no limit.
+rate_limit_default_per_second = <float> Maximum number of the other requests per second made to a Databricks instance by all the searches. Set 0 for no limit.
+max_concurrent_commands = <integer> Maximum number of databricksquery and databrickslookup queries executed at a time on a cluster or SQL warehouse of an account by all the searches. Set 0 for no limit.
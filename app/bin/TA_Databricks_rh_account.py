@@ -7,7 +7,7 @@ from splunktaucclib.rest_handler.endpoint import (
     SingleModel,
 )
 from splunktaucclib.rest_handler import admin_external, util
-from splunk_aoblib.rest_migration import ConfigMigrationHandler
+from databricks_rh_handler import DatabricksConfigHandler
 import splunk.rest as rest
 from xml.etree import cElementTree as ET
 from log_manager import setup_logging
@@ -79,6 +79,16 @@ fields = [
             max_len=500,
         )
     ),
+    field.RestField(
+        'warehouse_id',
+        required=False,
+        encrypted=False,
+        default='',
+        validator=validator.String(
+            min_len=0,
+            max_len=500,
+        )
+    ),
     field.RestField(
         'aad_access_token',
         required=False,
@@ -95,5 +105,5 @@ endpoint = SingleModel(
 if __name__ == '__main__':
     admin_external.handle(
         endpoint,
-        handler=ConfigMigrationHandler,
+        handler=DatabricksConfigHandler,
     )
\ No newline at end of file
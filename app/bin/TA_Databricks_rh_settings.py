@@ -9,7 +9,7 @@ from splunktaucclib.rest_handler.endpoint import (
     MultipleModel,
 )
 from splunktaucclib.rest_handler import admin_external, util
-from splunk_aoblib.rest_migration import ConfigMigrationHandler
+from databricks_rh_handler import DatabricksConfigHandler
 
 util.remove_http_proxy_env_vars()
 
@@ -110,5 +110,5 @@ endpoint = MultipleModel(
 if __name__ == '__main__':
     admin_external.handle(
         endpoint,
-        handler=ConfigMigrationHandler,
+        handler=DatabricksConfigHandler,
     )
@@ -0,0 +1,125 @@
+import ta_databricks_declare  # noqa: F401
+import contextlib
+import time
+import hashlib
+
+import databricks_const as const
+import databricks_common_utils as utils
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_circuit_breaker")
+
+# Copy of the state of each circuit read by this process, along with the time it was read
+_STATES = {}
+
+
+class CircuitBreaker(object):
+    """
+    A circuit breaker shared by all the search processes requesting a Databricks instance.
+
+    After a number of consecutive failures of the instance, the circuit opens and the requests fail fast
+    for a cooldown period instead of retrying against an unhealthy instance. Once the cooldown is over,
+    a single request probes the instance: its success closes the circuit, its failure opens it again.
+    The state is read from the state file at most once per CIRCUIT_BREAKER_REFRESH_INTERVAL_IN_SECONDS
+    by each process, hence the requests to a healthy instance do not access the file.
+    """
+
+    def __init__(self, databricks_instance, failure_threshold=None, cooldown=None):
+        """
+        Initialize CircuitBreaker object. Unspecified values are read from the performance settings.
+
+        :param databricks_instance: Databricks instance whose health is tracked
+        :param failure_threshold: Number of consecutive failures opening the circuit, 0 to disable the circuit
+        :param cooldown: Time in seconds during which the requests fail fast once the circuit is open
+        """
+        settings = utils.get_performance_settings()
+        self.databricks_instance = databricks_instance
+        self.failure_threshold = (
+            settings["circuit_breaker_threshold"] if failure_threshold is None else failure_threshold
+        )
+        self.cooldown = settings["circuit_breaker_cooldown"] if cooldown is None else cooldown
+        key = hashlib.sha256((databricks_instance or "").encode("utf-8")).hexdigest()
+        self.state_file = shared_state.JsonStateFile("{}.json".format(key), const.CIRCUIT_BREAKER_DIR)
+
+    def before_request(self):
+        """
+        Check that a request can be made to the instance, claiming the probe once the cooldown is over.
+
+        :return: None, raises an exception if the circuit is open
+        """
+        if self.failure_threshold <= 0:
+            return
+        state = self._get_state()
+        if state.get("failures", 0) < self.failure_threshold:
+            return
+
+        now = time.time()
+        if state.get("open_until", 0) <= now:
+            with self._update_state() as state:
+                if state.get("failures", 0) < self.failure_threshold:
+                    return
+                if state.get("open_until", 0) <= now:
+                    # Hold the circuit open for the other searches while this request probes the instance
+                    state["open_until"] = now + const.CIRCUIT_BREAKER_PROBE_TIMEOUT_IN_SECONDS
+                    _LOGGER.info("Probing the Databricks instance {}.".format(self.databricks_instance))
+                    return
+
+        raise Exception(
+            "Databricks instance {} is unavailable after {} consecutive failures. "
+            "Please try again after {} seconds.".format(
+                self.databricks_instance, state.get("failures"), int(max(1, state.get("open_until", 0) - now))
+            )
+        )
+
+    def record_success(self):
+        """Close the circuit after a successful request."""
+        if self.failure_threshold <= 0:
+            return
+        # Skip the state file in the usual case of a healthy instance
+        if not self._get_state().get("failures"):
+            return
+        try:
+            with self._update_state() as state:
+                if state.get("failures", 0) >= self.failure_threshold:
+                    _LOGGER.info("Databricks instance {} is available again.".format(self.databricks_instance))
+                state.clear()
+        except Exception as e:
+            _LOGGER.warning("Unable to update the circuit breaker state: {}".format(e))
+
+    def record_failure(self):
+        """Count a failed request, opening the circuit once the failure threshold is reached."""
+        if self.failure_threshold <= 0:
+            return
+        try:
+            with self._update_state() as state:
+                state["failures"] = state.get("failures", 0) + 1
+                if state["failures"] >= self.failure_threshold:
+                    state["open_until"] = time.time() + self.cooldown
+                    _LOGGER.warning(
+                        "Databricks instance {} failed {} consecutive times, failing fast for {} seconds.".format(
+                            self.databricks_instance, state["failures"], self.cooldown
+                        )
+                    )
+        except Exception as e:
+            _LOGGER.warning("Unable to update the circuit breaker state: {}".format(e))
+
+    def _get_state(self):
+        """
+        Get the state of the circuit, read from the state file if the copy of the process is outdated.
+
+        :return: dictionary of the number of consecutive failures and the time until which the circuit is open
+        """
+        state, read_time = _STATES.get(self.state_file.path, (None, 0))
+        now = time.time()
+        if state is None or not 0 <= now - read_time < const.CIRCUIT_BREAKER_REFRESH_INTERVAL_IN_SECONDS:
+            state = self.state_file.read()
+            _STATES[self.state_file.path] = (state, now)
+        return state
+
+    @contextlib.contextmanager
+    def _update_state(self):
+        """Update the state file under its lock, along with the copy of the process."""
+        with self.state_file.update() as state:
+            yield state
+            _STATES[self.state_file.path] = (dict(state), time.time())
@@ -1,28 +1,147 @@
 import ta_databricks_declare  # noqa: F401
+import random
 import requests
+import time
 import traceback
 
 import databricks_const as const
 import databricks_common_utils as utils
+import databricks_shared_state as shared_state
+from databricks_circuit_breaker import CircuitBreaker
+from databricks_rate_limiter import RateLimiter, get_endpoint_class
+from databricks_token_manager import AadTokenManager
 from log_manager import setup_logging
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
 
 from solnlib.utils import is_true
 
 _LOGGER = setup_logging("ta_databricks_com")
 
 
+class AdaptivePoller(object):
+    """
+    A class to pace the polls made while waiting on a Databricks state.
+
+    The interval between polls starts small and grows geometrically up to a cap, so that quick operations
+    are noticed quickly and long ones do not waste API calls. A Retry-After hint from the server is honoured.
+    """
+
+    def __init__(self, timeout, initial_interval=None, max_interval=None, backoff_factor=None):
+        """
+        Initialize AdaptivePoller object. Unspecified values are read from the performance settings.
+
+        :param timeout: Total time to wait in seconds
+        :param initial_interval: Time to wait in seconds before the second poll
+        :param max_interval: Maximum time to wait in seconds between two polls
+        :param backoff_factor: Factor by which the interval grows after each poll
+        """
+        settings = utils.get_performance_settings()
+        self.timeout = timeout
+        self.interval = initial_interval or settings["poll_initial_interval"]
+        self.max_interval = max_interval or settings["poll_max_interval"]
+        self.backoff_factor = backoff_factor or settings["poll_backoff_factor"]
+        self.retry_after = None
+        self.poll_count = 0
+        self.total_wait_time = 0
+
+    def __iter__(self):
+        """
+        Yield before each poll, sleeping between two polls. Stops once the timeout is reached.
+
+        :return: generator of the poll number
+        """
+        while True:
+            self.poll_count += 1
+            yield self.poll_count
+
+            seconds_to_timeout = self.timeout - self.total_wait_time
+            if seconds_to_timeout <= 0:
+                return
+
+            interval = self.interval
+            if isinstance(self.retry_after, (int, float)) and self.retry_after > interval:
+                interval = self.retry_after
+            self.retry_after = None
+            interval = min(interval, seconds_to_timeout)
+
+            _LOGGER.debug("Waiting {:.2f} seconds before the next poll.".format(interval))
+            time.sleep(interval)
+            self.total_wait_time += interval
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+
+    def log_metrics(self, operation):
+        """
+        Log the number of polls made and the time spent waiting.
+
+        :param operation: Name of the awaited operation
+        """
+        _LOGGER.info(
+            "Polling metrics for {}: poll_count={}, total_wait_time={:.2f}s.".format(
+                operation, self.poll_count, self.total_wait_time
+            )
+        )
+
+
+class JitteredRetry(object):
+    """
+    A class to pace the retries of a failed request within a total time budget.
+
+    The waits follow the decorrelated jitter backoff: each wait is drawn between the base interval and three
+    times the previous wait, up to a cap, hence the concurrent searches do not retry in lockstep.
+    A Retry-After hint from the server is honoured. Once the budget would be exceeded, no more retry is made.
+    """
+
+    def __init__(self, budget, base_interval=None, max_interval=None):
+        """
+        Initialize JitteredRetry object. Unspecified values are read from the performance settings.
+
+        :param budget: Total time in seconds to spend waiting between the retries
+        :param base_interval: Minimum time to wait in seconds before a retry
+        :param max_interval: Maximum time to wait in seconds before a retry
+        """
+        settings = utils.get_performance_settings()
+        self.budget = budget
+        self.base_interval = base_interval or settings["retry_base_interval"]
+        self.max_interval = max_interval or settings["retry_max_interval"]
+        self.interval = self.base_interval
+        self.retry_count = 0
+        self.total_wait_time = 0
+
+    def wait(self, retry_after=None):
+        """
+        Wait before the next retry.
+
+        :param retry_after: Time in seconds the server asked to wait, None if no hint is given
+        :return: True if the request is to be retried, False if the budget is exhausted
+        """
+        self.interval = min(self.max_interval, random.uniform(self.base_interval, self.interval * 3))
+        interval = self.interval
+        if isinstance(retry_after, (int, float)) and retry_after > interval:
+            interval = retry_after
+        if self.total_wait_time + interval > self.budget:
+            return False
+
+        self.retry_count += 1
+        _LOGGER.info("Retrying the request in {:.2f} seconds (retry {}).".format(interval, self.retry_count))
+        time.sleep(interval)
+        self.total_wait_time += interval
+        return True
+
+
 class DatabricksClient(object):
     """A class to establish connection with Databricks and get data using REST API."""
 
-    def __init__(self, account_name, session_key):
+    def __init__(self, account_name, session_key, username=None, databricks_configs=None, retry_budget=None):
         """Intialize DatabricksClient object to get data from Databricks platform.
 
         Args:
             session_key (object): Splunk session key
+            username (str): Splunk user running the search, resolved through REST when not provided
+            databricks_configs (dict): Configurations of the account, read through REST when not provided
+            retry_budget (int): Time in seconds to spend retrying a request, e.g. the command timeout,
+                capped by the retry_budget performance setting
         """
-        databricks_configs = utils.get_databricks_configs(session_key, account_name)
+        if databricks_configs is None:
+            databricks_configs = utils.get_databricks_configs(session_key, account_name)
         if not databricks_configs:
             raise Exception(
                 "Account '{}' not found. Please provide valid Databricks account.".format(
@@ -31,8 +150,13 @@ class DatabricksClient(object):
             )
         self.account_name = account_name
         databricks_instance = databricks_configs.get("databricks_instance")
+        self.databricks_instance = databricks_instance
         self.auth_type = databricks_configs.get("auth_type")
         self.session_key = session_key
+        max_retry_budget = utils.get_performance_settings()["retry_budget"]
+        self.retry_budget = min(retry_budget, max_retry_budget) if retry_budget else max_retry_budget
+        self.circuit_breaker = CircuitBreaker(databricks_instance)
+        self.rate_limiter = RateLimiter(databricks_instance)
         self.session = self.get_requests_retry_session()
         self.session.proxies = databricks_configs.get("proxy_uri")
         if self.session.proxies:
@@ -49,10 +173,13 @@ class DatabricksClient(object):
         if self.auth_type == 'PAT':
             self.databricks_token = databricks_configs.get("databricks_pat")
         else:
-            self.databricks_token = databricks_configs.get("aad_access_token")
             self.aad_client_id = databricks_configs.get("aad_client_id")
             self.aad_tenant_id = databricks_configs.get("aad_tenant_id")
             self.aad_client_secret = databricks_configs.get("aad_client_secret")
+            self.token_manager = AadTokenManager(
+                session_key, account_name, self.aad_tenant_id, self.aad_client_id, self.aad_client_secret
+            )
+            self.databricks_token = self.token_manager.get_token(databricks_configs.get("aad_access_token"))
 
         if not all([databricks_instance, self.databricks_token]):
             raise Exception(
@@ -65,7 +192,7 @@ class DatabricksClient(object):
             "User-Agent": "{}".format(const.USER_AGENT_CONST),
         }
         _LOGGER.debug(
-            "Request made to the Databricks from Splunk user: {}".format(utils.get_current_user(self.session_key))
+            "Request made to the Databricks from Splunk user: %s", utils.CurrentUser(self.session_key, username)
         )
         self.session.headers.update(self.request_headers)
         if self.session.proxies:
@@ -73,23 +200,15 @@ class DatabricksClient(object):
 
     def get_requests_retry_session(self):
         """
-        Create and return a session object with retry mechanism.
+        Create and return a session object. The failed requests are retried by databricks_api.
 
-        :param retries: Maximum number of retries to attempt
-        :param backoff_factor: Backoff factor used to calculate time between retries. e.g. For 10 - 5, 10, 20, 40,...
-        :param status_forcelist: A tuple containing the response status codes that should trigger a retry.
-        :param method_whiltelist: HTTP methods on which retry will be performed.
+        The session uses the HTTP adapter shared by the process, hence the connections to the Databricks
+        instance are kept alive and reused by all the API calls of the command.
 
         :return: Session Object
         """
         session = requests.Session()
-        retry = Retry(
-            total=const.RETRIES,
-            backoff_factor=const.BACKOFF_FACTOR,
-            status_forcelist=const.STATUS_FORCELIST,
-            method_whitelist=["POST", "GET"],
-        )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = utils.get_http_adapter()
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
@@ -105,34 +224,45 @@ class DatabricksClient(object):
         :return: response in the form of dictionary
         """
         run_again = True
+        self.last_response_headers = {}
         request_url = "{}{}".format(self.databricks_instance_url, endpoint)
+        retry = JitteredRetry(self.retry_budget)
+        endpoint_class = get_endpoint_class(method, endpoint)
         try:
             while True:
-                if method.lower() == "get":
-                    _LOGGER.info("Executing REST call: {}.".format(endpoint))
-                    response = self.session.get(request_url, params=args, timeout=self.session.timeout)
-                elif method.lower() == "post":
-                    _LOGGER.info("Executing REST call: {} Payload: {}.".format(endpoint, str(data)))
-                    response = self.session.post(request_url, params=args, json=data, timeout=self.session.timeout)
+                response = None
+                self.circuit_breaker.before_request()
+                self.rate_limiter.acquire(endpoint_class)
+                try:
+                    if method.lower() == "get":
+                        _LOGGER.info("Executing REST call: {}.".format(endpoint))
+                        response = self.session.get(request_url, params=args, timeout=self.session.timeout)
+                    elif method.lower() == "post":
+                        _LOGGER.info("Executing REST call: {} Payload: {}.".format(endpoint, str(data)))
+                        response = self.session.post(
+                            request_url, params=args, json=data, timeout=self.session.timeout
+                        )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    self.circuit_breaker.record_failure()
+                    _LOGGER.warning("REST call {} failed: {}".format(endpoint, e))
+                    if retry.wait():
+                        continue
+                    raise
+
                 status_code = response.status_code
-                if status_code == 403 and self.auth_type == "AAD" and run_again:
+                if status_code in const.CIRCUIT_BREAKER_STATUS_LIST:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if status_code in const.STATUS_FORCELIST:
+                    self.last_response_headers = getattr(response, "headers", None) or {}
+                    if retry.wait(self.get_retry_after()):
+                        continue
+                    response.raise_for_status()
+                elif status_code == 403 and self.auth_type == "AAD" and run_again:
                     response = None
                     run_again = False
-                    _LOGGER.info("Refreshing AAD token.")
-                    proxy_settings = utils.get_proxy_uri(self.session_key)  # Reinitializing the proxy
-                    db_token = utils.get_aad_access_token(
-                        self.session_key,
-                        self.account_name,
-                        self.aad_tenant_id,
-                        self.aad_client_id,
-                        self.aad_client_secret,
-                        proxy_settings,   # Using the reinit proxy. As proxy is getting updated on Line no: 43, 45
-                        retry=const.RETRIES,  # based on the condition and for this call we will always need proxy.
-                    )
-                    if isinstance(db_token, tuple):
-                        raise Exception(db_token[0])
-                    else:
-                        self.databricks_token = db_token
+                    self.databricks_token = self.token_manager.refresh(self.databricks_token)
                     self.request_headers["Authorization"] = "Bearer {}".format(
                         self.databricks_token
                     )
@@ -141,6 +271,7 @@ class DatabricksClient(object):
                     response.raise_for_status()
                 else:
                     break
+            self.last_response_headers = getattr(response, "headers", None) or {}
             return response.json()
         except Exception as e:
             msg = (
@@ -163,34 +294,142 @@ class DatabricksClient(object):
             _LOGGER.error(traceback.format_exc())
             raise Exception(msg)
 
+    def get_retry_after(self):
+        """
+        Method to get the Retry-After hint of the last API response.
+
+        :return: number of seconds to wait before the next request, None if no hint is given
+        """
+        retry_after = getattr(self, "last_response_headers", {}).get("Retry-After")
+        try:
+            return float(retry_after) if retry_after else None
+        except ValueError:
+            return None
+
+    def download_external_link(self, url):
+        """
+        Method to download a result chunk from a pre-signed external link.
+
+        The link already carries its own credentials, hence the Databricks token is not sent along.
+
+        :param url: Pre-signed URL of the result chunk
+        :return: content of the chunk in the form of list
+        """
+        _LOGGER.info("Downloading result chunk from external link.")
+        response = utils.get_http_session().get(
+            url,
+            proxies=self.session.proxies,
+            verify=self.session.verify,
+            timeout=self.session.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_external_link(self, url):
+        """
+        Method to open a pre-signed external link to read a result chunk as a stream.
+
+        :param url: Pre-signed URL of the result chunk
+        :return: file-like object of the content of the chunk
+        """
+        _LOGGER.info("Streaming result chunk from external link.")
+        response = utils.get_http_session().get(
+            url,
+            proxies=self.session.proxies,
+            verify=self.session.verify,
+            timeout=self.session.timeout,
+            stream=True,
+        )
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response.raw
+
     def get_cluster_id(self, cluster_name):
         """
         Method to get the cluster id on the basis of cluster name.
 
+        The cluster name to ID map of the workspace is cached for all the search processes, and the state
+        of a cached cluster is checked with clusters/get. The clusters are listed again when the cache is
+        older than the configured TTL, or when the cached cluster is not found or not running, e.g. once
+        it is terminated or recreated under the same name.
+
         :param cluster_name: Name of the cluster to get ID of
         :return: return the ID of cluster in the form of String
         """
-        cluster_id = None
-        resp = self.databricks_api("get", const.CLUSTER_ENDPOINT)
-        response = resp.get("clusters")
-        if response is None:
+        cluster_ids = self.get_cached_cluster_ids()
+        cluster_id = cluster_ids.get(cluster_name) if cluster_ids else None
+        if cluster_id:
+            try:
+                cluster = self.databricks_api("get", const.GET_CLUSTER_ENDPOINT, args={"cluster_id": cluster_id})
+            except Exception as e:
+                _LOGGER.info("Unable to get the cached cluster {}. Error: {}".format(cluster_id, e))
+                cluster = {}
+            state = (cluster.get("state") or "").lower()
+            if cluster.get("cluster_name") == cluster_name and state in ["running", "resizing"]:
+                return cluster_id
+            _LOGGER.info("Cached cluster {} is not running anymore, listing the clusters.".format(cluster_id))
+
+        cluster = self.list_clusters().get(cluster_name)
+        if not cluster:
             raise Exception(
                 "No cluster found with name {}. Provide a valid cluster name.".format(cluster_name)
             )
 
-        for r in response:
+        cluster_id, state = cluster
+        if state.lower() in ["running", "resizing"]:
+            return cluster_id
 
-            if r.get("cluster_name") == cluster_name:
+        raise Exception(
+            "Ensure that the cluster is in running state. Current cluster state is {}.".format(state)
+        )
 
-                if r.get("state").lower() in ["running", "resizing"]:
-                    cluster_id = r.get("cluster_id")
-                    return cluster_id
+    def list_clusters(self):
+        """
+        Method to list the clusters of the workspace and refresh the cluster cache.
 
-                raise Exception(
-                    "Ensure that the cluster is in running state. Current cluster state is {}.".format(
-                        r.get("state")
+        :return: dictionary of cluster name to a list of cluster ID and state
+        """
+        clusters = {}
+        resp = self.databricks_api("get", const.CLUSTER_ENDPOINT)
+        for r in resp.get("clusters") or []:
+            clusters.setdefault(r.get("cluster_name"), [r.get("cluster_id"), r.get("state")])
+
+        if utils.get_performance_settings()["cluster_cache_ttl"] > 0:
+            try:
+                with self._get_cluster_cache().update() as cache:
+                    cache.clear()
+                    cache.update(
+                        {
+                            "databricks_instance": self.databricks_instance,
+                            "fetched_time": time.time(),
+                            "cluster_ids": {name: cluster[0] for name, cluster in clusters.items()},
+                        }
                     )
-                )
-        raise Exception(
-            "No cluster found with name {}. Provide a valid cluster name.".format(cluster_name)
-        )
+            except Exception as e:
+                _LOGGER.warning("Unable to update the cluster cache: {}".format(e))
+        return clusters
+
+    def get_cached_cluster_ids(self):
+        """
+        Method to get the cached cluster IDs of the workspace.
+
+        :return: dictionary of cluster name to cluster ID, None if not cached or expired
+        """
+        cache_ttl = utils.get_performance_settings()["cluster_cache_ttl"]
+        if cache_ttl <= 0:
+            return None
+        try:
+            cache = self._get_cluster_cache().read()
+        except Exception as e:
+            _LOGGER.warning("Unable to read the cluster cache: {}".format(e))
+            return None
+        if cache.get("databricks_instance") != self.databricks_instance:
+            return None
+        if time.time() - cache.get("fetched_time", 0) > cache_ttl:
+            return None
+        _LOGGER.info("Using cached cluster list.")
+        return cache.get("cluster_ids")
+
+    def _get_cluster_cache(self):
+        """Get the state file holding the cluster cache of the account."""
+        return shared_state.JsonStateFile("{}.json".format(self.account_name), const.CLUSTER_CACHE_DIR)
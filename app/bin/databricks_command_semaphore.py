@@ -0,0 +1,99 @@
+import ta_databricks_declare  # noqa: F401
+import time
+import uuid
+
+import databricks_const as const
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_command_semaphore")
+
+
+class CommandSemaphore(object):
+    """
+    A semaphore limiting the commands executed at a time on a cluster or SQL warehouse by all the search processes.
+
+    The holders and the waiters of each semaphore are kept in arrival order in a state file. A search gets
+    a slot once fewer than max_in_flight searches arrived before it, hence the slots are granted in FIFO order.
+    The waiters refresh their entry while they wait, and a holder is assumed gone once its lease expires,
+    so that the searches killed while queued or executing do not hold a slot forever.
+    """
+
+    def __init__(self, key, max_in_flight, lease_timeout):
+        """
+        Initialize CommandSemaphore object.
+
+        :param key: Key identifying the account and the cluster or warehouse
+        :param max_in_flight: Maximum number of commands executed at a time
+        :param lease_timeout: Time in seconds after which a granted slot is considered abandoned
+        """
+        self.key = key
+        self.max_in_flight = max(1, max_in_flight)
+        self.lease_timeout = lease_timeout
+        self.store = shared_state.JsonStateFile(const.COMMAND_SEMAPHORE_STATE_FILE)
+        self.ticket = None
+
+    def acquire(self, timeout):
+        """
+        Get a slot, waiting in line for the searches which arrived before.
+
+        :param timeout: Time to wait in seconds for a slot
+        :return: time waited in seconds
+        """
+        self.ticket = uuid.uuid4().hex
+        start_time = time.time()
+        try:
+            while True:
+                position = self._poll()
+                if position < self.max_in_flight:
+                    waited = time.time() - start_time
+                    if position:
+                        _LOGGER.info("Command slot of {} granted after {:.2f} seconds.".format(self.key, waited))
+                    return waited
+                if time.time() - start_time >= timeout:
+                    raise Exception(
+                        "Timed out after {} seconds waiting for a command slot, {} commands are already "
+                        "executing or queued. Please try again later.".format(timeout, position)
+                    )
+                _LOGGER.debug("Queued for a command slot of {} at position {}.".format(self.key, position))
+                time.sleep(const.COMMAND_SEMAPHORE_POLL_INTERVAL_IN_SECONDS)
+        except BaseException:
+            # Error, or cancellation of the search
+            self.release()
+            raise
+
+    def release(self):
+        """Release the slot, or leave the line if the slot is not granted yet."""
+        ticket, self.ticket = self.ticket, None
+        if not ticket:
+            return
+        try:
+            with self.store.update() as state:
+                entries = state.get(self.key, [])
+                entries[:] = [entry for entry in entries if entry["ticket"] != ticket]
+                if not entries:
+                    state.pop(self.key, None)
+        except Exception as e:
+            # The slot expires with its lease
+            _LOGGER.warning("Unable to release the command slot of {}: {}".format(self.key, e))
+
+    def _poll(self):
+        """
+        Add or refresh the entry of the search and drop the expired entries.
+
+        :return: number of searches holding a slot or waiting for one ahead of this search
+        """
+        now = time.time()
+        with self.store.update() as state:
+            entries = [entry for entry in state.get(self.key, []) if entry["expires"] >= now]
+            position = next((index for index, e in enumerate(entries) if e["ticket"] == self.ticket), None)
+            if position is None:
+                position = len(entries)
+                entries.append({"ticket": self.ticket})
+            entry = entries[position]
+            if position < self.max_in_flight:
+                entry["expires"] = now + self.lease_timeout
+            else:
+                entry["expires"] = now + const.COMMAND_SEMAPHORE_WAITER_TIMEOUT_IN_SECONDS
+            state[self.key] = entries
+        return position
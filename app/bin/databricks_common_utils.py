@@ -3,14 +3,19 @@ import json
 import requests
 import traceback
 import re
+import signal
+import time
 from urllib.parse import urlencode
 import databricks_const as const
+import databricks_config_cache as config_cache
 from log_manager import setup_logging
 
 import splunk.rest as rest
+from splunk.clilib import cli_common as cli
 from six.moves.urllib.parse import quote
 from solnlib.utils import is_true
 from solnlib.credentials import CredentialManager, CredentialNotExistException
+from requests.adapters import HTTPAdapter
 import splunklib.results as results
 import splunklib.client as client
 
@@ -18,12 +23,65 @@ _LOGGER = setup_logging("ta_databricks_utils")
 APP_NAME = const.APP_NAME
 
 
+# HTTP transport shared by all the requests made by this process
+_HTTP_ADAPTER = None
+
+# Performance settings read by this process, along with the time they were read
+_PERFORMANCE_SETTINGS = None
+
+
+def get_http_adapter():
+    """
+    Get the HTTP adapter shared by all the sessions of the process.
+
+    The adapter holds the connection pools, hence the TLS connections are kept alive and reused
+    across the requests and the sessions instead of being established for each of them.
+
+    :return: HTTPAdapter object
+    """
+    global _HTTP_ADAPTER
+    if _HTTP_ADAPTER is None:
+        settings = get_performance_settings()
+        _HTTP_ADAPTER = HTTPAdapter(
+            pool_connections=settings["http_pool_connections"],
+            pool_maxsize=settings["http_pool_maxsize"],
+            max_retries=0,
+        )
+    return _HTTP_ADAPTER
+
+
+def get_http_session():
+    """
+    Get a session for a request of the process which is not made by a Databricks client.
+
+    A new session is created for each request, hence the cookies of a caller, e.g. a tenant or a user,
+    are never sent along with the requests of the other callers. The sessions share the HTTP adapter
+    of the process, which pools the connections. Headers, proxies and SSL verification are to be passed
+    per request.
+
+    :return: Session object
+    """
+    session = requests.Session()
+    adapter = get_http_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def get_databricks_configs(session_key, account_name):
     """
     Get configuration details from ta_databricks_settings.conf.
 
+    The resolved configurations are cached for config_cache_ttl seconds and invalidated when they are modified.
+
     :return: dictionary with Databricks fields and values
     """
+    cache_ttl = get_performance_settings()["config_cache_ttl"]
+    if cache_ttl > 0:
+        configs_dict = config_cache.get(account_name, cache_ttl)
+        if configs_dict:
+            return configs_dict
+
     _LOGGER.info("Reading configuration file.")
     configs_dict = None
     value = {"name": account_name}
@@ -35,31 +93,58 @@ def get_databricks_configs(session_key, account_name):
             raiseAllErrors=True,
         )
         configs_dict = json.loads(response_content)
+        _set_proxy_uri(configs_dict)
 
-        # Setting proxy uri
-        if all(
-            [
-                is_true(configs_dict.get("proxy_enabled")),
-                configs_dict.get("proxy_url"),
-                configs_dict.get("proxy_type"),
-            ]
-        ):
-            http_uri = configs_dict["proxy_url"]
+        if cache_ttl > 0:
+            config_cache.put(account_name, configs_dict)
 
-            if configs_dict.get("proxy_port"):
-                http_uri = "{}:{}".format(http_uri, configs_dict.get("proxy_port"))
+    except Exception as e:
+        _LOGGER.error(
+            "Databricks Error : Error occured while fetching databricks account and proxy configs - {}".format(
+                e
+            )
+        )
+        _LOGGER.debug(
+            "Databricks Error : Error occured while fetching databricks account and proxy configs - {}".format(
+                traceback.format_exc()
+            )
+        )
+    return configs_dict
 
-            if configs_dict.get("proxy_username") and configs_dict.get("proxy_password"):
-                http_uri = "{}:{}@{}".format(
-                    quote(configs_dict["proxy_username"], safe=""),
-                    quote(configs_dict["proxy_password"], safe=""),
-                    http_uri,
-                )
 
-            http_uri = "{}://{}".format(configs_dict["proxy_type"], http_uri)
-            proxy_data = {"http": http_uri, "https": http_uri, "use_for_oauth": configs_dict.get("use_for_oauth")}
-            configs_dict["proxy_uri"] = proxy_data
+def get_databricks_configs_bulk(session_key, account_names):
+    """
+    Get configuration details of many accounts with a single request.
 
+    :param session_key: Splunk session key
+    :param account_names: List of account names
+    :return: dictionary with account name as key and dictionary with Databricks fields and values as value.
+             Accounts that do not exist are not included.
+    """
+    cache_ttl = get_performance_settings()["config_cache_ttl"]
+    configs = {}
+    for account_name in account_names:
+        configs_dict = config_cache.get(account_name, cache_ttl) if cache_ttl > 0 else None
+        if configs_dict:
+            configs[account_name] = configs_dict
+
+    missing_names = [account_name for account_name in account_names if account_name not in configs]
+    if not missing_names:
+        return configs
+
+    _LOGGER.info("Reading configuration file for {} account(s).".format(len(missing_names)))
+    try:
+        _, response_content = rest.simpleRequest(
+            "/databricks_get_credentials",
+            sessionKey=session_key,
+            postargs={"names": ",".join(missing_names)},
+            raiseAllErrors=True,
+        )
+        for account_name, configs_dict in json.loads(response_content).items():
+            _set_proxy_uri(configs_dict)
+            if cache_ttl > 0:
+                config_cache.put(account_name, configs_dict)
+            configs[account_name] = configs_dict
     except Exception as e:
         _LOGGER.error(
             "Databricks Error : Error occured while fetching databricks account and proxy configs - {}".format(
@@ -71,7 +156,82 @@ def get_databricks_configs(session_key, account_name):
                 traceback.format_exc()
             )
         )
-    return configs_dict
+    return configs
+
+
+def _set_proxy_uri(configs_dict):
+    """
+    Set the proxy uri in the configurations if the proxy is enabled.
+
+    :param configs_dict: dictionary with Databricks fields and values
+    """
+    if all(
+        [
+            is_true(configs_dict.get("proxy_enabled")),
+            configs_dict.get("proxy_url"),
+            configs_dict.get("proxy_type"),
+        ]
+    ):
+        http_uri = configs_dict["proxy_url"]
+
+        if configs_dict.get("proxy_port"):
+            http_uri = "{}:{}".format(http_uri, configs_dict.get("proxy_port"))
+
+        if configs_dict.get("proxy_username") and configs_dict.get("proxy_password"):
+            http_uri = "{}:{}@{}".format(
+                quote(configs_dict["proxy_username"], safe=""),
+                quote(configs_dict["proxy_password"], safe=""),
+                http_uri,
+            )
+
+        http_uri = "{}://{}".format(configs_dict["proxy_type"], http_uri)
+        proxy_data = {"http": http_uri, "https": http_uri, "use_for_oauth": configs_dict.get("use_for_oauth")}
+        configs_dict["proxy_uri"] = proxy_data
+
+
+def get_performance_settings():
+    """
+    Get performance settings from the [performance] stanza of ta_databricks_settings.conf.
+
+    The settings are read once per PERFORMANCE_SETTINGS_CACHE_TTL_IN_SECONDS by each process,
+    as they are needed by each request made to Databricks.
+
+    :return: dictionary with the settings, falling back to the default value of each setting
+    """
+    global _PERFORMANCE_SETTINGS
+    now = time.time()
+    ttl = const.PERFORMANCE_SETTINGS_CACHE_TTL_IN_SECONDS
+    if _PERFORMANCE_SETTINGS is None or now - _PERFORMANCE_SETTINGS[1] >= ttl:
+        _PERFORMANCE_SETTINGS = (read_performance_settings(), now)
+    return dict(_PERFORMANCE_SETTINGS[0])
+
+
+def read_performance_settings():
+    """
+    Read performance settings from the [performance] stanza of ta_databricks_settings.conf.
+
+    :return: dictionary with the settings, falling back to the default value of each setting
+    """
+    settings = dict(const.PERFORMANCE_DEFAULTS)
+    try:
+        stanza = cli.getConfStanza("ta_databricks_settings", "performance")
+    except Exception as e:
+        _LOGGER.debug("Unable to read performance settings, using defaults. Error: {}".format(e))
+        return settings
+
+    for key, default in const.PERFORMANCE_DEFAULTS.items():
+        value = stanza.get(key)
+        if not isinstance(value, str) or not value.strip():
+            continue
+        try:
+            settings[key] = is_true(value) if isinstance(default, bool) else type(default)(value.strip())
+        except ValueError:
+            _LOGGER.warning(
+                "Invalid value '{}' for performance setting '{}', using default value {}.".format(
+                    value, key, default
+                )
+            )
+    return settings
 
 
 def save_databricks_aad_access_token(account_name, session_key, access_token, client_sec):
@@ -94,6 +254,7 @@ def save_databricks_aad_access_token(account_name, session_key, access_token, cl
             postargs=new_creds,
             raiseAllErrors=True,
         )
+        config_cache.invalidate()
         _LOGGER.info("Saved AAD access token successfully.")
     except Exception as e:
         _LOGGER.error("Exception while saving AAD access token: {}".format(str(e)))
@@ -188,7 +349,7 @@ def get_proxy_uri(session_key):
         return None
 
 
-def update_kv_store_collection(splunkd_uri, kv_collection_name, session_key, kv_log_info):
+def update_kv_store_collection(splunkd_uri, kv_collection_name, session_key, kv_log_info, key=None):
     """
     Create and update KV store collection.
 
@@ -196,6 +357,7 @@ def update_kv_store_collection(splunkd_uri, kv_collection_name, session_key, kv_
     :param kv_collection_name: KV Store collection to create/update
     :param session_key: Splunk Session Key
     :param kv_log_info: Information that needs to be updated
+    :param key: Key of the record to update, a record is added when not provided
     :return: Dictionary with updated value of KV Store update status
     """
     header = {
@@ -214,11 +376,13 @@ def update_kv_store_collection(splunkd_uri, kv_collection_name, session_key, kv_
         const.APP_NAME,
         kv_collection_name,
     )
+    if key:
+        kv_update_url = "{}/{}".format(kv_update_url, quote(key, safe=""))
 
     _LOGGER.info(
         "Executing REST call, URL: {}, Payload: {}.".format(kv_update_url, str(kv_log_info))
     )
-    response = requests.post(
+    response = get_http_session().post(
         kv_update_url,
         headers=header,
         data=json.dumps(kv_log_info),
@@ -236,6 +400,29 @@ def update_kv_store_collection(splunkd_uri, kv_collection_name, session_key, kv_
     return kv_log_info
 
 
+def handle_termination_signals():
+    """
+    Raise an exception in the main thread when splunkd terminates the search process.
+
+    splunkd signals the search process when the search is cancelled or finalized. Raising lets the command
+    release the resources it holds on Databricks before exiting. Further signals are ignored so that the
+    clean-up is not interrupted.
+    """
+    def _raise(signum, frame):
+        for name in ("SIGTERM", "SIGINT", "SIGBREAK"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), signal.SIG_IGN)
+        raise Exception("Search was cancelled or finalized (signal {}).".format(signum))
+
+    for name in ("SIGTERM", "SIGINT", "SIGBREAK"):
+        if hasattr(signal, name):
+            try:
+                signal.signal(getattr(signal, name), _raise)
+            except ValueError:
+                # Signal handlers can only be set from the main thread
+                _LOGGER.debug("Unable to handle {} outside of the main thread.".format(name))
+
+
 def format_to_json_parameters(params):
     """
     Split the provided string by `||` and make dictionary of that splitted key-value pair string.
@@ -292,6 +479,36 @@ def get_mgmt_port(session_key, logger):
     return content
 
 
+class CurrentUser(object):
+    """
+    Lazily evaluated identity of the Splunk user owning a session key.
+
+    The user is resolved through REST only when the object is formatted, i.e. when a log record
+    including it is emitted, and is then cached for the lifetime of the process.
+    """
+
+    def __init__(self, session_key, username=None):
+        """
+        Initialize CurrentUser object.
+
+        :param session_key: Splunk session key
+        :param username: Name of the user if already known, e.g. from the search info
+        """
+        self.session_key = session_key
+        if username:
+            _CURRENT_USERS[session_key] = username
+
+    def __str__(self):
+        """Get the name of the user, resolving it on first use."""
+        if self.session_key not in _CURRENT_USERS:
+            _CURRENT_USERS[self.session_key] = get_current_user(self.session_key)
+        return str(_CURRENT_USERS[self.session_key])
+
+
+# Names of the users resolved by this process, keyed by session key
+_CURRENT_USERS = {}
+
+
 def get_current_user(session_key):
     """Get current logged in user."""
     kwargs_oneshot = {"output_mode": "json"}
@@ -348,7 +565,7 @@ def get_aad_access_token(
         "Content-Type": "application/x-www-form-urlencoded",
         "User-Agent": "{}".format(const.USER_AGENT_CONST),
     }
-    _LOGGER.debug("Request made to the Databricks from Splunk user: {}".format(get_current_user(session_key)))
+    _LOGGER.debug("Request made to the Databricks from Splunk user: %s", CurrentUser(session_key))
     data_dict = {"grant_type": "client_credentials", "scope": const.SCOPE}
 
     data_dict["client_id"] = aad_client_id
@@ -360,7 +577,7 @@ def get_aad_access_token(
 
     while retry:
         try:
-            resp = requests.post(
+            resp = get_http_session().post(
                 token_url,
                 headers=headers,
                 data=data_encoded,
@@ -0,0 +1,163 @@
+import ta_databricks_declare  # noqa: F401
+import os
+import copy
+import hmac
+import json
+import time
+import hashlib
+
+import databricks_const as const
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_config_cache")
+
+# Configs resolved by this process, keyed by account name
+_MEMORY_CACHE = {}
+
+
+def get(account_name, ttl):
+    """
+    Get the cached account and proxy configs of the account.
+
+    The configs resolved by this process are looked up first, then the encrypted configs shared by all the processes.
+
+    :param account_name: Name of the Databricks account
+    :param ttl: Time in seconds for which the configs are valid
+    :return: dictionary with Databricks fields and values, None if not cached or expired
+    """
+    generation = get_generation()
+    entry = _MEMORY_CACHE.get(account_name)
+    if not _is_valid(entry, generation, ttl):
+        entry = _read_entry(account_name)
+        if not _is_valid(entry, generation, ttl):
+            return None
+        _MEMORY_CACHE[account_name] = entry
+    _LOGGER.debug("Using cached configurations of account {}.".format(account_name))
+    return copy.deepcopy(entry["configs"])
+
+
+def put(account_name, configs):
+    """
+    Cache the account and proxy configs of the account.
+
+    :param account_name: Name of the Databricks account
+    :param configs: dictionary with Databricks fields and values
+    """
+    entry = {
+        "generation": get_generation(),
+        "fetched_time": time.time(),
+        "configs": copy.deepcopy(configs),
+    }
+    _MEMORY_CACHE[account_name] = entry
+
+    key = _get_key()
+    if not key:
+        return
+    try:
+        shared_state.atomic_write(_get_entry_path(account_name), _encrypt(key, json.dumps(entry).encode("utf-8")))
+    except Exception as e:
+        _LOGGER.warning("Unable to cache the configurations of account {}: {}".format(account_name, e))
+
+
+def invalidate():
+    """Invalidate the cached configs of all the accounts, in all the processes."""
+    _MEMORY_CACHE.clear()
+    try:
+        with _get_generation_file().update() as state:
+            state["generation"] = state.get("generation", 0) + 1
+        cache_dir = shared_state.get_state_dir(const.CONFIG_CACHE_DIR)
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(".bin"):
+                os.remove(os.path.join(cache_dir, file_name))
+        _LOGGER.info("Invalidated the configuration cache.")
+    except Exception as e:
+        _LOGGER.error("Unable to invalidate the configuration cache: {}".format(e))
+
+
+def _is_valid(entry, generation, ttl):
+    """Check whether the cache entry belongs to the current generation and is not expired."""
+    if not entry or entry.get("generation") != generation:
+        return False
+    return time.time() - entry.get("fetched_time", 0) <= ttl
+
+
+def _read_entry(account_name):
+    """Read and decrypt the cache entry of the account shared by all the processes."""
+    key = _get_key()
+    path = _get_entry_path(account_name)
+    if not key or not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return json.loads(_decrypt(key, f.read()).decode("utf-8"))
+    except Exception as e:
+        _LOGGER.warning("Unable to read the cached configurations of account {}: {}".format(account_name, e))
+        return None
+
+
+def get_generation():
+    """Get the generation of the cache, incremented each time the configurations are modified."""
+    return _get_generation_file().read().get("generation", 0)
+
+
+def _get_generation_file():
+    """Get the state file holding the generation of the cache."""
+    return shared_state.JsonStateFile(const.CONFIG_CACHE_GENERATION_FILE, const.CONFIG_CACHE_DIR)
+
+
+def _get_entry_path(account_name):
+    """Get the path of the file holding the encrypted cache entry of the account."""
+    file_name = "{}.bin".format(hashlib.sha256(account_name.encode("utf-8")).hexdigest())
+    return os.path.join(shared_state.get_state_dir(const.CONFIG_CACHE_DIR), file_name)
+
+
+def _get_key():
+    """
+    Derive the encryption key of the cache from the splunk.secret of the instance.
+
+    :return: key in the form of bytes, None if the configs can not be encrypted
+    """
+    try:
+        with open(os.path.join(shared_state.get_splunk_home(), "etc", "auth", "splunk.secret"), "rb") as f:
+            return hashlib.sha256(f.read().strip()).digest()
+    except (IOError, OSError) as e:
+        _LOGGER.debug("Unable to read splunk.secret, configurations are cached in memory only. Error: {}".format(e))
+        return None
+
+
+def _encrypt(key, data):
+    """
+    Encrypt and authenticate the data with the standard library only, as no cipher module ships with the add-on.
+
+    The data is XORed with an HMAC-SHA256 keystream in counter mode, seeded by a random nonce, then the nonce and the
+    ciphertext are authenticated with HMAC-SHA256 (encrypt-then-MAC), each with its own key derived from the key.
+    """
+    nonce = os.urandom(const.CONFIG_CACHE_NONCE_SIZE)
+    ciphertext = _xor_keystream(key, nonce, data)
+    return nonce + _get_tag(key, nonce, ciphertext) + ciphertext
+
+
+def _decrypt(key, data):
+    """Decrypt the data encrypted with _encrypt, verifying that it was not tampered with."""
+    nonce_size = const.CONFIG_CACHE_NONCE_SIZE
+    nonce, tag, ciphertext = data[:nonce_size], data[nonce_size:nonce_size + 32], data[nonce_size + 32:]
+    if not hmac.compare_digest(tag, _get_tag(key, nonce, ciphertext)):
+        raise Exception("The cached configurations failed the integrity check.")
+    return _xor_keystream(key, nonce, ciphertext)
+
+
+def _xor_keystream(key, nonce, data):
+    """XOR the data with the keystream of the nonce, which both encrypts and decrypts it."""
+    encryption_key = hmac.new(key, b"encryption", hashlib.sha256).digest()
+    keystream = b"".join(
+        hmac.new(encryption_key, nonce + counter.to_bytes(8, "big"), hashlib.sha256).digest()
+        for counter in range((len(data) + 31) // 32)
+    )
+    return bytes(byte ^ key_byte for byte, key_byte in zip(data, keystream))
+
+
+def _get_tag(key, nonce, ciphertext):
+    """Get the authentication tag of the nonce and the ciphertext."""
+    authentication_key = hmac.new(key, b"authentication", hashlib.sha256).digest()
+    return hmac.new(authentication_key, nonce + ciphertext, hashlib.sha256).digest()
@@ -2,14 +2,23 @@ import os
 
 # API Endpoints
 CLUSTER_ENDPOINT = "/api/2.0/clusters/list"
+GET_CLUSTER_ENDPOINT = "/api/2.0/clusters/get"
 CONTEXT_ENDPOINT = "/api/1.2/contexts/create"
 CONTEXT_DESTROY_ENDPOINT = "/api/1.2/contexts/destroy"
+CONTEXT_STATUS_ENDPOINT = "/api/1.2/contexts/status"
 COMMAND_ENDPOINT = "/api/1.2/commands/execute"
 STATUS_ENDPOINT = "/api/1.2/commands/status"
+COMMAND_CANCEL_ENDPOINT = "/api/1.2/commands/cancel"
 GET_RUN_ENDPOINT = "/api/2.0/jobs/runs/get"
+GET_RUN_OUTPUT_ENDPOINT = "/api/2.0/jobs/runs/get-output"
+RUNS_LIST_ENDPOINT = "/api/2.0/jobs/runs/list"
 RUN_SUBMIT_ENDPOINT = "/api/2.0/jobs/runs/submit"
 EXECUTE_JOB_ENDPOINT = "/api/2.0/jobs/run-now"
 GET_JOB_ENDPOINT = "/api/2.0/jobs/get"
+STATEMENT_ENDPOINT = "/api/2.0/sql/statements/"
+STATEMENT_STATUS_ENDPOINT = "/api/2.0/sql/statements/{}"
+STATEMENT_CANCEL_ENDPOINT = "/api/2.0/sql/statements/{}/cancel"
+STATEMENT_CHUNK_ENDPOINT = "/api/2.0/sql/statements/{}/result/chunks/{}"
 AAD_TOKEN_ENDPOINT = "https://login.microsoftonline.com/{}/oauth2/v2.0/token"
 
 # Azure Databricks scope
@@ -21,21 +30,124 @@ APP_NAME = __file__.split(os.sep)[-3]
 # KV Store collection name
 KV_COLLECTION_NAME_SUBMIT_RUN = "databricks_submit_run_log"
 KV_COLLECTION_NAME_EXECUTE_JOB = "databricks_execute_job_log"
+KV_COLLECTION_NAME_EXECUTION_CONTEXT = "databricks_execution_context"
 
 REQUIRED_ROLES = ['databricks_user', 'databricks_admin']
 
 # Command execution configs
 COMMAND_TIMEOUT_IN_SECONDS = 300
-COMMAND_SLEEP_INTERVAL_IN_SECONDS = 3
+
+# Run completion configs
+RUN_WAIT_TIMEOUT_IN_SECONDS = 3600
+RUN_TERMINAL_STATES = ["TERMINATED", "SKIPPED", "INTERNAL_ERROR"]
+RUNS_LIST_PAGE_SIZE = 25
+RUN_STATUS_CHECKPOINT_DIR = "run_status"
+RUN_STATUS_LOOKBACK_IN_SECONDS = 7 * 86400
+RUN_STATUS_CLOCK_SKEW_IN_SECONDS = 300
+RUN_STATUS_UNMATCHED_TIMEOUT_IN_SECONDS = 86400
+KV_BATCH_SAVE_SIZE = 500
+
+# SQL statement execution configs
+STATEMENT_WAIT_TIMEOUT_IN_SECONDS = 10
+STATEMENT_DISPOSITION = "EXTERNAL_LINKS"
+STATEMENT_FORMAT = "JSON_ARRAY"
+STATEMENT_ARROW_FORMAT = "ARROW_STREAM"
+
+# Lookup configs
+LOOKUP_BATCH_SIZE = 500
+LOOKUP_MAX_BATCH_SIZE = 10000
+LOOKUP_CACHE_TTL_IN_SECONDS = 300
+LOOKUP_CACHE_MAX_ENTRIES = 100000
+
+# Time range placeholders of the query
+EARLIEST_PLACEHOLDER = "{{earliest}}"
+LATEST_PLACEHOLDER = "{{latest}}"
+
+# Multi-account execution configs
+FAN_OUT_QUEUE_SIZE = 10000
+FAN_OUT_QUEUE_TIMEOUT_IN_SECONDS = 1
+
+# Shared state configs
+STATE_LOCK_TIMEOUT_IN_SECONDS = 30
+STATE_LOCK_RETRY_INTERVAL_IN_SECONDS = 0.05
+CONTEXT_POOL_STATE_FILE = "context_pool.json"
+CONTEXT_POOL_LEASE_GRACE_IN_SECONDS = 60
+CONTEXT_REAP_GRACE_IN_SECONDS = 300
+CONTEXT_REGISTRY_RETENTION_IN_SECONDS = 86400
+CLUSTER_CACHE_DIR = "cluster_cache"
+CONFIG_CACHE_DIR = "config_cache"
+CONFIG_CACHE_GENERATION_FILE = "generation.json"
+CONFIG_CACHE_NONCE_SIZE = 16
+CREDENTIALS_CACHE_TTL_IN_SECONDS = 60
+AAD_TOKEN_LOCK_DIR = "aad_token"
+AAD_TOKEN_REFRESH_MARGIN_IN_SECONDS = 300
+RESULT_CACHE_DIR = "result_cache"
+RESULT_CACHE_STATS_FILE = "stats.json"
+RESULT_CACHE_MAX_ENTRY_ROWS = 100000
+SINGLE_FLIGHT_DIR = "single_flight"
+SINGLE_FLIGHT_RETENTION_IN_SECONDS = 3600
+SINGLE_FLIGHT_TIME_BUCKET_IN_SECONDS = 60
+SINGLE_FLIGHT_STATEMENTS = ["SELECT", "WITH", "SHOW", "DESCRIBE"]
+NON_DETERMINISTIC_FUNCTIONS = ["rand", "randn", "random", "uuid", "shuffle"]
+PREFETCH_SPILL_DIR = "prefetch_spill"
+PREFETCH_WAIT_INTERVAL_IN_SECONDS = 1
+CIRCUIT_BREAKER_DIR = "circuit_breaker"
+CIRCUIT_BREAKER_PROBE_TIMEOUT_IN_SECONDS = 60
+CIRCUIT_BREAKER_REFRESH_INTERVAL_IN_SECONDS = 0.5
+RATE_LIMITER_DIR = "rate_limiter"
+COMMAND_SEMAPHORE_STATE_FILE = "command_semaphore.json"
+COMMAND_SEMAPHORE_POLL_INTERVAL_IN_SECONDS = 0.5
+COMMAND_SEMAPHORE_WAITER_TIMEOUT_IN_SECONDS = 10
+COMMAND_SEMAPHORE_LEASE_GRACE_IN_SECONDS = 60
+
+# Endpoints starting an execution, rate limited apart from the other endpoints
+RATE_LIMIT_SUBMIT_ENDPOINTS = [
+    RUN_SUBMIT_ENDPOINT,
+    EXECUTE_JOB_ENDPOINT,
+    COMMAND_ENDPOINT,
+    CONTEXT_ENDPOINT,
+    STATEMENT_ENDPOINT,
+]
+
+# Time in seconds for which a process reuses the performance settings it read
+PERFORMANCE_SETTINGS_CACHE_TTL_IN_SECONDS = 60
+
+# Default values of the [performance] stanza of ta_databricks_settings.conf
+PERFORMANCE_DEFAULTS = {
+    "context_pool_enabled": False,
+    "context_pool_max_per_cluster": 4,
+    "context_pool_idle_timeout": 600,
+    "cluster_cache_ttl": 300,
+    "config_cache_ttl": 60,
+    "poll_initial_interval": 0.1,
+    "poll_max_interval": 5.0,
+    "poll_backoff_factor": 1.5,
+    "http_pool_connections": 10,
+    "http_pool_maxsize": 10,
+    "fan_out_max_workers": 4,
+    "result_cache_max_size_mb": 100,
+    "single_flight_enabled": False,
+    "arrow_results_enabled": True,
+    "prefetch_queue_depth": 4,
+    "prefetch_spill_max_mb": 512,
+    "retry_budget": 60,
+    "retry_base_interval": 1.0,
+    "retry_max_interval": 20.0,
+    "circuit_breaker_threshold": 5,
+    "circuit_breaker_cooldown": 30,
+    "rate_limit_submit_per_second": 5.0,
+    "rate_limit_default_per_second": 30.0,
+    "max_concurrent_commands": 8,
+}
 
 USER_AGENT_CONST = "Databricks-AddOnFor-Splunk-1.2.0"
 
 VERIFY_SSL = True
 INTERNAL_VERIFY_SSL = False
 RETRIES = 3
-BACKOFF_FACTOR = 60
 TIMEOUT = 300
 STATUS_FORCELIST = [429, 500, 502, 503, 504]
+CIRCUIT_BREAKER_STATUS_LIST = [500, 502, 503, 504]
 
 # Error codes and message
 ERROR_CODE = {
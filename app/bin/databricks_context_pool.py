@@ -0,0 +1,199 @@
+import ta_databricks_declare  # noqa: F401
+import time
+
+import databricks_const as const
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_context_pool")
+
+
+def is_expired(entry, now, idle_timeout):
+    """
+    Check whether a pooled context is idle for too long, or leased by a search which abandoned it.
+
+    :param entry: Pool entry of the context
+    :param now: Current time
+    :param idle_timeout: Time in seconds after which an unused context is destroyed
+    :return: True if the context has to be evicted from the pool
+    """
+    if entry["leased_until"]:
+        return entry["leased_until"] < now
+    return now - entry["last_used_time"] > idle_timeout
+
+
+def evict_expired_contexts(idle_timeout):
+    """
+    Evict the expired contexts of all the pools, e.g. once no search uses a pool any longer.
+
+    The contexts are removed from the pools only, the caller is responsible for destroying them.
+
+    :param idle_timeout: Time in seconds after which an unused context is destroyed
+    :return: list of tuples of account name, cluster ID and ID of the evicted contexts
+    """
+    now = time.time()
+    evicted = []
+    with shared_state.JsonStateFile(const.CONTEXT_POOL_STATE_FILE).update() as state:
+        for key, entries in list(state.items()):
+            account_name, cluster_id = key.split("|")[:2]
+            evicted.extend(
+                (account_name, cluster_id, entry["context_id"])
+                for entry in entries if is_expired(entry, now, idle_timeout)
+            )
+            entries = [entry for entry in entries if not is_expired(entry, now, idle_timeout)]
+            if entries:
+                state[key] = entries
+            else:
+                state.pop(key)
+    return evicted
+
+
+class ExecutionContextPool(object):
+    """
+    A pool of execution contexts reused across databricksquery searches.
+
+    The pool is keyed by (account, cluster ID, language, Splunk user) and persisted in a state file, hence all the
+    search processes of the instance share it. Each context is leased by a single search at a time. The session
+    state set by a search, e.g. USE, SET or temporary views, is only visible to the later searches of the same user.
+    """
+
+    def __init__(self, client, cluster_id, language, max_contexts, idle_timeout, lease_timeout, user):
+        """
+        Initialize ExecutionContextPool object.
+
+        :param client: DatabricksClient object
+        :param cluster_id: ID of the cluster to create the contexts in
+        :param language: Language of the contexts
+        :param max_contexts: Maximum number of pooled contexts for the cluster and user
+        :param idle_timeout: Time in seconds after which an unused context is destroyed
+        :param lease_timeout: Time in seconds after which a leased context is considered abandoned
+        :param user: Splunk user running the search
+        """
+        self.client = client
+        self.cluster_id = cluster_id
+        self.language = language
+        self.max_contexts = max_contexts
+        self.idle_timeout = idle_timeout
+        self.lease_timeout = lease_timeout
+        self.key = "{}|{}|{}|{}".format(client.account_name, cluster_id, language, user)
+        self.store = shared_state.JsonStateFile(const.CONTEXT_POOL_STATE_FILE)
+
+    def acquire(self):
+        """
+        Lease a healthy context from the pool, creating a new one if no idle context is available.
+
+        :return: tuple of context ID and whether the context belongs to the pool
+        """
+        while True:
+            context_id = self._lease_idle_context()
+            if not context_id:
+                break
+            if self._is_healthy(context_id):
+                _LOGGER.info("Reusing pooled context: {}.".format(context_id))
+                return context_id, True
+            _LOGGER.info("Pooled context {} is unhealthy, discarding it.".format(context_id))
+            self.release(context_id, True, reusable=False)
+
+        _LOGGER.info("Creating Context in cluster.")
+        payload = {"language": self.language, "clusterId": self.cluster_id}
+        response = self.client.databricks_api("post", const.CONTEXT_ENDPOINT, data=payload)
+        context_id = response.get("id")
+        _LOGGER.info("Context created: {}.".format(context_id))
+
+        now = time.time()
+        with self.store.update() as state:
+            entries = state.setdefault(self.key, [])
+            pooled = len(entries) < self.max_contexts
+            if pooled:
+                entries.append(
+                    {
+                        "context_id": context_id,
+                        "created_time": now,
+                        "last_used_time": now,
+                        "leased_until": now + self.lease_timeout,
+                    }
+                )
+        if not pooled:
+            _LOGGER.info(
+                "Pool for cluster {} is full, context {} will be destroyed after use.".format(
+                    self.cluster_id, context_id
+                )
+            )
+        return context_id, pooled
+
+    def release(self, context_id, pooled, reusable=True):
+        """
+        Return a leased context to the pool, or destroy it if it can not be reused.
+
+        :param context_id: ID of the context to release
+        :param pooled: Whether the context belongs to the pool
+        :param reusable: Whether the context is in a state fit for the next search
+        """
+        if pooled:
+            with self.store.update() as state:
+                entries = state.get(self.key, [])
+                entry = next((e for e in entries if e["context_id"] == context_id), None)
+                if entry and reusable:
+                    entry["leased_until"] = None
+                    entry["last_used_time"] = time.time()
+                    return
+                if entry:
+                    entries.remove(entry)
+        self._destroy(context_id)
+
+    def _lease_idle_context(self):
+        """
+        Lease an idle context and evict the idle and abandoned contexts of the pool.
+
+        :return: ID of the leased context or None if no idle context is available
+        """
+        now = time.time()
+        evicted = []
+        context_id = None
+        with self.store.update() as state:
+            entries = []
+            for entry in state.get(self.key, []):
+                (evicted if is_expired(entry, now, self.idle_timeout) else entries).append(entry)
+
+            for entry in entries:
+                if not entry["leased_until"]:
+                    entry["leased_until"] = now + self.lease_timeout
+                    context_id = entry["context_id"]
+                    break
+            state[self.key] = entries
+
+        for entry in evicted:
+            _LOGGER.info("Evicting context {} from the pool.".format(entry["context_id"]))
+            self._destroy(entry["context_id"])
+        return context_id
+
+    def _is_healthy(self, context_id):
+        """
+        Check whether the context is still running on the cluster.
+
+        :param context_id: ID of the context to check
+        :return: True if the context can execute commands, False otherwise
+        """
+        args = {"clusterId": self.cluster_id, "contextId": context_id}
+        try:
+            response = self.client.databricks_api("get", const.CONTEXT_STATUS_ENDPOINT, args=args)
+        except Exception as e:
+            _LOGGER.info("Unable to fetch the status of context {}: {}".format(context_id, e))
+            return False
+        return response.get("status") == "Running"
+
+    def _destroy(self, context_id):
+        """
+        Destroy the context to free-up space in Databricks.
+
+        :param context_id: ID of the context to destroy
+        """
+        if not context_id:
+            return
+        _LOGGER.info("Deleting context.")
+        payload = {"contextId": context_id, "clusterId": self.cluster_id}
+        try:
+            self.client.databricks_api("post", const.CONTEXT_DESTROY_ENDPOINT, data=payload)
+            _LOGGER.info("Context deleted successfully.")
+        except Exception as e:
+            _LOGGER.error("Unable to delete context {}: {}".format(context_id, e))
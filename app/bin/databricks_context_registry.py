@@ -0,0 +1,93 @@
+import ta_databricks_declare  # noqa: F401
+import json
+import time
+
+import databricks_const as const
+import databricks_common_utils as utils
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_context_registry")
+
+
+class ContextRegistry(object):
+    """
+    A registry of the execution contexts created by the searches, stored in a KV store collection.
+
+    Each context is registered with the time by which its search must have destroyed it. The contexts
+    left behind past that time, e.g. by a killed search, are destroyed by the databricksreapcontext command.
+    """
+
+    def __init__(self, splunkd_uri, session_key, sid=None):
+        """
+        Initialize ContextRegistry object.
+
+        :param splunkd_uri: Splunk management URI
+        :param session_key: Splunk session key
+        :param sid: ID of the search creating the contexts
+        """
+        self.sid = sid
+        self.url = "{}/servicesNS/nobody/{}/storage/collections/data/{}".format(
+            splunkd_uri, const.APP_NAME, const.KV_COLLECTION_NAME_EXECUTION_CONTEXT
+        )
+        self.headers = {
+            "Authorization": "Bearer {}".format(session_key),
+            "Content-Type": "application/json",
+            "User-Agent": "{}".format(const.USER_AGENT_CONST),
+        }
+
+    def register(self, account_name, cluster_id, context_id, timeout):
+        """
+        Register a context created by the search. Failures are logged, not raised.
+
+        :param account_name: Name of the Databricks account
+        :param cluster_id: ID of the cluster holding the context
+        :param context_id: ID of the context
+        :param timeout: Time in seconds within which the search destroys the context
+        """
+        now = time.time()
+        record = {
+            "_key": context_id,
+            "account_name": account_name,
+            "cluster_id": cluster_id,
+            "context_id": context_id,
+            "sid": self.sid,
+            "created_time": now,
+            "expires_time": now + timeout + const.CONTEXT_REAP_GRACE_IN_SECONDS,
+        }
+        try:
+            self._request("post", self.url, data=json.dumps(record))
+        except Exception as e:
+            _LOGGER.warning("Unable to register context {}: {}".format(context_id, e))
+
+    def unregister(self, context_id):
+        """
+        Remove a destroyed context from the registry. Failures are logged, not raised.
+
+        :param context_id: ID of the context
+        """
+        try:
+            self._request("delete", "{}/{}".format(self.url, context_id))
+        except Exception as e:
+            _LOGGER.warning("Unable to unregister context {}: {}".format(context_id, e))
+
+    def get_expired(self):
+        """
+        Get the contexts whose search should already have destroyed them.
+
+        :return: list of records in the form of dictionary
+        """
+        query = json.dumps({"expires_time": {"$lt": time.time()}})
+        return self._request("get", self.url, params={"query": query}).json()
+
+    def _request(self, method, url, **kwargs):
+        """Make a request to the KV store collection and raise on failure."""
+        response = utils.get_http_session().request(
+            method,
+            url,
+            headers=self.headers,
+            verify=const.INTERNAL_VERIFY_SSL,
+            timeout=const.TIMEOUT,
+            **kwargs
+        )
+        response.raise_for_status()
+        return response
@@ -0,0 +1,141 @@
+import ta_databricks_declare  # noqa: F401
+import queue
+import threading
+import traceback
+
+import databricks_const as const
+from log_manager import setup_logging
+
+from splunktalib.concurrent.thread_pool import ThreadPool
+
+_LOGGER = setup_logging("ta_databricks_fan_out")
+
+
+class FanOutQueryExecutor(object):
+    """
+    A class to execute a query on many targets concurrently on a bounded thread pool.
+
+    The records of all the targets are merged as they arrive, hence the total latency is the one of the
+    slowest target rather than the sum of all of them.
+    """
+
+    def __init__(self, max_workers, warn=None):
+        """
+        Initialize FanOutQueryExecutor object.
+
+        :param max_workers: Maximum number of targets executing the query at a time
+        :param warn: Callable used to report warnings to the user
+        """
+        self.max_workers = max(1, max_workers)
+        self.warn = warn
+        self.executors = []
+        self.errors = []
+        self.stopped = threading.Event()
+        self.records = queue.Queue(const.FAN_OUT_QUEUE_SIZE)
+
+    def execute(self, targets, query):
+        """
+        Execute the query on each target and yield the records as they arrive.
+
+        The query failing on a target is reported as a warning, the search fails only if it fails on all of them.
+
+        :param targets: list of tuples of the fields added to the records of the target and
+                        a callable creating the executor of the target given a warn callable
+        :param query: SQL query to be executed
+        :return: generator of records in the form of dictionary
+        """
+        pool = ThreadPool(min_size=min(self.max_workers, len(targets)), max_size=self.max_workers)
+        pool.start()
+        try:
+            for fields, create_executor in targets:
+                if pool.apply_async(self.run_target, args=(fields, create_executor, query)) is None:
+                    raise Exception("Unable to execute the query, the thread pool is stopped.")
+
+            pending = len(targets)
+            while pending:
+                try:
+                    kind, value = self.records.get(timeout=const.FAN_OUT_QUEUE_TIMEOUT_IN_SECONDS)
+                except queue.Empty:
+                    if not is_pool_alive(pool):
+                        raise Exception(
+                            "Query execution stopped unexpectedly on {} target(s).".format(pending)
+                        )
+                    continue
+                if kind == "record":
+                    yield value
+                elif kind == "warning":
+                    if self.warn:
+                        self.warn(value)
+                else:
+                    pending -= 1
+                    if value:
+                        self.errors.append(value)
+                        if self.warn:
+                            self.warn(value)
+
+            if len(self.errors) == len(targets):
+                raise Exception("Query execution failed on all the accounts.")
+        finally:
+            self.stop()
+            pool.tear_down()
+
+    def run_target(self, fields, create_executor, query):
+        """
+        Execute the query on a target and queue its records. Runs on a thread of the pool.
+
+        :param fields: dictionary of fields added to the records of the target
+        :param create_executor: Callable creating the executor of the target given a warn callable
+        :param query: SQL query to be executed
+        """
+        label = ", ".join("{}={}".format(key, value) for key, value in sorted(fields.items()))
+        error = "Query execution stopped unexpectedly for {}.".format(label)
+        try:
+            executor = create_executor(lambda message: self.put(("warning", "{}: {}".format(label, message))))
+            self.executors.append(executor)
+            for record in executor.execute(query):
+                record.update(fields)
+                if not self.put(("record", record)):
+                    return
+            _LOGGER.info("Query execution completed for {}.".format(label))
+            error = None
+        except Exception as e:
+            _LOGGER.error("Query execution failed for {}: {}".format(label, e))
+            _LOGGER.debug(traceback.format_exc())
+            error = "Query execution failed for {}: {}".format(label, e)
+        finally:
+            # The search waits for the done item of each target, whatever stops the target
+            self.put(("done", error))
+
+    def put(self, item):
+        """
+        Queue an item for the search, waiting while the queue is full.
+
+        :param item: tuple of the kind of item and its value
+        :return: False if the search stopped consuming the items, True otherwise
+        """
+        while not self.stopped.is_set():
+            try:
+                self.records.put(item, timeout=const.FAN_OUT_QUEUE_TIMEOUT_IN_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self):
+        """Stop the targets still executing the query, e.g. on the cancellation of the search."""
+        self.stopped.set()
+        for executor in list(self.executors):
+            try:
+                executor.cancel()
+            except Exception as e:
+                _LOGGER.error("Unable to cancel the query execution: {}".format(e))
+
+
+def is_pool_alive(pool):
+    """
+    Check whether a thread of the pool is still able to execute the targets.
+
+    :param pool: ThreadPool object
+    :return: True if a worker thread of the pool is alive
+    """
+    return any(thread.is_alive() for thread in pool._thrs)
@@ -2,11 +2,14 @@
 import sys
 import os
 import json
+import time
+import warnings
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '..')))
 
 import splunk.rest as rest  # noqa: E402
 import ta_databricks_declare  # noqa: E402 F401
 import databricks_const as const  # noqa: E402
+import databricks_config_cache as config_cache  # noqa: E402
 import traceback  # noqa: E402
 from solnlib.credentials import CredentialManager  # noqa: E402
 from splunk.persistconn.application import PersistentServerConnectionApplication  # noqa: E402
@@ -16,6 +19,88 @@ APP_NAME = const.APP_NAME
 _LOGGER = setup_logging("ta_databricks_get_credentials")
 
 
+ACCOUNT_REALM = "__REST_CREDENTIAL__#{}#configs/conf-ta_databricks_account".format(APP_NAME)
+PROXY_REALM = "__REST_CREDENTIAL__#{}#configs/conf-ta_databricks_settings".format(APP_NAME)
+
+# Decrypted configurations of the accounts, kept by the persistent process between the requests.
+# 'complete' tells whether all the accounts have been listed.
+_CACHE = {'generation': None, 'fetched_time': 0, 'complete': False, 'accounts': {}}
+
+
+def _get_cached_accounts():
+    """
+    Get the cached configurations of the accounts, resetting the cache if it is expired or invalidated.
+
+    @return: dictionary with account name as key and its configurations as value
+    """
+    generation = config_cache.get_generation()
+    if (
+        _CACHE['generation'] != generation
+        or time.time() - _CACHE['fetched_time'] > const.CREDENTIALS_CACHE_TTL_IN_SECONDS
+    ):
+        _CACHE.update({'generation': generation, 'fetched_time': time.time(), 'complete': False, 'accounts': {}})
+    return _CACHE['accounts']
+
+
+def _clear_cache():
+    """Clear the cached configurations of the accounts."""
+    _CACHE.update({'generation': None, 'fetched_time': 0, 'complete': False, 'accounts': {}})
+
+
+def build_config_dict(account_config, account_password, proxy_config, proxy_password):
+    """
+    Build the configurations of an account.
+
+    @param account_config: Content of the account stanza
+    @param account_password: Clear account password read from passwords.conf
+    @param proxy_config: Content of the proxy stanza
+    @param proxy_password: Clear proxy password read from passwords.conf
+    @return: dictionary with Databricks fields and values
+    """
+    config_dict = {
+        'databricks_instance': None,
+        'aad_client_id': None,
+        'aad_tenant_id': None,
+        'aad_client_secret': None,
+        'aad_access_token': None,
+        'cluster_name': None,
+        'warehouse_id': None,
+        'databricks_pat': None,
+        'auth_type': None,
+        'proxy_enabled': None,
+        'proxy_type': None,
+        'proxy_url': None,
+        'proxy_port': None,
+        'proxy_username': None,
+        'proxy_password': None,
+        'proxy_rdns': None,
+        'use_for_oauth': None
+    }
+    config_dict['auth_type'] = account_config.get('auth_type')
+    config_dict['databricks_instance'] = account_config.get('databricks_instance')
+    config_dict['cluster_name'] = account_config.get('cluster_name')
+    config_dict['warehouse_id'] = account_config.get('warehouse_id')
+
+    if config_dict['auth_type'] == 'PAT':
+        config_dict['databricks_pat'] = account_password.get('databricks_pat')
+    else:
+        config_dict['aad_client_id'] = account_config.get('aad_client_id')
+        config_dict['aad_tenant_id'] = account_config.get('aad_tenant_id')
+        config_dict['aad_client_secret'] = account_password.get('aad_client_secret')
+        config_dict['aad_access_token'] = account_password.get('aad_access_token')
+
+    if proxy_config.get('proxy_password'):
+        config_dict['proxy_password'] = proxy_password.get('proxy_password')
+    config_dict['proxy_enabled'] = proxy_config.get('proxy_enabled')
+    config_dict['proxy_type'] = proxy_config.get('proxy_type')
+    config_dict['proxy_url'] = proxy_config.get('proxy_url')
+    config_dict['proxy_port'] = proxy_config.get('proxy_port')
+    config_dict['proxy_username'] = proxy_config.get('proxy_username')
+    config_dict['proxy_rdns'] = proxy_config.get('proxy_rdns')
+    config_dict['use_for_oauth'] = proxy_config.get('use_for_oauth')
+    return config_dict
+
+
 class DatabricksGetCredentials(PersistentServerConnectionApplication):
     """Custom Encryption Handler."""
 
@@ -54,10 +139,11 @@ class DatabricksGetCredentials(PersistentServerConnectionApplication):
                 manager = CredentialManager(
                     self.admin_session_key,
                     app=APP_NAME,
-                    realm="__REST_CREDENTIAL__#{0}#{1}".format(APP_NAME, "configs/conf-ta_databricks_account"),
+                    realm=ACCOUNT_REALM,
                 )
                 new_creds = json.dumps({"aad_client_secret": client_sec, "aad_access_token": access_token})
                 manager.set_password(self.account_name, new_creds)
+                _clear_cache()
                 _LOGGER.info("Saved AAD access token successfully.")
                 return {
                     'payload': 'Saved AAD access token successfully.',
@@ -72,25 +158,18 @@ class DatabricksGetCredentials(PersistentServerConnectionApplication):
                     'status': 500
                 }
 
+        if form_data.get('names'):
+            return self.handle_bulk(form_data.get('names'))
+
         # Retrieve Configurations
-        config_dict = {
-            'databricks_instance': None,
-            'aad_client_id': None,
-            'aad_tenant_id': None,
-            'aad_client_secret': None,
-            'aad_access_token': None,
-            'cluster_name': None,
-            'databricks_pat': None,
-            'auth_type': None,
-            'proxy_enabled': None,
-            'proxy_type': None,
-            'proxy_url': None,
-            'proxy_port': None,
-            'proxy_username': None,
-            'proxy_password': None,
-            'proxy_rdns': None,
-            'use_for_oauth': None
-        }
+        cached_accounts = _get_cached_accounts()
+        if self.account_name in cached_accounts:
+            _LOGGER.info("Returning cached account and settings configurations.")
+            return {
+                'payload': cached_accounts[self.account_name],
+                'status': 200
+            }
+
         try:
             _LOGGER.info("Retrieving account and settings configurations.")
 
@@ -107,58 +186,29 @@ class DatabricksGetCredentials(PersistentServerConnectionApplication):
             account_config = account_config_json.get("entry")[0].get("content")
             _LOGGER.debug("Account configurations read successfully from account.conf .")
 
-            config_dict['auth_type'] = account_config.get('auth_type')
-            config_dict['databricks_instance'] = account_config.get('databricks_instance')
-            config_dict['cluster_name'] = account_config.get('cluster_name')
-
             # Get clear account password from passwords.conf
             account_manager = CredentialManager(
                 self.admin_session_key,
                 app=APP_NAME,
-                realm="__REST_CREDENTIAL__#{}#configs/conf-ta_databricks_account".format(APP_NAME),
+                realm=ACCOUNT_REALM,
             )
             account_password = json.loads(account_manager.get_password(self.account_name))
             _LOGGER.debug("Clear account password read successfully from passwords.conf.")
 
-            if config_dict['auth_type'] == 'PAT':
-                config_dict['databricks_pat'] = account_password.get('databricks_pat')
-            else:
-                config_dict['aad_client_id'] = account_config.get('aad_client_id')
-                config_dict['aad_tenant_id'] = account_config.get('aad_tenant_id')
-                config_dict['aad_client_secret'] = account_password.get('aad_client_secret')
-                config_dict['aad_access_token'] = account_password.get('aad_access_token')
-
-            # Get proxy settings from conf
-            _, proxy_response_content = rest.simpleRequest(
-                "/servicesNS/nobody/{}/TA_Databricks_settings/proxy".format(
-                    APP_NAME
-                ),
-                sessionKey=self.admin_session_key,
-                getargs={"output_mode": "json"},
-                raiseAllErrors=True,
-            )
-            proxy_config_json = json.loads(proxy_response_content)
-            proxy_config = proxy_config_json.get("entry")[0].get("content")
-            _LOGGER.debug("Proxy configurations read successfully from settings.conf")
-
+            proxy_config = self.get_proxy_config()
+            proxy_password = {}
             if proxy_config.get('proxy_password'):
                 # Get clear proxy password from passwords.conf
                 proxy_manager = CredentialManager(
                     self.admin_session_key,
                     app=APP_NAME,
-                    realm="__REST_CREDENTIAL__#{}#configs/conf-ta_databricks_settings".format(APP_NAME),
+                    realm=PROXY_REALM,
                 )
                 proxy_password = json.loads(proxy_manager.get_password('proxy'))
-                config_dict['proxy_password'] = proxy_password.get('proxy_password')
                 _LOGGER.debug("Clear proxy password read successfully from passwords.conf.")
 
-            config_dict['proxy_enabled'] = proxy_config.get('proxy_enabled')
-            config_dict['proxy_type'] = proxy_config.get('proxy_type')
-            config_dict['proxy_url'] = proxy_config.get('proxy_url')
-            config_dict['proxy_port'] = proxy_config.get('proxy_port')
-            config_dict['proxy_username'] = proxy_config.get('proxy_username')
-            config_dict['proxy_rdns'] = proxy_config.get('proxy_rdns')
-            config_dict['use_for_oauth'] = proxy_config.get('use_for_oauth')
+            config_dict = build_config_dict(account_config, account_password, proxy_config, proxy_password)
+            cached_accounts[self.account_name] = config_dict
 
             self.status = 200
             return {
@@ -174,6 +224,102 @@ class DatabricksGetCredentials(PersistentServerConnectionApplication):
                 'status': 500
             }
 
+    def handle_bulk(self, names):
+        """
+        Retrieve the configurations of many accounts at once.
+
+        All the accounts are read with a single conf listing and a single passwords listing,
+        and are cached by the persistent process for the next requests.
+
+        @param names: Comma separated names of the accounts, or * for all the accounts
+        @return: dictionary with account name as key and its configurations as value.
+                 Accounts that do not exist are not included.
+        """
+        try:
+            accounts = _get_cached_accounts()
+            if not _CACHE['complete']:
+                self.fetch_all_configs()
+            if names.strip() == '*':
+                names = list(accounts.keys())
+            else:
+                names = [name.strip() for name in names.split(',') if name.strip()]
+            self.status = 200
+            return {
+                'payload': {name: accounts[name] for name in names if name in accounts},
+                'status': self.status
+            }
+        except Exception:
+            error_msg = "Databricks Error: Error occured while retrieving account and proxy configurations - {}".format(
+                traceback.format_exc())
+            _LOGGER.error(error_msg)
+            return {
+                'payload': error_msg,
+                'status': 500
+            }
+
+    def fetch_all_configs(self):
+        """Read the configurations of all the accounts and cache them in the process."""
+        _LOGGER.info("Retrieving configurations of all the accounts.")
+        _, account_response_content = rest.simpleRequest(
+            "/servicesNS/nobody/TA-Databricks/configs/conf-ta_databricks_account",
+            sessionKey=self.admin_session_key,
+            getargs={"output_mode": "json", "count": 0},
+            raiseAllErrors=True,
+        )
+        account_entries = json.loads(account_response_content).get("entry") or []
+        _LOGGER.debug("Account configurations read successfully from account.conf .")
+
+        proxy_config = self.get_proxy_config()
+
+        # A single listing of the passwords of the app holds the account and proxy passwords
+        password_manager = CredentialManager(self.admin_session_key, app=APP_NAME)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            clear_passwords = password_manager.get_clear_passwords()
+        passwords = {
+            (password["realm"], password["username"]): password["clear_password"]
+            for password in clear_passwords
+        }
+        _LOGGER.debug("Clear passwords read successfully from passwords.conf.")
+
+        proxy_password = {}
+        if proxy_config.get('proxy_password') and (PROXY_REALM, 'proxy') in passwords:
+            proxy_password = json.loads(passwords[(PROXY_REALM, 'proxy')])
+
+        accounts = {}
+        for entry in account_entries:
+            name = entry.get("name")
+            account_password = passwords.get((ACCOUNT_REALM, name))
+            if not account_password:
+                _LOGGER.warning("Clear password of account {} not found in passwords.conf.".format(name))
+                continue
+            accounts[name] = build_config_dict(
+                entry.get("content") or {}, json.loads(account_password), proxy_config, proxy_password
+            )
+
+        _CACHE['accounts'].update(accounts)
+        _CACHE['complete'] = True
+        _LOGGER.info("Configurations of {} account(s) retrieved.".format(len(accounts)))
+
+    def get_proxy_config(self):
+        """
+        Get proxy settings from conf.
+
+        @return: dictionary with the proxy settings
+        """
+        _, proxy_response_content = rest.simpleRequest(
+            "/servicesNS/nobody/{}/TA_Databricks_settings/proxy".format(
+                APP_NAME
+            ),
+            sessionKey=self.admin_session_key,
+            getargs={"output_mode": "json"},
+            raiseAllErrors=True,
+        )
+        proxy_config_json = json.loads(proxy_response_content)
+        proxy_config = proxy_config_json.get("entry")[0].get("content")
+        _LOGGER.debug("Proxy configurations read successfully from settings.conf")
+        return proxy_config
+
     def handleStream(self, handle, in_string):
         """For future use."""
         raise NotImplementedError("PersistentServerConnectionApplication.handleStream")
@@ -0,0 +1,151 @@
+import ta_databricks_declare  # noqa: F401
+import mmap
+import queue
+import pickle
+import tempfile
+import threading
+import traceback
+
+import databricks_const as const
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_prefetch")
+
+
+class PrefetchIterator(object):
+    """
+    An iterator fetching the items of another iterator on a background thread, ahead of their consumption.
+
+    Up to depth items are held in memory. While the consumer lags further behind, the fetched items are spilled
+    to a temporary file read back through a memory map, so that the fetching is not blocked by the consumer.
+    Once spill_max_size bytes are spilled, the fetching waits for the consumer instead.
+    """
+
+    def __init__(self, iterable, depth, spill_max_size):
+        """
+        Initialize PrefetchIterator object.
+
+        :param iterable: Iterable whose items are fetched in the background
+        :param depth: Maximum number of items held in memory
+        :param spill_max_size: Maximum number of bytes spilled to the temporary file
+        """
+        self.iterable = iterable
+        self.depth = max(1, depth)
+        self.spill_max_size = spill_max_size
+        self.items = queue.Queue()
+        self.memory_slots = threading.Semaphore(self.depth)
+        self.stopped = threading.Event()
+        self.spill_file = None
+        self.spill_size = 0
+        self.spill_map = None
+        self.spill_count = 0
+        self.spill_lock = threading.Lock()
+        self.fetch_done = False
+        self.thread = None
+
+    def __iter__(self):
+        """
+        Start the fetching and yield the items in their original order.
+
+        :return: generator of the items of the iterable
+        """
+        self.thread = threading.Thread(target=self.fetch, name="databricks-prefetch")
+        self.thread.daemon = True
+        self.thread.start()
+        try:
+            while True:
+                kind, value = self.items.get()
+                if kind == "item":
+                    yield value
+                    # The consumer is done with the item only once it resumes
+                    self.memory_slots.release()
+                elif kind == "spilled":
+                    yield self.read_spilled(*value)
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+            if self.spill_count:
+                _LOGGER.info(
+                    "Spilled {} item(s), {} bytes, while the search was consuming the results.".format(
+                        self.spill_count, self.spill_size
+                    )
+                )
+        finally:
+            self.close()
+
+    def fetch(self):
+        """Fetch the items of the iterable and queue them for the consumer. Runs on the background thread."""
+        try:
+            for item in self.iterable:
+                if self.stopped.is_set():
+                    return
+                if not self.memory_slots.acquire(blocking=False):
+                    if self.spill_size < self.spill_max_size:
+                        self.items.put(("spilled", self.spill(item)))
+                        continue
+                    # The spill limit is reached, wait for the consumer
+                    while not self.memory_slots.acquire(timeout=const.PREFETCH_WAIT_INTERVAL_IN_SECONDS):
+                        if self.stopped.is_set():
+                            return
+                self.items.put(("item", item))
+            self.items.put(("done", None))
+        except Exception as e:
+            _LOGGER.debug(traceback.format_exc())
+            self.items.put(("error", e))
+        finally:
+            with self.spill_lock:
+                self.fetch_done = True
+                # The consumer is gone and could not release the spill file while the fetching was running
+                if self.stopped.is_set():
+                    self.close_spill_file()
+
+    def spill(self, item):
+        """
+        Append an item to the temporary spill file.
+
+        :param item: Item to spill
+        :return: tuple of the offset and length of the item in the file
+        """
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(dir=shared_state.get_state_dir(const.PREFETCH_SPILL_DIR))
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        offset = self.spill_size
+        self.spill_file.write(data)
+        self.spill_file.flush()
+        self.spill_size += len(data)
+        self.spill_count += 1
+        return offset, len(data)
+
+    def read_spilled(self, offset, length):
+        """
+        Read back a spilled item through the memory map of the spill file, mapping the file again once it grew.
+
+        :param offset: Offset of the item in the file
+        :param length: Length of the item in the file
+        :return: the spilled item
+        """
+        if self.spill_map is None or offset + length > len(self.spill_map):
+            if self.spill_map is not None:
+                self.spill_map.close()
+            self.spill_map = mmap.mmap(self.spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return pickle.loads(self.spill_map[offset:offset + length])
+
+    def close(self):
+        """Stop the fetching and release the spill file, or let the fetching release it once it stops."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(const.PREFETCH_WAIT_INTERVAL_IN_SECONDS)
+        if self.spill_map is not None:
+            self.spill_map.close()
+            self.spill_map = None
+        with self.spill_lock:
+            if self.fetch_done or self.thread is None:
+                self.close_spill_file()
+
+    def close_spill_file(self):
+        """Close the spill file, which deletes it."""
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
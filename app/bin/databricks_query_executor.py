@@ -0,0 +1,593 @@
+import ta_databricks_declare  # noqa: F401
+import json
+import base64
+
+import databricks_com as com
+import databricks_const as const
+import databricks_common_utils as utils
+from databricks_command_semaphore import CommandSemaphore
+from databricks_context_pool import ExecutionContextPool
+from databricks_prefetch import PrefetchIterator
+from log_manager import setup_logging
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+_LOGGER = setup_logging("ta_databricks_query_executor")
+
+COMPLEX_TYPES = ("array", "struct", "map")
+
+
+def compile_record_converter(columns):
+    """
+    Compile the conversion of the rows of a result set into records, once per result set.
+
+    ARRAY columns become multivalue fields and STRUCT columns are flattened into dotted fields, e.g. address.city.
+    MAP columns are kept as JSON strings. Values of complex columns may be given either decoded or JSON encoded.
+
+    :param columns: list of tuples of the column name, its type among COMPLEX_TYPES or None for a scalar type,
+                    and the field names of a STRUCT column given as a list of values
+    :return: callable converting a row in the form of list into a record in the form of dictionary
+    """
+    names = [name for name, _, _ in columns]
+    if not any(column_type for _, column_type, _ in columns):
+        return lambda row: dict(zip(names, row))
+
+    converters = [_compile_column_converter(*column) for column in columns]
+
+    def convert(row):
+        record = {}
+        for converter, value in zip(converters, row):
+            converter(value, record)
+        return record
+
+    return convert
+
+
+def _compile_column_converter(name, column_type, field_names):
+    """Compile the conversion of a value of the column, setting its field(s) in the record."""
+    if not column_type:
+        def convert(value, record):
+            record[name] = value
+        return convert
+
+    def convert(value, record):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                record[name] = value
+                return
+        if value is None:
+            record[name] = None
+        elif column_type == "map" and isinstance(value, list):
+            # Arrow maps are lists of key and value pairs
+            record[name] = _to_scalar(dict(value))
+        elif column_type == "struct":
+            if isinstance(value, list) and field_names:
+                value = dict(zip(field_names, value))
+            _flatten(name, value, record)
+        elif column_type == "array" and isinstance(value, list):
+            record[name] = [_to_scalar(item) for item in value]
+        else:
+            record[name] = _to_scalar(value)
+    return convert
+
+
+def _flatten(name, value, record):
+    """Set the fields of a nested value in the record, with dotted names for the members of the structs."""
+    if isinstance(value, dict):
+        for key, member in value.items():
+            _flatten("{}.{}".format(name, key), member, record)
+    elif isinstance(value, list):
+        record[name] = [_to_scalar(item) for item in value]
+    else:
+        record[name] = value
+
+
+def _to_scalar(value):
+    """Convert a nested value to a single field value, JSON encoding the collections."""
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+def get_cluster_column(header):
+    """
+    Get the column of a result set of the 1.2 command API, whose type is a JSON encoded Spark data type.
+
+    :param header: Schema entry of the column
+    :return: tuple of the column name, its complex type or None, and the field names of a STRUCT column
+    """
+    try:
+        data_type = json.loads(header.get("type") or "")
+    except ValueError:
+        data_type = None
+    column_type = data_type.get("type") if isinstance(data_type, dict) else None
+    if column_type not in COMPLEX_TYPES:
+        return header.get("name"), None, None
+    field_names = [field.get("name") for field in data_type.get("fields", [])] if column_type == "struct" else None
+    return header.get("name"), column_type, field_names
+
+
+def get_arrow_values(array):
+    """
+    Get the values of an Arrow column, converting the types not written by Splunk to strings.
+
+    Temporal values are written in the ISO 8601 format, decimals in plain notation and binaries in base64,
+    as in the JSON format of the results.
+
+    :param array: Arrow array of the column
+    :return: list of values
+    """
+    values = array.to_pylist()
+    data_type = array.type
+    if pyarrow.types.is_temporal(data_type):
+        convert = _to_iso_format
+    elif pyarrow.types.is_decimal(data_type):
+        convert = str
+    elif pyarrow.types.is_binary(data_type) or pyarrow.types.is_large_binary(data_type):
+        convert = _to_base64
+    else:
+        return values
+    return [value if value is None else convert(value) for value in values]
+
+
+def _to_iso_format(value):
+    """Convert a temporal value to a string, in the ISO 8601 format for dates and times."""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _to_base64(value):
+    """Convert a binary value to a base64 string."""
+    return base64.b64encode(value).decode("ascii")
+
+
+def get_statement_column(column):
+    """
+    Get the column of a result set of the SQL Statement Execution API.
+
+    :param column: Manifest entry of the column
+    :return: tuple of the column name, its complex type or None, and None as the values are JSON encoded
+    """
+    column_type = (column.get("type_name") or "").lower()
+    return column.get("name"), column_type if column_type in COMPLEX_TYPES else None, None
+
+
+def get_command_semaphore(client, target_id, command_timeout):
+    """
+    Get the semaphore limiting the commands executed at a time on a cluster or SQL warehouse of the account.
+
+    :param client: DatabricksClient object
+    :param target_id: ID of the cluster or SQL warehouse
+    :param command_timeout: Time to wait in seconds for query completion
+    :return: CommandSemaphore object, None if the commands are not limited
+    """
+    max_in_flight = utils.get_performance_settings()["max_concurrent_commands"]
+    if max_in_flight <= 0:
+        return None
+    return CommandSemaphore(
+        "{}|{}".format(client.account_name, target_id),
+        max_in_flight,
+        lease_timeout=command_timeout + const.COMMAND_SEMAPHORE_LEASE_GRACE_IN_SECONDS,
+    )
+
+
+def acquire_command_slot(semaphore, timeout, warn, target):
+    """
+    Wait for a command slot of the cluster or SQL warehouse, telling the user how long the query was queued.
+
+    :param semaphore: CommandSemaphore object, None if the commands are not limited
+    :param timeout: Time to wait in seconds for a slot
+    :param warn: Callable used to report warnings to the user
+    :param target: Description of the cluster or SQL warehouse
+    """
+    if not semaphore:
+        return
+    queued = semaphore.acquire(timeout)
+    if queued >= const.COMMAND_SEMAPHORE_POLL_INTERVAL_IN_SECONDS and warn:
+        warn(
+            "Query was queued {:.0f} seconds waiting for one of the {} command slots of {}.".format(
+                queued, semaphore.max_in_flight, target
+            )
+        )
+
+
+class ClusterQueryExecutor(object):
+    """A class to execute a SQL query on an all-purpose cluster using the 1.2 command API."""
+
+    def __init__(self, client, cluster_id, command_timeout, warn=None, registry=None, user=None):
+        """
+        Initialize ClusterQueryExecutor object.
+
+        :param client: DatabricksClient object
+        :param cluster_id: ID of the cluster to execute the query on
+        :param command_timeout: Time to wait in seconds for query completion
+        :param warn: Callable used to report warnings to the user
+        :param registry: ContextRegistry object tracking the contexts which are not pooled
+        :param user: Splunk user running the search, whose searches only share the pooled contexts
+        """
+        self.client = client
+        self.cluster_id = cluster_id
+        self.command_timeout = command_timeout
+        self.warn = warn
+        self.registry = registry
+        self.context_pool = None
+        self.context_id = None
+        self.pooled = False
+        self.command_id = None
+        self.semaphore = get_command_semaphore(client, cluster_id, command_timeout)
+
+        settings = utils.get_performance_settings()
+        if settings["context_pool_enabled"]:
+            self.context_pool = ExecutionContextPool(
+                client,
+                cluster_id,
+                "sql",
+                max_contexts=settings["context_pool_max_per_cluster"],
+                idle_timeout=settings["context_pool_idle_timeout"],
+                lease_timeout=command_timeout + const.CONTEXT_POOL_LEASE_GRACE_IN_SECONDS,
+                user=user,
+            )
+
+    def execute(self, query):
+        """
+        Execute the query and yield the records of the result.
+
+        :param query: SQL query to be executed
+        :return: generator of records in the form of dictionary
+        """
+        acquire_command_slot(self.semaphore, self.command_timeout, self.warn, "cluster {}".format(self.cluster_id))
+        try:
+            if self.context_pool:
+                self.context_id, self.pooled = self.context_pool.acquire()
+            else:
+                self.context_id, self.pooled = self.create_context(), False
+
+            if self.registry and not self.pooled and self.context_id:
+                self.registry.register(
+                    self.client.account_name, self.cluster_id, self.context_id, self.command_timeout
+                )
+
+            try:
+                response, status = self.run_command(self.context_id, query)
+            except BaseException:
+                # Error, or cancellation of the search
+                self.cancel()
+                raise
+
+            if response is None:
+                # Timeout scenario
+                self.cancel()
+                raise Exception("Command execution timed out. Last status: {}.".format(status))
+
+            self.release_context(reusable=True)
+        finally:
+            if self.semaphore:
+                self.semaphore.release()
+
+        if response["results"].get("truncated", True) and self.warn:
+            self.warn("Results are truncated due to Databricks API limitations.")
+
+        _LOGGER.info("Query execution successful. Preparing data.")
+
+        # Prepare the conversion of the rows from the list of Headers
+        headers = response["results"]["schema"]
+        convert = compile_record_converter([get_cluster_column(header) for header in headers])
+
+        # Fetch Data
+        data = response["results"]["data"]
+
+        for d in data:
+            yield convert(d)
+
+        _LOGGER.info("Data parsed successfully.")
+
+    def cancel(self):
+        """Cancel the running command and dispose of its context, which may be left in an unknown state."""
+        if self.context_id and self.command_id:
+            _LOGGER.info("Cancelling command: {}.".format(self.command_id))
+            payload = {
+                "clusterId": self.cluster_id,
+                "contextId": self.context_id,
+                "commandId": self.command_id,
+            }
+            try:
+                self.client.databricks_api("post", const.COMMAND_CANCEL_ENDPOINT, data=payload)
+            except Exception as e:
+                _LOGGER.error("Unable to cancel the command {}: {}".format(self.command_id, e))
+            self.command_id = None
+        self.release_context(reusable=False)
+
+    def release_context(self, reusable):
+        """
+        Return the context to the pool, or destroy it if it is not pooled.
+
+        :param reusable: Whether the context is in a state fit for the next search
+        """
+        context_id, self.context_id = self.context_id, None
+        if not context_id:
+            return
+        if self.pooled:
+            self.context_pool.release(context_id, self.pooled, reusable=reusable)
+            return
+        try:
+            self.destroy_context(context_id)
+        except Exception as e:
+            # The result is kept, the context is left registered for the reaper
+            _LOGGER.error("Unable to delete context {}: {}".format(context_id, e))
+            return
+        if self.registry:
+            self.registry.unregister(context_id)
+
+    def create_context(self):
+        """
+        Create an execution context on the cluster.
+
+        :return: ID of the context
+        """
+        _LOGGER.info("Creating Context in cluster.")
+        payload = {"language": "sql", "clusterId": self.cluster_id}
+        response = self.client.databricks_api("post", const.CONTEXT_ENDPOINT, data=payload)
+
+        context_id = response.get("id")
+        _LOGGER.info("Context created: {}.".format(context_id))
+        return context_id
+
+    def destroy_context(self, context_id):
+        """
+        Destroy the context to free-up space in Databricks.
+
+        :param context_id: ID of the context to destroy
+        """
+        if context_id:
+            _LOGGER.info("Deleting context.")
+            payload = {"contextId": context_id, "clusterId": self.cluster_id}
+            _ = self.client.databricks_api("post", const.CONTEXT_DESTROY_ENDPOINT, data=payload)
+            _LOGGER.info("Context deleted successfully.")
+
+    def run_command(self, context_id, query):
+        """
+        Submit the query in the context and poll its status until completion.
+
+        :param context_id: ID of the context to execute the query in
+        :param query: SQL query to be executed
+        :return: tuple of the final status response (None on timeout) and the last status
+        """
+        # Request to execute command
+        _LOGGER.info("Submitting SQL query for execution.")
+        payload = {
+            "language": "sql",
+            "clusterId": self.cluster_id,
+            "contextId": context_id,
+            "command": query,
+        }
+        response = self.client.databricks_api("post", const.COMMAND_ENDPOINT, data=payload)
+
+        command_id = self.command_id = response.get("id")
+        _LOGGER.info("Query submitted, command id: {}.".format(command_id))
+
+        # pulling mechanism
+        _LOGGER.info("Fetching query execution status.")
+        status = None
+        args = {
+            "clusterId": self.cluster_id,
+            "contextId": context_id,
+            "commandId": command_id,
+        }
+
+        poller = com.AdaptivePoller(self.command_timeout)
+        for _ in poller:
+            response = self.client.databricks_api("get", const.STATUS_ENDPOINT, args=args)
+
+            status = response.get("status")
+            _LOGGER.info("Query execution status: {}.".format(status))
+
+            if status in ("Cancelled", "Error", "Finished"):
+                self.command_id = None
+
+            if status in ("Cancelled", "Error"):
+                raise Exception(
+                    "Could not complete the query execution. Status: {}.".format(status)
+                )
+
+            elif status == "Finished":
+                poller.log_metrics("query execution")
+                if response["results"]["resultType"] == "error":
+                    msg = response["results"].get(
+                        "summary", "Error encountered while executing query."
+                    )
+                    raise Exception(str(msg))
+
+                if response["results"]["resultType"] != "table":
+                    raise Exception(
+                        "Encountered unknown result type, terminating the execution."
+                    )
+                return response, status
+
+            poller.retry_after = self.client.get_retry_after()
+
+        poller.log_metrics("query execution")
+        _LOGGER.info("Command execution timed out. Last status: {}.".format(status))
+        return None, status
+
+
+class StatementQueryExecutor(object):
+    """A class to execute a SQL statement on a Databricks SQL warehouse and stream its result."""
+
+    def __init__(self, client, warehouse_id, command_timeout, warn=None, wait_timeout=None):
+        """
+        Initialize StatementQueryExecutor object.
+
+        :param client: DatabricksClient object
+        :param warehouse_id: ID of the SQL warehouse to execute the statement on
+        :param command_timeout: Time to wait in seconds for statement completion
+        :param warn: Callable used to report warnings to the user
+        :param wait_timeout: Time in seconds the submission waits for the result before polling, 0 or 5 to 50
+        """
+        self.client = client
+        self.warehouse_id = warehouse_id
+        self.command_timeout = command_timeout
+        self.warn = warn
+        if wait_timeout is None:
+            wait_timeout = const.STATEMENT_WAIT_TIMEOUT_IN_SECONDS
+        self.wait_timeout = wait_timeout
+        self.result_format = const.STATEMENT_FORMAT
+        if pyarrow and utils.get_performance_settings()["arrow_results_enabled"]:
+            self.result_format = const.STATEMENT_ARROW_FORMAT
+        self.statement_id = None
+        self.running = True
+        self.semaphore = get_command_semaphore(client, warehouse_id, command_timeout)
+
+    def execute(self, query):
+        """
+        Execute the query and yield the records as the result chunks arrive.
+
+        :param query: SQL query to be executed
+        :return: generator of records in the form of dictionary
+        """
+        # The executor may execute several statements, e.g. the batches of databrickslookup
+        self.statement_id = None
+        self.running = True
+        _LOGGER.info("Submitting SQL statement for execution, with {} result format.".format(self.result_format))
+        payload = {
+            "statement": query,
+            "warehouse_id": self.warehouse_id,
+            "wait_timeout": "{}s".format(self.wait_timeout),
+            "on_wait_timeout": "CONTINUE",
+            "disposition": const.STATEMENT_DISPOSITION,
+            "format": self.result_format,
+        }
+        acquire_command_slot(
+            self.semaphore, self.command_timeout, self.warn, "SQL warehouse {}".format(self.warehouse_id)
+        )
+        try:
+            response = self.client.databricks_api("post", const.STATEMENT_ENDPOINT, data=payload)
+            self.statement_id = response.get("statement_id")
+            _LOGGER.info("Statement submitted, statement id: {}.".format(self.statement_id))
+
+            try:
+                response = self.wait_for_completion(response)
+            except BaseException:
+                # Error, timeout or cancellation of the search
+                self.cancel()
+                raise
+        finally:
+            if self.semaphore:
+                self.semaphore.release()
+
+        manifest = response.get("manifest") or {}
+        if manifest.get("truncated") and self.warn:
+            self.warn("Results are truncated due to Databricks API limitations.")
+
+        _LOGGER.info(
+            "Statement execution successful. Streaming {} chunk(s).".format(
+                manifest.get("total_chunk_count", 0)
+            )
+        )
+        columns = manifest.get("schema", {}).get("columns", [])
+        convert = compile_record_converter([get_statement_column(column) for column in columns])
+
+        chunks = self.iter_chunks(response.get("result"))
+        settings = utils.get_performance_settings()
+        if settings["prefetch_queue_depth"] > 0 and manifest.get("total_chunk_count", 0) > 1:
+            # The next chunks are downloaded while the current one is written to Splunk
+            chunks = PrefetchIterator(
+                chunks, settings["prefetch_queue_depth"], settings["prefetch_spill_max_mb"] * 1024 * 1024
+            )
+
+        for rows in chunks:
+            for row in rows:
+                yield convert(row)
+
+        _LOGGER.info("Data parsed successfully.")
+
+    def wait_for_completion(self, response):
+        """
+        Poll the statement status until it reaches a terminal state.
+
+        :param response: Response of the statement submission
+        :return: Response of the last status call
+        """
+        poller = com.AdaptivePoller(self.command_timeout)
+        for poll_count in poller:
+            if poll_count > 1:
+                response = self.client.databricks_api(
+                    "get", const.STATEMENT_STATUS_ENDPOINT.format(self.statement_id)
+                )
+            state = response.get("status", {}).get("state")
+            _LOGGER.info("Statement execution status: {}.".format(state))
+            if state not in ("PENDING", "RUNNING"):
+                break
+            poller.retry_after = self.client.get_retry_after()
+        else:
+            poller.log_metrics("statement execution")
+            raise Exception("Command execution timed out. Last status: {}.".format(state))
+        poller.log_metrics("statement execution")
+        self.running = False
+
+        if state != "SUCCEEDED":
+            error = response.get("status", {}).get("error") or {}
+            raise Exception(
+                error.get(
+                    "message",
+                    "Could not complete the query execution. Status: {}.".format(state),
+                )
+            )
+        return response
+
+    def iter_chunks(self, chunk):
+        """
+        Iterate over the result chunks of the statement, fetching the next chunk only when required.
+
+        :param chunk: First chunk of the result returned along with the statement status
+        :return: generator of list of rows
+        """
+        while chunk:
+            if "external_links" in chunk:
+                next_chunk_index = None
+                for link in chunk["external_links"]:
+                    _LOGGER.info("Fetching result chunk {}.".format(link.get("chunk_index")))
+                    if self.result_format == const.STATEMENT_ARROW_FORMAT:
+                        for rows in self.iter_arrow_batches(link["external_link"]):
+                            yield rows
+                    else:
+                        yield self.client.download_external_link(link["external_link"])
+                    next_chunk_index = link.get("next_chunk_index")
+            else:
+                yield chunk.get("data_array") or []
+                next_chunk_index = chunk.get("next_chunk_index")
+
+            if next_chunk_index is None:
+                break
+            chunk = self.client.databricks_api(
+                "get", const.STATEMENT_CHUNK_ENDPOINT.format(self.statement_id, next_chunk_index)
+            )
+
+    def iter_arrow_batches(self, url):
+        """
+        Iterate over the record batches of an Arrow result chunk as they are downloaded.
+
+        The values are converted column-wise, hence a single record batch is held in memory at a time.
+
+        :param url: Pre-signed URL of the result chunk
+        :return: generator of list of rows
+        """
+        reader = pyarrow.ipc.open_stream(self.client.stream_external_link(url))
+        for batch in reader:
+            columns = [get_arrow_values(batch.column(index)) for index in range(batch.num_columns)]
+            yield list(zip(*columns))
+
+    def cancel(self):
+        """Cancel the statement execution on the SQL warehouse."""
+        if not self.statement_id or not self.running:
+            return
+        self.running = False
+        _LOGGER.info("Cancelling statement: {}.".format(self.statement_id))
+        try:
+            self.client.databricks_api(
+                "post", const.STATEMENT_CANCEL_ENDPOINT.format(self.statement_id)
+            )
+        except Exception as e:
+            _LOGGER.error("Unable to cancel the statement {}: {}".format(self.statement_id, e))
@@ -0,0 +1,94 @@
+import ta_databricks_declare  # noqa: F401
+import time
+import hashlib
+
+import databricks_const as const
+import databricks_common_utils as utils
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_rate_limiter")
+
+
+def get_endpoint_class(method, endpoint):
+    """
+    Get the class of an API endpoint, each class having its own rate limit.
+
+    :param method: "get" or "post"
+    :param endpoint: Endpoint of the request e.g. /api/2.0/jobs/runs/submit
+    :return: "submit" for the requests starting an execution, "default" otherwise
+    """
+    if method.lower() == "post" and endpoint in const.RATE_LIMIT_SUBMIT_ENDPOINTS:
+        return "submit"
+    return "default"
+
+
+class RateLimiter(object):
+    """
+    A token bucket limiting the rate of the requests made to a Databricks instance by all the search processes.
+
+    The bucket of each endpoint class is kept in a state file updated under a lock. It refills at the
+    configured rate up to one second worth of requests. A request finding the bucket empty reserves
+    the next token and waits for it, hence the waiting requests are served in their order of arrival.
+    """
+
+    def __init__(self, databricks_instance, rates=None):
+        """
+        Initialize RateLimiter object. Unspecified rates are read from the performance settings.
+
+        :param databricks_instance: Databricks instance whose requests are limited
+        :param rates: dictionary of endpoint class to the number of requests per second, 0 for no limit
+        """
+        if rates is None:
+            settings = utils.get_performance_settings()
+            rates = {
+                "submit": settings["rate_limit_submit_per_second"],
+                "default": settings["rate_limit_default_per_second"],
+            }
+        self.databricks_instance = databricks_instance
+        self.rates = rates
+        key = hashlib.sha256((databricks_instance or "").encode("utf-8")).hexdigest()
+        self.state_file = shared_state.JsonStateFile("{}.json".format(key), const.RATE_LIMITER_DIR)
+
+    def acquire(self, endpoint_class):
+        """
+        Take a token from the bucket of the endpoint class, waiting for it if the bucket is empty.
+
+        :param endpoint_class: Class of the endpoint, see get_endpoint_class
+        :return: time waited in seconds
+        """
+        rate = self.rates.get(endpoint_class, 0)
+        if rate <= 0:
+            return 0
+
+        with self.state_file.update() as state:
+            bucket = state.setdefault(endpoint_class, {})
+            now = time.time()
+            capacity = max(1.0, rate)
+            tokens = bucket.get("tokens", capacity) + (now - bucket.get("updated", now)) * rate
+            tokens = min(capacity, tokens) - 1
+            wait_time = -tokens / rate if tokens < 0 else 0
+            bucket["tokens"] = tokens
+            bucket["updated"] = now
+            # Queue-wait metrics shared by all the search processes
+            bucket["requests"] = bucket.get("requests", 0) + 1
+            if wait_time:
+                bucket["waits"] = bucket.get("waits", 0) + 1
+                bucket["wait_time"] = bucket.get("wait_time", 0) + wait_time
+
+        if wait_time:
+            _LOGGER.info(
+                "Waiting {:.2f} seconds for the {} rate limit of {} requests per second of {}. "
+                "waits={}, requests={}, total_wait_time={:.2f}s.".format(
+                    wait_time,
+                    endpoint_class,
+                    rate,
+                    self.databricks_instance,
+                    bucket["waits"],
+                    bucket["requests"],
+                    bucket["wait_time"],
+                )
+            )
+            time.sleep(wait_time)
+        return wait_time
+
@@ -0,0 +1,170 @@
+import ta_databricks_declare  # noqa: F401
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+
+import databricks_const as const
+import databricks_common_utils as utils
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_result_cache")
+
+# Quoted literals and identifiers of a SQL query, kept as is by the normalization
+_QUOTED_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+
+
+def normalize_query(query):
+    """
+    Normalize the SQL query so that the queries differing only by whitespace share their cached result.
+
+    :param query: SQL query
+    :return: query with whitespace outside of the quoted literals collapsed and trailing semicolons removed
+    """
+    parts = _QUOTED_PATTERN.split(query.strip())
+    for index in range(0, len(parts), 2):
+        parts[index] = re.sub(r"\s+", " ", parts[index])
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def get_key(account_name, target, query, ttl=None):
+    """
+    Get the cache key of a query result.
+
+    The key includes the current time bucket of length ttl, hence a cached result is not served once its bucket is over.
+
+    :param account_name: Name of the Databricks account
+    :param target: List identifying the cluster or warehouse executing the query
+    :param query: SQL query
+    :param ttl: Time in seconds for which the result is cached, None for a key identifying the query only
+    :return: key in the form of hex string
+    """
+    key = [account_name, target, normalize_query(query)]
+    if ttl:
+        key.append(int(time.time() // ttl))
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """
+    Get the cached result of a query, counting the hit or miss.
+
+    :param key: Cache key of the result
+    :return: list of records in the form of dictionary, None if not cached
+    """
+    path = _get_entry_path(key)
+    try:
+        with open(path, "rb") as f:
+            records = load_records(f.read())
+        # The modification time orders the entries for the eviction
+        os.utime(path, None)
+    except (IOError, OSError, ValueError, zlib.error) as e:
+        if os.path.exists(path):
+            _LOGGER.warning("Unable to read the cached result {}: {}".format(key, e))
+        _count("misses", key)
+        return None
+
+    _count("hits", key)
+    return records
+
+
+def put(key, records):
+    """
+    Cache the result of a query, evicting the least recently used results beyond the size limit.
+
+    :param key: Cache key of the result
+    :param records: list of records in the form of dictionary
+    """
+    try:
+        shared_state.atomic_write(_get_entry_path(key), dump_records(records))
+        _LOGGER.info("Cached the result {} of {} record(s).".format(key, len(records)))
+        _evict(utils.get_performance_settings()["result_cache_max_size_mb"] * 1024 * 1024)
+    except Exception as e:
+        _LOGGER.warning("Unable to cache the result {}: {}".format(key, e))
+
+
+def get_stats():
+    """
+    Get the hits and misses counters of the cache, shared by all the searches.
+
+    :return: dictionary with the hits and misses counters
+    """
+    stats = shared_state.JsonStateFile(const.RESULT_CACHE_STATS_FILE, const.RESULT_CACHE_DIR).read()
+    return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
+
+
+def dump_records(records):
+    """
+    Serialize the records in a compact form: zlib compressed JSON of the field names and the rows of values.
+
+    :param records: list of records in the form of dictionary
+    :return: serialized records in the form of bytes
+    """
+    fields = []
+    for record in records:
+        for field in record:
+            if field not in fields:
+                fields.append(field)
+    entry = {"fields": fields, "rows": [[record.get(field) for field in fields] for record in records]}
+    return zlib.compress(json.dumps(entry).encode("utf-8"))
+
+
+def load_records(data):
+    """
+    Deserialize the records serialized with dump_records.
+
+    :param data: serialized records in the form of bytes
+    :return: list of records in the form of dictionary
+    """
+    entry = json.loads(zlib.decompress(data).decode("utf-8"))
+    fields = entry["fields"]
+    return [dict(zip(fields, row)) for row in entry["rows"]]
+
+
+def _evict(max_size):
+    """Remove the least recently used results until the cache fits in max_size bytes."""
+    cache_dir = shared_state.get_state_dir(const.RESULT_CACHE_DIR)
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith(".bin"):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, file_name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_name))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, file_name in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+            _LOGGER.info("Evicted the cached result {}.".format(file_name[:-4]))
+        except OSError:
+            # Already evicted by another search
+            pass
+        total_size -= size
+
+
+def _count(counter, key):
+    """Increment the hits or misses counter of the cache and log the counters."""
+    try:
+        stats_file = shared_state.JsonStateFile(const.RESULT_CACHE_STATS_FILE, const.RESULT_CACHE_DIR)
+        with stats_file.update() as stats:
+            stats[counter] = stats.get(counter, 0) + 1
+        _LOGGER.info(
+            "Result cache {} for {}. hits={}, misses={}.".format(
+                "hit" if counter == "hits" else "miss", key, stats.get("hits", 0), stats.get("misses", 0)
+            )
+        )
+    except Exception as e:
+        _LOGGER.warning("Unable to update the result cache counters: {}".format(e))
+
+
+def _get_entry_path(key):
+    """Get the path of the file holding the cached result."""
+    return os.path.join(shared_state.get_state_dir(const.RESULT_CACHE_DIR), "{}.bin".format(key))
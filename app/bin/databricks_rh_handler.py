@@ -0,0 +1,22 @@
+import ta_databricks_declare  # noqa: F401
+import databricks_config_cache as config_cache
+from splunk_aoblib.rest_migration import ConfigMigrationHandler
+
+
+class DatabricksConfigHandler(ConfigMigrationHandler):
+    """REST handler of the add-on configurations, invalidating the configuration cache on modification."""
+
+    def handleCreate(self, confInfo):
+        """Create the stanza and invalidate the configuration cache."""
+        ConfigMigrationHandler.handleCreate(self, confInfo)
+        config_cache.invalidate()
+
+    def handleEdit(self, confInfo):
+        """Update the stanza and invalidate the configuration cache."""
+        ConfigMigrationHandler.handleEdit(self, confInfo)
+        config_cache.invalidate()
+
+    def handleRemove(self, confInfo):
+        """Remove the stanza and invalidate the configuration cache."""
+        ConfigMigrationHandler.handleRemove(self, confInfo)
+        config_cache.invalidate()
@@ -0,0 +1,67 @@
+import ta_databricks_declare  # noqa: F401
+import sys
+import traceback
+from urllib.parse import urlsplit
+
+import databricks_const as const
+from databricks_run_status_collector import RunStatusCollector
+from log_manager import setup_logging
+
+import splunklib.client as client
+from splunklib.modularinput import Script, Scheme, Argument
+
+_LOGGER = setup_logging("ta_databricks_run_status_input")
+
+
+class DatabricksRunStatusInput(Script):
+    """Modular input updating the state of the runs submitted from Splunk in the KV store."""
+
+    def get_scheme(self):
+        """
+        Describe the arguments of the input.
+
+        :return: Scheme object
+        """
+        scheme = Scheme("Databricks Run Status")
+        scheme.description = (
+            "Periodically update the state of the runs submitted by databricksrun and databricksjob."
+        )
+        scheme.use_external_validation = False
+        scheme.use_single_instance = False
+
+        account_name = Argument("account_name")
+        account_name.title = "Databricks Account"
+        account_name.description = "Configured account name whose runs are updated."
+        account_name.required_on_create = True
+        scheme.add_argument(account_name)
+        return scheme
+
+    def stream_events(self, inputs, ew):
+        """
+        Update the state of the runs of the account of each input.
+
+        :param inputs: InputDefinition object
+        :param ew: EventWriter object, unused as the state is written to the KV store
+        """
+        session_key = inputs.metadata["session_key"]
+        splunkd = urlsplit(inputs.metadata["server_uri"], allow_fragments=False)
+        service = client.Service(
+            scheme=splunkd.scheme,
+            host=splunkd.hostname,
+            port=splunkd.port,
+            token=session_key,
+            owner="nobody",
+            app=const.APP_NAME,
+        )
+        for input_name, input_item in inputs.inputs.items():
+            account_name = input_item.get("account_name")
+            _LOGGER.info("Collecting the run status of account {} for input {}.".format(account_name, input_name))
+            try:
+                RunStatusCollector(service, session_key, account_name).collect()
+            except Exception as e:
+                _LOGGER.error("Unable to collect the run status of account {}: {}".format(account_name, e))
+                _LOGGER.debug(traceback.format_exc())
+
+
+if __name__ == "__main__":
+    sys.exit(DatabricksRunStatusInput().run(sys.argv))
@@ -0,0 +1,173 @@
+import ta_databricks_declare  # noqa: F401
+import json
+import time
+
+import databricks_com as com
+import databricks_const as const
+import databricks_shared_state as shared_state
+from databricks_run_tracker import get_run_fields, is_terminated
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_run_status_collector")
+
+
+class RunStatusCollector(object):
+    """
+    A class to update the state of the runs submitted from Splunk in the KV store, without polling each run.
+
+    The completed runs of the account are paged through with jobs/runs/list, starting from the submission
+    time of the oldest run not terminated in the KV store, until all these runs are found. The KV store
+    entries are updated in bulk with batch_save. The time since which each entry is left unmatched is kept
+    in a checkpoint. The entries unmatched for longer than RUN_STATUS_UNMATCHED_TIMEOUT_IN_SECONDS, e.g. long
+    running runs, are checked on their own with jobs/runs/get instead, so that they do not keep the whole window
+    paged through, and are no longer looked for once jobs/runs/get reports that they do not exist.
+    """
+
+    def __init__(self, service, session_key, account_name, databricks_client=None):
+        """
+        Initialize RunStatusCollector object.
+
+        :param service: splunklib Service object in the namespace of the app
+        :param session_key: Splunk session key
+        :param account_name: Name of the Databricks account
+        :param databricks_client: DatabricksClient object, created when a run is pending completion
+        """
+        self.session_key = session_key
+        self.account_name = account_name
+        self.service = service
+        self.client = databricks_client
+        self.checkpoint = shared_state.JsonStateFile(
+            "{}.json".format(account_name), const.RUN_STATUS_CHECKPOINT_DIR
+        )
+
+    def collect(self):
+        """
+        Update the KV store entries of the runs of the account which completed since they were submitted.
+
+        :return: number of KV store entries updated
+        """
+        now = time.time()
+        pending = self.get_pending_entries()
+        previous_checkpoint = self.checkpoint.read()
+        previous_unmatched = previous_checkpoint.get("unmatched", {})
+        previous_missing = previous_checkpoint.get("missing", [])
+        unmatched = {run_id: since for run_id, since in previous_unmatched.items() if run_id in pending}
+        missing = [run_id for run_id in previous_missing if run_id in pending]
+        for run_id in missing:
+            pending.pop(run_id)
+
+        updates = {}
+        expired = [
+            run_id for run_id, since in unmatched.items() if now - since > const.RUN_STATUS_UNMATCHED_TIMEOUT_IN_SECONDS
+        ]
+        if expired and self.client is None:
+            self.client = com.DatabricksClient(self.account_name, self.session_key)
+        for run_id in expired:
+            # Checked on its own, so that a long running or deleted run does not keep the whole window paged through
+            collection_name, entry = pending.pop(run_id)
+            try:
+                run = self.client.databricks_api("get", const.GET_RUN_ENDPOINT, args={"run_id": run_id})
+            except Exception as e:
+                if "does not exist" in str(e).lower():
+                    _LOGGER.info("Not looking for run {} any longer, it does not exist.".format(run_id))
+                    unmatched.pop(run_id)
+                    missing.append(run_id)
+                else:
+                    _LOGGER.warning("Unable to get the state of run {}: {}".format(run_id, e))
+                continue
+            if is_terminated(run):
+                entry.update(get_run_fields(run))
+                updates.setdefault(collection_name, []).append(entry)
+                unmatched.pop(run_id)
+
+        if pending:
+            if self.client is None:
+                self.client = com.DatabricksClient(self.account_name, self.session_key)
+            start_time_from = min(entry["created_time"] for _, entry in pending.values())
+            for run in self.list_completed_runs(int((start_time_from - const.RUN_STATUS_CLOCK_SKEW_IN_SECONDS) * 1000)):
+                run_id = str(run.get("run_id"))
+                if run_id not in pending:
+                    continue
+                collection_name, entry = pending.pop(run_id)
+                entry.update(get_run_fields(run))
+                updates.setdefault(collection_name, []).append(entry)
+                unmatched.pop(run_id, None)
+                if not pending:
+                    break
+
+        updated_count = 0
+        for collection_name, entries in updates.items():
+            updated_count += self.save_entries(collection_name, entries)
+        for run_id in pending:
+            unmatched.setdefault(run_id, now)
+        if unmatched != previous_unmatched or missing != previous_missing:
+            with self.checkpoint.update() as checkpoint:
+                checkpoint["unmatched"] = unmatched
+                checkpoint["missing"] = missing
+        _LOGGER.info(
+            "Updated {} run(s) of account {}, {} run(s) still pending completion.".format(
+                updated_count, self.account_name, len(unmatched)
+            )
+        )
+        return updated_count
+
+    def get_pending_entries(self):
+        """
+        Get the KV store entries of the runs of the account submitted recently and not terminated yet.
+
+        :return: dictionary of run ID to a tuple of the KV store collection name and the entry
+        """
+        query = json.dumps(
+            {
+                "$and": [
+                    {"account_name": self.account_name},
+                    {"run_id": {"$ne": "-"}},
+                    {"created_time": {"$gt": time.time() - const.RUN_STATUS_LOOKBACK_IN_SECONDS}},
+                ]
+                + [{"life_cycle_state": {"$ne": state}} for state in const.RUN_TERMINAL_STATES]
+            }
+        )
+        pending = {}
+        for collection_name in (const.KV_COLLECTION_NAME_SUBMIT_RUN, const.KV_COLLECTION_NAME_EXECUTE_JOB):
+            entries = self.service.kvstore[collection_name].data.query(query=query)
+            for entry in entries:
+                # The metadata fields other than the key can not be saved back
+                entry = {key: value for key, value in entry.items() if key == "_key" or not key.startswith("_")}
+                pending[str(entry.get("run_id"))] = (collection_name, entry)
+        return pending
+
+    def list_completed_runs(self, start_time_from):
+        """
+        Page through the completed runs of the workspace.
+
+        :param start_time_from: Start time in milliseconds of the oldest run to list
+        :return: generator of runs in the form of dictionary
+        """
+        offset = 0
+        while True:
+            args = {
+                "completed_only": "true",
+                "start_time_from": start_time_from,
+                "offset": offset,
+                "limit": const.RUNS_LIST_PAGE_SIZE,
+            }
+            response = self.client.databricks_api("get", const.RUNS_LIST_ENDPOINT, args=args)
+            runs = response.get("runs") or []
+            for run in runs:
+                yield run
+            if not response.get("has_more") or not runs:
+                return
+            offset += len(runs)
+
+    def save_entries(self, collection_name, entries):
+        """
+        Save the updated entries in batches.
+
+        :param collection_name: Name of the KV store collection
+        :param entries: list of entries in the form of dictionary
+        :return: number of entries saved
+        """
+        data = self.service.kvstore[collection_name].data
+        for index in range(0, len(entries), const.KV_BATCH_SAVE_SIZE):
+            data.batch_save(*entries[index:index + const.KV_BATCH_SAVE_SIZE])
+        return len(entries)
@@ -0,0 +1,130 @@
+import ta_databricks_declare  # noqa: F401
+import traceback
+
+import databricks_com as com
+import databricks_const as const
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_run_tracker")
+
+
+def is_terminated(run):
+    """
+    Check whether a run reached a terminal state.
+
+    :param run: Details of the run given by runs/get
+    :return: True if the run is terminated, skipped or failed internally
+    """
+    return (run.get("state") or {}).get("life_cycle_state") in const.RUN_TERMINAL_STATES
+
+
+def get_run_fields(run):
+    """
+    Get the result fields of a run.
+
+    :param run: Details of the run given by runs/get, along with its notebook output
+    :return: dictionary of the state and notebook result of the run
+    """
+    state = run.get("state") or {}
+    notebook_output = run.get("notebook_output") or {}
+    return {
+        "life_cycle_state": state.get("life_cycle_state", "-"),
+        "result_state": state.get("result_state", "-"),
+        "state_message": state.get("state_message") or "-",
+        "notebook_result": notebook_output.get("result", "-"),
+    }
+
+
+def wait_for_run(client, run_id, timeout, kv_log_info, warn):
+    """
+    Wait for the completion of a run and add its state and notebook result to its log info.
+
+    The run is already submitted and logged, hence a failure to get its state is reported as a warning.
+
+    :param client: DatabricksClient object
+    :param run_id: ID of the run
+    :param timeout: Time to wait in seconds for the completion of the run
+    :param kv_log_info: Information of the run logged in the KV Store
+    :param warn: Callable used to report warnings to the user
+    :return: True if the state of the run was added to the log info
+    """
+    _LOGGER.info("Waiting up to {} seconds for the completion of run ID: {}".format(timeout, run_id))
+    try:
+        runs, pending = RunTracker(client, timeout).wait([run_id])
+    except Exception as e:
+        _LOGGER.error("Unable to get the state of run {}: {}".format(run_id, e))
+        _LOGGER.debug(traceback.format_exc())
+        warn("Unable to get the state of run {}: {}".format(run_id, e))
+        return False
+    kv_log_info.update(get_run_fields(runs[run_id]))
+    if pending:
+        warn("Run {} did not complete within {} seconds.".format(run_id, timeout))
+    return True
+
+
+class RunTracker(object):
+    """A class to wait for the completion of a set of runs with a single polling loop."""
+
+    def __init__(self, client, timeout):
+        """
+        Initialize RunTracker object.
+
+        :param client: DatabricksClient object
+        :param timeout: Time to wait in seconds for the completion of the runs
+        """
+        self.client = client
+        self.timeout = timeout
+
+    def wait(self, run_ids):
+        """
+        Wait for the completion of the runs and get the output of their notebook.
+
+        :param run_ids: list of IDs of the runs
+        :return: tuple of dictionary of run ID to the last details of the run, and set of the IDs of the runs
+                 which did not complete within the timeout
+        """
+        runs = {}
+        pending = set(run_ids)
+        poller = com.AdaptivePoller(self.timeout)
+        for _ in poller:
+            for run_id in list(pending):
+                run = runs[run_id] = self.get_run(run_id)
+                if is_terminated(run):
+                    pending.discard(run_id)
+                    run["notebook_output"] = self.get_notebook_output(run_id)
+                    _LOGGER.info(
+                        "Run {} completed with state {}.".format(run_id, get_run_fields(run)["result_state"])
+                    )
+            if not pending:
+                break
+            poller.retry_after = self.client.get_retry_after()
+        poller.log_metrics("completion of {} run(s)".format(len(run_ids)))
+
+        for run_id in pending:
+            if run_id not in runs:
+                runs[run_id] = self.get_run(run_id)
+        return runs, pending
+
+    def get_run(self, run_id):
+        """
+        Get the details of a run.
+
+        :param run_id: ID of the run
+        :return: details of the run in the form of dictionary
+        """
+        return self.client.databricks_api("get", const.GET_RUN_ENDPOINT, args={"run_id": run_id})
+
+    def get_notebook_output(self, run_id):
+        """
+        Get the notebook output of a terminated run, i.e. the value passed to dbutils.notebook.exit().
+
+        :param run_id: ID of the run
+        :return: notebook output in the form of dictionary, empty if it is not available
+        """
+        try:
+            response = self.client.databricks_api("get", const.GET_RUN_OUTPUT_ENDPOINT, args={"run_id": run_id})
+        except Exception as e:
+            # e.g. runs of jobs with multiple tasks
+            _LOGGER.warning("Unable to get the output of run {}: {}".format(run_id, e))
+            return {}
+        return response.get("notebook_output") or {}
@@ -0,0 +1,169 @@
+import ta_databricks_declare  # noqa: F401
+import os
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+
+import databricks_const as const
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+def get_splunk_home():
+    """
+    Get the Splunk installation directory.
+
+    :return: absolute path of $SPLUNK_HOME
+    """
+    return os.environ.get("SPLUNK_HOME") or os.path.abspath(
+        os.path.join(__file__, "..", "..", "..", "..", "..")
+    )
+
+
+def get_state_dir(*parts):
+    """
+    Get the directory used to share state between the processes of the add-on.
+
+    The directory is created under $SPLUNK_HOME/var/run if it does not exist.
+
+    :param parts: Sub-directories to append to the state directory
+    :return: absolute path of the directory
+    """
+    state_dir = os.path.join(get_splunk_home(), "var", "run", const.APP_NAME, *parts)
+    if not os.path.isdir(state_dir):
+        os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+
+def atomic_write(path, content):
+    """
+    Atomically replace the content of a file. The file is only readable by the owner.
+
+    :param path: Path of the file
+    :param content: Content of the file in the form of bytes
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class FileLock(object):
+    """An exclusive lock backed by a file, shared between the processes of the add-on."""
+
+    def __init__(self, path, timeout=const.STATE_LOCK_TIMEOUT_IN_SECONDS):
+        """
+        Initialize FileLock object.
+
+        :param path: Path of the lock file
+        :param timeout: Time to wait in seconds to acquire the lock, None to wait forever
+        """
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """
+        Acquire the lock.
+
+        :param blocking: Whether to wait for the lock if it is held by another process
+        :return: True if the lock is acquired, False otherwise
+        """
+        self._file = open(self.path, "a+")
+        start_time = time.time()
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except (IOError, OSError):
+                timed_out = self.timeout is not None and time.time() - start_time >= self.timeout
+                if not blocking or timed_out:
+                    self._file.close()
+                    self._file = None
+                    if blocking:
+                        raise Exception("Timed out while waiting for lock {}.".format(self.path))
+                    return False
+                time.sleep(const.STATE_LOCK_RETRY_INTERVAL_IN_SECONDS)
+
+    def release(self):
+        """Release the lock."""
+        if not self._file:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """Acquire the lock when entering the context."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        """Release the lock when leaving the context."""
+        self.release()
+
+
+class JsonStateFile(object):
+    """A JSON document stored in the state directory, updated under an exclusive lock."""
+
+    def __init__(self, name, *parts):
+        """
+        Initialize JsonStateFile object.
+
+        :param name: Name of the state file
+        :param parts: Sub-directories of the state directory holding the file
+        """
+        self.path = os.path.join(get_state_dir(*parts), name)
+        self.lock = FileLock("{}.lock".format(self.path))
+
+    def read(self):
+        """
+        Read the state without taking the lock. Writes are atomic, hence a consistent state is always read.
+
+        :return: state in the form of dictionary
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def write(self, state):
+        """
+        Atomically replace the state. The caller is expected to hold the lock.
+
+        :param state: state in the form of dictionary
+        """
+        atomic_write(self.path, json.dumps(state).encode("utf-8"))
+
+    @contextmanager
+    def update(self):
+        """
+        Read-modify-write the state under the lock. Changes made to the yielded dictionary are saved on exit.
+
+        :return: state in the form of dictionary
+        """
+        with self.lock:
+            state = self.read()
+            yield state
+            self.write(state)
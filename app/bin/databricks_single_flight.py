@@ -0,0 +1,131 @@
+import ta_databricks_declare  # noqa: F401
+import os
+import re
+import time
+
+import databricks_const as const
+import databricks_result_cache as result_cache
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_single_flight")
+
+# Leading comments, blank characters and parentheses of a statement
+_LEADING_NOISE = re.compile(r"^(?:\s+|\(|--[^\n]*(?:\n|$)|/\*.*?\*/)*", re.DOTALL)
+_NON_DETERMINISTIC = re.compile(
+    r"\b(?:{})\s*\(|\btablesample\b".format("|".join(const.NON_DETERMINISTIC_FUNCTIONS)), re.IGNORECASE
+)
+
+
+def is_shareable(query):
+    """
+    Check whether the result of a query can be shared with the identical searches.
+
+    Only the read-only statements are shared, hence an identical DML statement is always executed.
+    The statements calling a non-deterministic function or sampling a table are not shared either.
+
+    :param query: SQL query
+    :return: True if the result of the query can be shared
+    """
+    statement = _LEADING_NOISE.sub("", query)
+    keyword = statement.split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword in const.SINGLE_FLIGHT_STATEMENTS and not _NON_DETERMINISTIC.search(statement)
+
+
+class SingleFlight(object):
+    """
+    Coalescing of the identical queries executed at the same time by the searches of the instance.
+
+    The first search executing a query becomes its leader and holds a lock file for the query until it is done.
+    The identical searches started meanwhile wait on the lock and get the result the leader spooled,
+    instead of executing the query again.
+    """
+
+    def __init__(self, account_name, target, query, timeout):
+        """
+        Initialize SingleFlight object.
+
+        :param account_name: Name of the Databricks account
+        :param target: List identifying the cluster or warehouse executing the query
+        :param query: SQL query
+        :param timeout: Time to wait in seconds for the leader to complete
+        """
+        self.key = key = result_cache.get_key(account_name, target, query)
+        spool_dir = shared_state.get_state_dir(const.SINGLE_FLIGHT_DIR)
+        self.spool_path = os.path.join(spool_dir, "{}.bin".format(key))
+        self.lock = shared_state.FileLock(os.path.join(spool_dir, "{}.lock".format(key)), timeout=timeout)
+        self.leader = False
+
+    def join(self):
+        """
+        Become the leader of the query, or wait for the leader and get its result.
+
+        :return: list of records in the form of dictionary shared by the leader,
+                 None if the query is to be executed by the caller
+        """
+        if self.lock.acquire(blocking=False):
+            self.leader = True
+            os.utime(self.lock.path, None)
+            # The result of a previous leader is never shared
+            self._remove(self.spool_path)
+            self._remove_stale()
+            _LOGGER.info("Executing the query {} as leader.".format(self.key))
+            return None
+
+        _LOGGER.info("Waiting for the identical query {} executed by another search.".format(self.key))
+        try:
+            self.lock.acquire()
+        except Exception as e:
+            _LOGGER.warning("Stopped waiting for the identical query: {}".format(e))
+            return None
+
+        try:
+            with open(self.spool_path, "rb") as f:
+                records = result_cache.load_records(f.read())
+        except Exception as e:
+            # The leader failed or its result was too large to be shared
+            _LOGGER.info("Result of the identical query is not available, executing the query. Reason: {}".format(e))
+            return None
+        finally:
+            self.lock.release()
+        _LOGGER.info("Sharing the {} record(s) of the identical query {}.".format(len(records), self.key))
+        return records
+
+    def share(self, records):
+        """
+        Spool the result of the leader for the searches waiting for it.
+
+        :param records: list of records in the form of dictionary
+        """
+        if not self.leader:
+            return
+        try:
+            shared_state.atomic_write(self.spool_path, result_cache.dump_records(records))
+        except Exception as e:
+            _LOGGER.warning("Unable to share the result of the query {}: {}".format(self.key, e))
+
+    def leave(self):
+        """Release the query, letting the waiting searches get the result."""
+        if self.leader:
+            self.leader = False
+            self.lock.release()
+
+    def _remove_stale(self):
+        """Remove the spooled results and the lock files of the queries not executed for a while."""
+        spool_dir = os.path.dirname(self.spool_path)
+        expiry_time = time.time() - const.SINGLE_FLIGHT_RETENTION_IN_SECONDS
+        for file_name in os.listdir(spool_dir):
+            path = os.path.join(spool_dir, file_name)
+            try:
+                if os.path.getmtime(path) < expiry_time:
+                    self._remove(path)
+            except OSError:
+                continue
+
+    @staticmethod
+    def _remove(path):
+        """Remove a file, ignoring a file removed by another search."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,118 @@
+import ta_databricks_declare  # noqa: F401
+import os
+import json
+import time
+import base64
+import hashlib
+
+import databricks_const as const
+import databricks_common_utils as utils
+import databricks_shared_state as shared_state
+from log_manager import setup_logging
+
+_LOGGER = setup_logging("ta_databricks_token_manager")
+
+
+def get_token_expiry(token):
+    """
+    Get the expiry time of an access token by decoding the exp claim of the JWT.
+
+    The signature is not verified as the token is only inspected, never trusted.
+
+    :param token: Access token
+    :return: expiry time in epoch seconds, None if the token is not a JWT
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload.encode("utf-8")))["exp"])
+    except Exception:
+        return None
+
+
+class AadTokenManager(object):
+    """
+    A class to manage the lifecycle of the AAD access token of an account.
+
+    The token is refreshed ahead of its expiry. Concurrent searches are serialized by a file lock, hence
+    the token is requested by a single search and the others pick it up from the saved configurations.
+    """
+
+    def __init__(self, session_key, account_name, aad_tenant_id, aad_client_id, aad_client_secret):
+        """
+        Initialize AadTokenManager object.
+
+        :param session_key: Splunk session key
+        :param account_name: Name of the Databricks account
+        :param aad_tenant_id: Azure Active Directory tenant ID
+        :param aad_client_id: Azure Active Directory client ID
+        :param aad_client_secret: Azure Active Directory client secret
+        """
+        self.session_key = session_key
+        self.account_name = account_name
+        self.aad_tenant_id = aad_tenant_id
+        self.aad_client_id = aad_client_id
+        self.aad_client_secret = aad_client_secret
+        lock_name = "{}.lock".format(hashlib.sha256(account_name.encode("utf-8")).hexdigest())
+        self.lock = shared_state.FileLock(os.path.join(shared_state.get_state_dir(const.AAD_TOKEN_LOCK_DIR), lock_name))
+
+    def is_expiring(self, token):
+        """
+        Check whether the token expires within the refresh margin.
+
+        :param token: Access token
+        :return: True if the token should be refreshed, False otherwise or if its expiry is unknown
+        """
+        expiry = get_token_expiry(token) if token else None
+        if expiry is None:
+            return False
+        return expiry - time.time() < const.AAD_TOKEN_REFRESH_MARGIN_IN_SECONDS
+
+    def get_token(self, token):
+        """
+        Get a valid access token, refreshing the given token if it is about to expire.
+
+        :param token: Current access token
+        :return: access token
+        """
+        if not self.is_expiring(token):
+            return token
+        _LOGGER.info("AAD access token is about to expire, refreshing it.")
+        return self.refresh(token)
+
+    def refresh(self, stale_token):
+        """
+        Refresh the access token, unless another search already refreshed it.
+
+        :param stale_token: Access token to be replaced
+        :return: access token
+        """
+        with self.lock:
+            # The token may have been refreshed by another search while waiting for the lock
+            configs = utils.get_databricks_configs(self.session_key, self.account_name) or {}
+            token = configs.get("aad_access_token")
+            if token and token != stale_token and not self.is_expiring(token):
+                _LOGGER.info("Using the AAD access token refreshed by another search.")
+                return token
+
+            _LOGGER.info("Refreshing AAD token.")
+            proxy_settings = utils.get_proxy_uri(self.session_key)
+            token = utils.get_aad_access_token(
+                self.session_key,
+                self.account_name,
+                self.aad_tenant_id,
+                self.aad_client_id,
+                self.aad_client_secret,
+                proxy_settings,
+                retry=const.RETRIES,
+            )
+            if isinstance(token, tuple):
+                raise Exception(token[0])
+
+            try:
+                utils.save_databricks_aad_access_token(
+                    self.account_name, self.session_key, token, self.aad_client_secret
+                )
+            except Exception as e:
+                _LOGGER.warning("Unable to share the refreshed AAD access token: {}".format(e))
+            return token
@@ -95,12 +95,10 @@ class ValidateDatabricksInstance(Validator):
             "User-Agent": "{}".format(const.USER_AGENT_CONST)
         }
         _LOGGER.debug(
-            "Request made to the Databricks from Splunk user: {}".format(
-                utils.get_current_user(self._splunk_session_key)
-            )
+            "Request made to the Databricks from Splunk user: %s", utils.CurrentUser(self._splunk_session_key)
         )
         try:
-            resp = requests.get(
+            resp = utils.get_http_session().get(
                 req_url,
                 headers=headers,
                 proxies=self._proxy_settings,
@@ -2,10 +2,12 @@ import ta_databricks_declare  # noqa: F401
 import sys
 import time
 import traceback
+import uuid
 
 import databricks_com as com
 import databricks_const as const
 import databricks_common_utils as utils
+from databricks_run_tracker import wait_for_run
 from log_manager import setup_logging
 
 from splunklib.searchcommands import (
@@ -27,6 +29,8 @@ class DatabricksJobCommand(GeneratingCommand):
     job_id = Option(require=True, validate=validators.Integer(0))
     account_name = Option(require=True)
     notebook_params = Option(require=False)
+    wait = Option(require=False, validate=validators.Boolean())
+    command_timeout = Option(require=False, validate=validators.Integer(minimum=1))
 
     def generate(self):
         """Generating custom command."""
@@ -42,13 +46,18 @@ class DatabricksJobCommand(GeneratingCommand):
             "command_status": "Failed",
             "error": "-",
         }
+        if self.wait:
+            # The record logged on submission is updated once the run completes
+            kv_log_info["_key"] = uuid.uuid4().hex
 
         session_key = self._metadata.searchinfo.session_key
 
         try:
 
             # Get job details
-            client = com.DatabricksClient(self.account_name, session_key)
+            client = com.DatabricksClient(
+                self.account_name, session_key, username=self._metadata.searchinfo.username
+            )
 
             payload = {
                 "job_id": self.job_id,
@@ -114,6 +123,16 @@ class DatabricksJobCommand(GeneratingCommand):
                 kv_log_info,
             )
 
+        timeout = self.command_timeout or const.RUN_WAIT_TIMEOUT_IN_SECONDS
+        if self.wait and wait_for_run(client, run_id, timeout, kv_log_info, self.write_warning):
+            updated_kv_info = utils.update_kv_store_collection(
+                self._metadata.searchinfo.splunkd_uri,
+                const.KV_COLLECTION_NAME_EXECUTE_JOB,
+                session_key,
+                kv_log_info,
+                key=kv_log_info["_key"],
+            )
+
         yield updated_kv_info
 
 
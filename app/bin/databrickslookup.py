@@ -0,0 +1,268 @@
+import ta_databricks_declare  # noqa: F401
+import re
+import sys
+import time
+import traceback
+from collections import OrderedDict
+
+import databricks_com as com
+import databricks_const as const
+import databricks_common_utils as utils
+import databricks_query_executor as executors
+from databricks_context_registry import ContextRegistry
+from log_manager import setup_logging
+
+from splunklib.searchcommands import (
+    dispatch,
+    StreamingCommand,
+    Configuration,
+    Option,
+    validators,
+)
+
+_LOGGER = setup_logging("ta_databrickslookup_command")
+
+# Table names, optionally qualified by the catalog and schema
+TABLE_NAME_PATTERN = re.compile(r"^(`[^`]+`|[\w-]+)(\.(`[^`]+`|[\w-]+)){0,2}$")
+
+
+@Configuration(distributed=False)
+class DatabricksLookupCommand(StreamingCommand):
+    """Custom Command of databrickslookup."""
+
+    # Take input from user using parameters
+    account_name = Option(require=True)
+    table = Option(require=True)
+    key_field = Option(require=True, validate=validators.Fieldname())
+    key_column = Option(require=False)
+    columns = Option(require=False)
+    cluster = Option(require=False)
+    warehouse_id = Option(require=False)
+    batch_size = Option(require=False, validate=validators.Integer(minimum=1, maximum=const.LOOKUP_MAX_BATCH_SIZE))
+    cache_ttl = Option(require=False, validate=validators.Integer(minimum=0))
+    command_timeout = Option(require=False, validate=validators.Integer(minimum=1))
+
+    def __init__(self):
+        """Initialize the command, along with the cache of the resolved keys kept across the chunks of records."""
+        super(DatabricksLookupCommand, self).__init__()
+        self.executor = None
+        self.cache = OrderedDict()
+        self.query_count = 0
+
+    def stream(self, records):
+        """
+        Enrich the records with the rows of the table matching their key.
+
+        The distinct keys not cached are resolved in batches, with a single query per batch.
+
+        :param records: generator of the records of the search
+        :return: generator of the enriched records
+        """
+        try:
+            if not TABLE_NAME_PATTERN.match(self.table or ""):
+                raise Exception("Invalid table name {}.".format(self.table))
+            batch_size = self.batch_size or const.LOOKUP_BATCH_SIZE
+            pending_records = []
+            pending_keys = set()
+
+            for record in records:
+                pending_keys.update(key for key in self.get_keys(record) if self.get_cached(key) is None)
+                if not pending_keys:
+                    yield self.enrich(record)
+                    continue
+
+                pending_records.append(record)
+                if len(pending_keys) >= batch_size:
+                    self.resolve(pending_keys)
+                    for pending_record in pending_records:
+                        yield self.enrich(pending_record)
+                    pending_records, pending_keys = [], set()
+
+            if pending_keys:
+                self.resolve(pending_keys)
+            for pending_record in pending_records:
+                yield self.enrich(pending_record)
+
+            _LOGGER.info(
+                "Resolved the keys with {} query(ies), {} key(s) cached.".format(self.query_count, len(self.cache))
+            )
+        except Exception as e:
+            _LOGGER.error(e)
+            _LOGGER.error(traceback.format_exc())
+            self.write_error(str(e))
+
+    def enrich(self, record):
+        """
+        Add the fields of the rows matching the keys of the record.
+
+        Multiple rows give multivalue fields, except the key column which holds the distinct keys matched.
+
+        :param record: Record of the search
+        :return: the enriched record
+        """
+        rows = []
+        for key in self.get_keys(record):
+            rows.extend(self.get_cached(key) or [])
+        if not rows:
+            return record
+        if len(rows) == 1:
+            record.update(rows[0])
+            return record
+        key_column = self.key_column or self.key_field
+        for field in rows[0]:
+            values = [row.get(field) for row in rows]
+            if field == key_column:
+                values = list(OrderedDict.fromkeys(values))
+            record[field] = values[0] if len(values) == 1 else values
+        return record
+
+    def get_keys(self, record):
+        """
+        Get the distinct keys of a record, a multivalue key field giving one key per value.
+
+        :param record: Record of the search
+        :return: list of keys in the form of string
+        """
+        value = record.get(self.key_field)
+        values = value if isinstance(value, list) else [value]
+        keys = [str(value) for value in values if value is not None and str(value) != ""]
+        return list(OrderedDict.fromkeys(keys))
+
+    def get_cached(self, key):
+        """
+        Get the rows of a key from the cache, marking it as the most recently used.
+
+        :param key: Key of the lookup
+        :return: list of rows, empty if the key matches no row, None if the key is not cached or expired
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        rows, resolved_time = entry
+        if time.time() - resolved_time > self.get_cache_ttl():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return rows
+
+    def get_cache_ttl(self):
+        """Get the time in seconds for which the rows of a key are cached."""
+        return const.LOOKUP_CACHE_TTL_IN_SECONDS if self.cache_ttl is None else self.cache_ttl
+
+    def resolve(self, keys):
+        """
+        Query the rows of the keys and cache them, evicting the least recently used keys beyond the cache size.
+
+        :param keys: set of keys to resolve
+        """
+        key_column = self.key_column or self.key_field
+        rows_by_key = {key: [] for key in keys}
+        for row in self.get_executor().execute(self.get_query(key_column, keys)):
+            key = row.get(key_column)
+            if key is not None and str(key) in rows_by_key:
+                rows_by_key[str(key)].append(row)
+        self.query_count += 1
+
+        now = time.time()
+        for key, rows in rows_by_key.items():
+            self.cache[key] = (rows, now)
+            self.cache.move_to_end(key)
+        while len(self.cache) > const.LOOKUP_CACHE_MAX_ENTRIES:
+            self.cache.popitem(last=False)
+
+    def get_query(self, key_column, keys):
+        """
+        Build the query of the rows of the keys.
+
+        :param key_column: Column of the table holding the key
+        :param keys: set of keys to resolve
+        :return: SQL query
+        """
+        columns = [column.strip() for column in (self.columns or "").split(",") if column.strip()]
+        if columns and key_column not in columns:
+            # The key column maps the rows to the keys
+            columns.append(key_column)
+        columns = ", ".join(quote_identifier(column) for column in columns) or "*"
+        return "SELECT {} FROM {} WHERE {} IN ({})".format(
+            columns,
+            self.table,
+            quote_identifier(key_column),
+            ", ".join(quote_literal(key) for key in sorted(keys)),
+        )
+
+    def get_executor(self):
+        """
+        Get the executor of the queries, created on the first query.
+
+        The warehouse_id or cluster parameter is used if provided, then the warehouse of the account, then its cluster.
+
+        :return: ClusterQueryExecutor or StatementQueryExecutor object
+        """
+        if self.executor:
+            return self.executor
+
+        session_key = self._metadata.searchinfo.session_key
+        databricks_configs = utils.get_databricks_configs(session_key, self.account_name)
+        if not databricks_configs:
+            raise Exception(
+                "Account '{}' not found. Please provide valid Databricks account.".format(self.account_name)
+            )
+        command_timeout = self.command_timeout or const.COMMAND_TIMEOUT_IN_SECONDS
+        client = com.DatabricksClient(
+            self.account_name,
+            session_key,
+            username=self._metadata.searchinfo.username,
+            databricks_configs=databricks_configs,
+            retry_budget=command_timeout,
+        )
+
+        warehouse_id = self.warehouse_id or (None if self.cluster else databricks_configs.get("warehouse_id"))
+        if warehouse_id:
+            _LOGGER.info("Using SQL warehouse {} to resolve the keys.".format(warehouse_id))
+            self.executor = executors.StatementQueryExecutor(
+                client, warehouse_id, command_timeout, warn=self.write_warning
+            )
+            return self.executor
+
+        cluster = self.cluster or databricks_configs.get("cluster_name")
+        if not cluster:
+            raise Exception(
+                "Databricks SQL warehouse or cluster is required to execute this custom command. "
+                "Provide a warehouse_id or cluster parameter or configure them in the TA's configuration page."
+            )
+        _LOGGER.info("Using cluster {} to resolve the keys.".format(cluster))
+        registry = ContextRegistry(
+            self._metadata.searchinfo.splunkd_uri, session_key, self._metadata.searchinfo.sid
+        )
+        self.executor = executors.ClusterQueryExecutor(
+            client,
+            client.get_cluster_id(cluster),
+            command_timeout,
+            warn=self.write_warning,
+            registry=registry,
+            user=self._metadata.searchinfo.username,
+        )
+        return self.executor
+
+
+def quote_identifier(identifier):
+    """
+    Quote an identifier of a SQL query.
+
+    :param identifier: Name of a column
+    :return: identifier quoted with backticks
+    """
+    return "`{}`".format(identifier.replace("`", "``"))
+
+
+def quote_literal(value):
+    """
+    Quote a string literal of a SQL query.
+
+    :param value: String value
+    :return: literal quoted with single quotes, with backslashes and quotes escaped
+    """
+    return "'{}'".format(value.replace("\\", "\\\\").replace("'", "\\'"))
+
+
+dispatch(DatabricksLookupCommand, sys.argv, sys.stdin, sys.stdout, __name__)
@@ -1,11 +1,16 @@
 import ta_databricks_declare  # noqa: F401
 import sys
+import functools
 import traceback
-import time
 
 import databricks_com as com
 import databricks_const as const
 import databricks_common_utils as utils
+import databricks_query_executor as executors
+import databricks_result_cache as result_cache
+from databricks_context_registry import ContextRegistry
+from databricks_fan_out import FanOutQueryExecutor
+from databricks_single_flight import SingleFlight, is_shareable
 from log_manager import setup_logging
 
 from splunklib.searchcommands import (
@@ -25,9 +30,15 @@ class DatabricksQueryCommand(GeneratingCommand):
 
     # Take input from user using parameters
     cluster = Option(require=False)
+    cluster_id = Option(require=False)
+    warehouse_id = Option(require=False)
     query = Option(require=True)
     account_name = Option(require=True)
     command_timeout = Option(require=False, validate=validators.Integer(minimum=1))
+    backend = Option(require=False, validate=validators.Set("cluster", "sql"))
+    wait_timeout = Option(require=False, validate=validators.Integer(minimum=0, maximum=50))
+    cache_ttl = Option(require=False, validate=validators.Integer(minimum=0))
+    time_column = Option(require=False)
 
     def generate(self):
         """Generating custom command."""
@@ -35,142 +46,321 @@ class DatabricksQueryCommand(GeneratingCommand):
         command_timeout_in_seconds = self.command_timeout or const.COMMAND_TIMEOUT_IN_SECONDS
         _LOGGER.info("Setting command timeout to {} seconds.".format(command_timeout_in_seconds))
 
-        # Get session key
+        try:
+            utils.handle_termination_signals()
+            backend = self.backend or ("sql" if self.warehouse_id else "cluster")
+            _LOGGER.info("Using {} backend to execute the query.".format(backend))
+
+            if backend == "sql" and self.wait_timeout is not None and 0 < self.wait_timeout < 5:
+                raise Exception("Wait timeout must be 0 or between 5 and 50 seconds.")
+
+            query = self.query
+            self.query = self.apply_time_range(query)
+
+            target = [backend, self.cluster, self.cluster_id, self.warehouse_id]
+            cache_key = None
+            if self.cache_ttl:
+                cache_key = result_cache.get_key(
+                    self.account_name, target + self.get_time_range_key(query, self.cache_ttl), query, self.cache_ttl
+                )
+                records = result_cache.get(cache_key)
+                stats = result_cache.get_stats()
+                if records is not None:
+                    _LOGGER.info("Returning {} cached record(s).".format(len(records)))
+                    self.write_info(
+                        "Returning {} cached record(s). Result cache hits={}, misses={}.".format(
+                            len(records), stats["hits"], stats["misses"]
+                        )
+                    )
+                    for record in records:
+                        yield record
+                    return
+                self.write_info(
+                    "Result not cached, executing the query. Result cache hits={}, misses={}.".format(
+                        stats["hits"], stats["misses"]
+                    )
+                )
+
+            flight = None
+            if utils.get_performance_settings()["single_flight_enabled"] and is_shareable(self.query):
+                flight = SingleFlight(
+                    self.account_name,
+                    target + self.get_time_range_key(query, const.SINGLE_FLIGHT_TIME_BUCKET_IN_SECONDS),
+                    query,
+                    command_timeout_in_seconds,
+                )
+                records = flight.join()
+                if records is not None:
+                    for record in records:
+                        yield record
+                    return
+
+            try:
+                for record in self.execute_query(backend, command_timeout_in_seconds, cache_key, flight):
+                    yield record
+            finally:
+                if flight:
+                    flight.leave()
+
+        except Exception as e:
+            _LOGGER.error(e)
+            _LOGGER.error(traceback.format_exc())
+            self.write_error(str(e))
+
+    def apply_time_range(self, query):
+        """
+        Push the time range of the search down into the query.
+
+        The {{earliest}} and {{latest}} placeholders of the query are replaced by the bounds of the time range.
+        When a time column is provided, the records of the query are filtered on it, the earliest time
+        being inclusive and the latest time exclusive. An unbounded side of the time range is not filtered.
+
+        :param query: SQL query
+        :return: SQL query restricted to the time range of the search
+        """
+        earliest_time = self._metadata.searchinfo.earliest_time
+        latest_time = self._metadata.searchinfo.latest_time
+        earliest = to_timestamp_expression(earliest_time) if earliest_time else "timestamp_seconds(0)"
+        latest = to_timestamp_expression(latest_time) if latest_time else "current_timestamp()"
+        query = query.replace(const.EARLIEST_PLACEHOLDER, earliest).replace(const.LATEST_PLACEHOLDER, latest)
+
+        if not self.time_column:
+            return query
+
+        column = "`{}`".format(self.time_column.replace("`", "``"))
+        predicates = []
+        if earliest_time:
+            predicates.append("{} >= {}".format(column, earliest))
+        if latest_time:
+            predicates.append("{} < {}".format(column, latest))
+        if not predicates:
+            return query
+        _LOGGER.info("Restricting the query to the time range of the search: {}.".format(" AND ".join(predicates)))
+        return "SELECT * FROM ({}) AS splunk_query WHERE {}".format(
+            query.strip().rstrip(";"), " AND ".join(predicates)
+        )
+
+    def get_time_range_key(self, query, bucket):
+        """
+        Identify the time range of the search in the keys of the result cache and of the coalescing.
+
+        The bounds are snapped to buckets of the given length, so that the searches over a relative time range,
+        whose bounds change on every run, share their result within a bucket.
+
+        :param query: SQL query, before the time range is pushed down into it
+        :param bucket: Length of the buckets in seconds
+        :return: list identifying the time range, empty if the query does not depend on it
+        """
+        if not self.time_column and const.EARLIEST_PLACEHOLDER not in query and const.LATEST_PLACEHOLDER not in query:
+            return []
+        bounds = [self._metadata.searchinfo.earliest_time, self._metadata.searchinfo.latest_time]
+        return [self.time_column] + [int(float(bound) // bucket) if bound else None for bound in bounds]
+
+    def execute_query(self, backend, command_timeout, cache_key=None, flight=None):
+        """
+        Execute the query, caching its result and sharing it with the identical searches when required.
+
+        :param backend: Backend to use for execution, cluster or sql
+        :param command_timeout: Time to wait in seconds for query completion
+        :param cache_key: Key of the result in the result cache, None if the result is not cached
+        :param flight: SingleFlight object of the query, None if the result is not shared
+        :return: generator of records in the form of dictionary
+        """
+        self.complete_results = True
+        account_names = split_values(self.account_name)
+        cluster_names = split_values(self.cluster)
+        if len(account_names) > 1 or (backend == "cluster" and len(cluster_names) > 1):
+            records = self.fan_out(account_names, cluster_names, backend, command_timeout)
+        else:
+            executor = self.get_executor(
+                account_names[0] if account_names else self.account_name,
+                cluster_names[0] if cluster_names else self.cluster,
+                backend,
+                command_timeout,
+                self.write_warning,
+            )
+            records = executor.execute(self.query)
+
+        kept_records = [] if cache_key or (flight and flight.leader) else None
+        for record in records:
+            if kept_records is not None:
+                kept_records.append(dict(record))
+                if len(kept_records) > const.RESULT_CACHE_MAX_ENTRY_ROWS:
+                    _LOGGER.info("Result is too large to be cached or shared.")
+                    kept_records = None
+            yield record
+
+        if kept_records is not None and self.complete_results:
+            if cache_key:
+                result_cache.put(cache_key, kept_records)
+            if flight:
+                flight.share(kept_records)
+
+    def get_executor(self, account_name, cluster, backend, command_timeout, warn, databricks_configs=None):
+        """
+        Create the executor of the query on an account.
+
+        :param account_name: Name of the Databricks account
+        :param cluster: Name of the cluster, the one configured on the account is used when not provided
+        :param backend: Backend to use for execution, cluster or sql
+        :param command_timeout: Time to wait in seconds for query completion
+        :param warn: Callable used to report warnings to the user
+        :param databricks_configs: Configurations of the account, read through REST when not provided
+        :return: ClusterQueryExecutor or StatementQueryExecutor object
+        """
         session_key = self._metadata.searchinfo.session_key
 
-        try:
+        def get_config(field):
+            configs = databricks_configs
+            if configs is None:
+                configs = utils.get_databricks_configs(session_key, account_name)
+            return configs.get(field)
 
+        if backend == "sql":
+            # Fetching warehouse ID
+            warehouse_id = self.warehouse_id or get_config("warehouse_id")
+            if not warehouse_id:
+                raise Exception(
+                    "Databricks SQL warehouse is required to execute this custom command with sql backend. "
+                    "Provide a warehouse_id parameter or configure the warehouse in the TA's configuration page."
+                )
+
+            client = com.DatabricksClient(
+                account_name,
+                session_key,
+                username=self._metadata.searchinfo.username,
+                databricks_configs=databricks_configs,
+                retry_budget=command_timeout,
+            )
+            return executors.StatementQueryExecutor(
+                client,
+                warehouse_id,
+                command_timeout,
+                warn=warn,
+                wait_timeout=self.wait_timeout,
+            )
+
+        if self.cluster_id:
+            client = com.DatabricksClient(
+                account_name,
+                session_key,
+                username=self._metadata.searchinfo.username,
+                databricks_configs=databricks_configs,
+                retry_budget=command_timeout,
+            )
+            cluster_id = self.cluster_id
+            _LOGGER.info("Using provided cluster ID: {}.".format(cluster_id))
+        else:
             # Fetching cluster name
-            self.cluster = self.cluster or utils.get_databricks_configs(
-                session_key, self.account_name
-            ).get("cluster_name")
-            if not self.cluster:
+            cluster = cluster or get_config("cluster_name")
+            if not cluster:
                 raise Exception(
                     "Databricks cluster is required to execute this custom command. "
                     "Provide a cluster parameter or configure the cluster in the TA's configuration page."
                 )
 
-            client = com.DatabricksClient(self.account_name, session_key)
+            client = com.DatabricksClient(
+                account_name,
+                session_key,
+                username=self._metadata.searchinfo.username,
+                databricks_configs=databricks_configs,
+                retry_budget=command_timeout,
+            )
 
             # Request to get cluster ID
-            _LOGGER.info("Requesting cluster ID for cluster: {}.".format(self.cluster))
-            cluster_id = client.get_cluster_id(self.cluster)
+            _LOGGER.info("Requesting cluster ID for cluster: {}.".format(cluster))
+            cluster_id = client.get_cluster_id(cluster)
             _LOGGER.info("Cluster ID received: {}.".format(cluster_id))
 
-            # Request to create context
-            _LOGGER.info("Creating Context in cluster.")
-            payload = {"language": "sql", "clusterId": cluster_id}
-            response = client.databricks_api("post", const.CONTEXT_ENDPOINT, data=payload)
-
-            context_id = response.get("id")
-            _LOGGER.info("Context created: {}.".format(context_id))
-
-            # Request to execute command
-            _LOGGER.info("Submitting SQL query for execution.")
-            payload["contextId"] = context_id
-            payload["command"] = self.query
-            response = client.databricks_api("post", const.COMMAND_ENDPOINT, data=payload)
-
-            command_id = response.get("id")
-            _LOGGER.info("Query submitted, command id: {}.".format(command_id))
-
-            # pulling mechanism
-            _LOGGER.info("Fetching query execution status.")
-            status = None
-            args = {
-                "clusterId": cluster_id,
-                "contextId": context_id,
-                "commandId": command_id,
-            }
-
-            total_wait_time = 0
-            while total_wait_time <= command_timeout_in_seconds:
-                response = client.databricks_api("get", const.STATUS_ENDPOINT, args=args)
-
-                status = response.get("status")
-                _LOGGER.info("Query execution status: {}.".format(status))
-
-                if status in ("Cancelled", "Error"):
-                    raise Exception(
-                        "Could not complete the query execution. Status: {}.".format(status)
-                    )
+        registry = ContextRegistry(
+            self._metadata.searchinfo.splunkd_uri, session_key, self._metadata.searchinfo.sid
+        )
+        return executors.ClusterQueryExecutor(
+            client,
+            cluster_id,
+            command_timeout,
+            warn=warn,
+            registry=registry,
+            user=self._metadata.searchinfo.username,
+        )
+
+    def fan_out(self, account_names, cluster_names, backend, command_timeout):
+        """
+        Execute the query on each of the accounts and clusters concurrently.
+
+        :param account_names: List of names of the Databricks accounts
+        :param cluster_names: List of names of the clusters, the one configured on each account is used when empty
+        :param backend: Backend to use for execution, cluster or sql
+        :param command_timeout: Time to wait in seconds for query completion
+        :return: generator of records in the form of dictionary, along with the account and cluster fields
+        """
+        if self.cluster_id or self.warehouse_id:
+            raise Exception(
+                "The cluster_id and warehouse_id parameters can not be used with multiple accounts or clusters."
+            )
 
-                elif status == "Finished":
-                    if response["results"]["resultType"] == "error":
-                        msg = response["results"].get(
-                            "summary", "Error encountered while executing query."
-                        )
-                        raise Exception(str(msg))
-
-                    if response["results"]["resultType"] != "table":
-                        raise Exception(
-                            "Encountered unknown result type, terminating the execution."
-                        )
-
-                    if response["results"].get("truncated", True):
-                        self.write_warning(
-                            "Results are truncated due to Databricks API limitations."
-                        )
-
-                    _LOGGER.info("Query execution successful. Preparing data.")
-
-                    # Prepare list of Headers
-                    headers = response["results"]["schema"]
-                    schema = []
-                    for header in headers:
-                        field = header.get("name")
-                        schema.append(field)
-
-                    # Fetch Data
-                    data = response["results"]["data"]
-
-                    for d in data:
-                        yield dict(zip(schema, d))
+        session_key = self._metadata.searchinfo.session_key
+        configs = utils.get_databricks_configs_bulk(session_key, account_names)
+        missing_names = [account_name for account_name in account_names if account_name not in configs]
+        if missing_names:
+            raise Exception(
+                "Account '{}' not found. Please provide valid Databricks account.".format(
+                    "', '".join(missing_names)
+                )
+            )
+
+        if backend == "sql" or not cluster_names:
+            cluster_names = [None]
+
+        targets = []
+        for account_name in account_names:
+            for cluster in cluster_names:
+                fields = {"databricks_account": account_name}
+                if len(cluster_names) > 1:
+                    fields["databricks_cluster"] = cluster
+                targets.append(
+                    (
+                        fields,
+                        functools.partial(
+                            self.get_executor,
+                            account_name,
+                            cluster,
+                            backend,
+                            command_timeout,
+                            databricks_configs=configs[account_name],
+                        ),
+                    )
+                )
 
-                    _LOGGER.info("Data parsed successfully.")
-                    break
+        max_workers = utils.get_performance_settings()["fan_out_max_workers"]
+        _LOGGER.info(
+            "Executing the query on {} target(s) with {} concurrent worker(s).".format(len(targets), max_workers)
+        )
+        fan_out_executor = FanOutQueryExecutor(max_workers, warn=self.write_warning)
+        for record in fan_out_executor.execute(targets, self.query):
+            yield record
+        # Results missing some of the targets are not cached
+        self.complete_results = not fan_out_executor.errors
 
-                seconds_to_timeout = command_timeout_in_seconds - total_wait_time
 
-                if seconds_to_timeout < const.COMMAND_SLEEP_INTERVAL_IN_SECONDS:
+def to_timestamp_expression(epoch_time):
+    """
+    Convert an epoch time to a SQL timestamp expression, independent of the time zone of the session.
 
-                    if not seconds_to_timeout:
-                        total_wait_time += 1
-                        continue
+    :param epoch_time: Time in seconds since the epoch
+    :return: SQL expression
+    """
+    return "timestamp_seconds({:.6f})".format(float(epoch_time))
 
-                    _LOGGER.info(
-                        "Query execution in progress, will retry after {} seconds.".format(
-                            str(seconds_to_timeout)
-                        )
-                    )
-                    time.sleep(seconds_to_timeout)
-                    total_wait_time += seconds_to_timeout
-                    continue
 
-                _LOGGER.info(
-                    "Query execution in progress, will retry after {} seconds.".format(
-                        str(const.COMMAND_SLEEP_INTERVAL_IN_SECONDS)
-                    )
-                )
-                time.sleep(const.COMMAND_SLEEP_INTERVAL_IN_SECONDS)
-                total_wait_time += const.COMMAND_SLEEP_INTERVAL_IN_SECONDS
-            else:
-                # Timeout scenario
-                msg = "Command execution timed out. Last status: {}.".format(status)
-                _LOGGER.info(msg)
-                self.write_error(msg)
-
-            # Destroy the context to free-up space in Databricks
-            if context_id:
-                _LOGGER.info("Deleting context.")
-                payload = {"contextId": context_id, "clusterId": cluster_id}
-                _ = client.databricks_api("post", const.CONTEXT_DESTROY_ENDPOINT, data=payload)
-                _LOGGER.info("Context deleted successfully.")
+def split_values(value):
+    """
+    Split a comma separated parameter value.
 
-        except Exception as e:
-            _LOGGER.error(e)
-            _LOGGER.error(traceback.format_exc())
-            self.write_error(str(e))
+    :param value: Value of the parameter
+    :return: list of the non-empty values
+    """
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
 
 
 dispatch(DatabricksQueryCommand, sys.argv, sys.stdin, sys.stdout, __name__)
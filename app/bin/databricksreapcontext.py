@@ -0,0 +1,112 @@
+import ta_databricks_declare  # noqa: F401
+import sys
+import time
+import traceback
+
+import databricks_com as com
+import databricks_const as const
+import databricks_common_utils as utils
+from databricks_context_pool import evict_expired_contexts
+from databricks_context_registry import ContextRegistry
+from log_manager import setup_logging
+
+from splunklib.searchcommands import (
+    dispatch,
+    GeneratingCommand,
+    Configuration,
+)
+
+_LOGGER = setup_logging("ta_databricksreapcontext_command")
+
+
+@Configuration(type="events")
+class DatabricksReapContextCommand(GeneratingCommand):
+    """Custom Command of databricksreapcontext."""
+
+    def generate(self):
+        """Destroy the execution contexts left behind by the databricksquery searches and the idle pooled ones."""
+        _LOGGER.info("Initiating databricksreapcontext command.")
+        session_key = self._metadata.searchinfo.session_key
+        registry = ContextRegistry(self._metadata.searchinfo.splunkd_uri, session_key)
+        clients = {}
+
+        try:
+            records = registry.get_expired()
+        except Exception as e:
+            _LOGGER.error(e)
+            _LOGGER.error(traceback.format_exc())
+            self.write_error("Unable to read the registered execution contexts: {}".format(e))
+            records = []
+        _LOGGER.info("Found {} expired execution context(s).".format(len(records)))
+
+        for record in records:
+            status = self.destroy_context(clients, session_key, record)
+            # Contexts do not survive a cluster restart, hence the failures are retried for a while only
+            if status != "Destroyed" and (
+                time.time() - record.get("expires_time", 0) < const.CONTEXT_REGISTRY_RETENTION_IN_SECONDS
+            ):
+                yield self.get_event(record, status)
+                continue
+            registry.unregister(record.get("_key"))
+            yield self.get_event(record, status)
+
+        # Pooled contexts are otherwise evicted by the next search using the same pool only
+        idle_timeout = utils.get_performance_settings()["context_pool_idle_timeout"]
+        try:
+            pooled_contexts = evict_expired_contexts(idle_timeout)
+        except Exception as e:
+            _LOGGER.error(e)
+            _LOGGER.error(traceback.format_exc())
+            self.write_error("Unable to read the pooled execution contexts: {}".format(e))
+            pooled_contexts = []
+        _LOGGER.info("Found {} idle pooled execution context(s).".format(len(pooled_contexts)))
+
+        for account_name, cluster_id, context_id in pooled_contexts:
+            record = {"account_name": account_name, "cluster_id": cluster_id, "context_id": context_id}
+            yield self.get_event(record, self.destroy_context(clients, session_key, record))
+
+        _LOGGER.info("Completed the execution of databricksreapcontext command.")
+
+    @staticmethod
+    def destroy_context(clients, session_key, record):
+        """
+        Destroy a context.
+
+        :param clients: dictionary of account name to the DatabricksClient object of the account, filled on demand
+        :param session_key: Splunk session key
+        :param record: dictionary with the account name, cluster ID and ID of the context
+        :return: outcome of the destruction
+        """
+        account_name = record.get("account_name")
+        context_id = record.get("context_id")
+        try:
+            if account_name not in clients:
+                clients[account_name] = com.DatabricksClient(account_name, session_key)
+            payload = {"contextId": context_id, "clusterId": record.get("cluster_id")}
+            clients[account_name].databricks_api("post", const.CONTEXT_DESTROY_ENDPOINT, data=payload)
+        except Exception as e:
+            _LOGGER.error("Unable to destroy expired context {}: {}".format(context_id, e))
+            return "Failed: {}".format(e)
+        _LOGGER.info("Destroyed expired context {}.".format(context_id))
+        return "Destroyed"
+
+    @staticmethod
+    def get_event(record, status):
+        """
+        Prepare the event reporting the reaping of a context.
+
+        :param record: Registry record of the context
+        :param status: Outcome of the reaping
+        :return: event in the form of dictionary
+        """
+        return {
+            "account_name": record.get("account_name"),
+            "cluster_id": record.get("cluster_id"),
+            "context_id": record.get("context_id"),
+            "sid": record.get("sid"),
+            "created_time": record.get("created_time"),
+            "status": status,
+        }
+
+
+dispatch(DatabricksReapContextCommand, sys.argv, sys.stdin, sys.stdout, __name__)
@@ -2,10 +2,12 @@ import ta_databricks_declare  # noqa: F401
 import sys
 import time
 import traceback
+import uuid
 
 import databricks_com as com
 import databricks_const as const
 import databricks_common_utils as utils
+from databricks_run_tracker import wait_for_run
 from log_manager import setup_logging
 
 from splunklib.searchcommands import (
@@ -13,6 +15,7 @@ from splunklib.searchcommands import (
     GeneratingCommand,
     Configuration,
     Option,
+    validators,
 )
 
 _LOGGER = setup_logging("ta_databricksrun_command")
@@ -27,9 +30,12 @@ class DatabricksRunCommand(GeneratingCommand):
     run_name = Option(require=False)
     account_name = Option(require=True)
     cluster = Option(require=False)
+    cluster_id = Option(require=False)
     revision_timestamp = Option(require=False)
     notebook_params = Option(require=False)
     identifier = Option(require=False)
+    wait = Option(require=False, validate=validators.Boolean())
+    command_timeout = Option(require=False, validate=validators.Integer(minimum=1))
 
     def generate(self):
         """Generating custom command."""
@@ -46,6 +52,9 @@ class DatabricksRunCommand(GeneratingCommand):
             "error": "-",
             "identifier": "-",
         }
+        if self.wait:
+            # The record logged on submission is updated once the run completes
+            kv_log_info["_key"] = uuid.uuid4().hex
         if not (self.notebook_path and self.notebook_path.strip()):
             self.write_error('Please provide value for the parameter "notebook_path"')
             exit(1)
@@ -57,22 +66,31 @@ class DatabricksRunCommand(GeneratingCommand):
 
         try:
 
-            # Fetching cluster name
-            self.cluster = (self.cluster and self.cluster.strip()) or utils.get_databricks_configs(
-                session_key, self.account_name
-            ).get("cluster_name")
-            if not self.cluster:
-                raise Exception(
-                    "Databricks cluster is required to execute this custom command. "
-                    "Provide a cluster parameter or configure the cluster in the TA's configuration page."
+            if self.cluster_id and self.cluster_id.strip():
+                client = com.DatabricksClient(
+                    self.account_name, session_key, username=self._metadata.searchinfo.username
+                )
+                cluster_id = self.cluster_id.strip()
+                _LOGGER.info("Using provided cluster ID: {}".format(cluster_id))
+            else:
+                # Fetching cluster name
+                self.cluster = (self.cluster and self.cluster.strip()) or utils.get_databricks_configs(
+                    session_key, self.account_name
+                ).get("cluster_name")
+                if not self.cluster:
+                    raise Exception(
+                        "Databricks cluster is required to execute this custom command. "
+                        "Provide a cluster parameter or configure the cluster in the TA's configuration page."
+                    )
+
+                client = com.DatabricksClient(
+                    self.account_name, session_key, username=self._metadata.searchinfo.username
                 )
 
-            client = com.DatabricksClient(self.account_name, session_key)
-
-            # Request to get cluster ID
-            _LOGGER.info("Requesting cluster ID for cluster: {}".format(self.cluster))
-            cluster_id = client.get_cluster_id(self.cluster)
-            _LOGGER.info("Cluster ID received: {}".format(cluster_id))
+                # Request to get cluster ID
+                _LOGGER.info("Requesting cluster ID for cluster: {}".format(self.cluster))
+                cluster_id = client.get_cluster_id(self.cluster)
+                _LOGGER.info("Cluster ID received: {}".format(cluster_id))
 
             # Request to submit the run
             _LOGGER.info("Preparing request body for execution")
@@ -125,6 +143,16 @@ class DatabricksRunCommand(GeneratingCommand):
                 kv_log_info,
             )
 
+        timeout = self.command_timeout or const.RUN_WAIT_TIMEOUT_IN_SECONDS
+        if self.wait and wait_for_run(client, run_id, timeout, kv_log_info, self.write_warning):
+            updated_kv_info = utils.update_kv_store_collection(
+                self._metadata.searchinfo.splunkd_uri,
+                const.KV_COLLECTION_NAME_SUBMIT_RUN,
+                session_key,
+                kv_log_info,
+                key=kv_log_info["_key"],
+            )
+
         yield updated_kv_info
 
 
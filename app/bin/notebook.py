@@ -215,12 +215,11 @@ if __name__ == "__main__":
         modaction.account_name = json.loads(stdindata).get("configuration").get("account_name")
         com = com.DatabricksClient(modaction.account_name, modaction.session_key)
         try:
-            modaction.cluster_name = utils.get_databricks_configs(
+            databricks_configs = utils.get_databricks_configs(
                 modaction.session_key, modaction.account_name
-            ).get("cluster_name")
-            modaction.databricks_instance = utils.get_databricks_configs(
-                modaction.session_key, modaction.account_name
-            ).get("databricks_instance")
+            )
+            modaction.cluster_name = databricks_configs.get("cluster_name")
+            modaction.databricks_instance = databricks_configs.get("databricks_instance")
         except Exception as e:
             modaction.message(
                 f"Failure getting cluster name config: {traceback.format_exc()}",
@@ -0,0 +1,100 @@
+import declare
+import os
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test the circuit breaker shared by the searches."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.circuit_breaker = import_module('databricks_circuit_breaker')
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def get_breaker(self):
+        return self.circuit_breaker.CircuitBreaker("instance1", failure_threshold=2, cooldown=30)
+
+    @patch("databricks_circuit_breaker.time.time", return_value=1000)
+    def test_opens_after_threshold(self, mock_time):
+        breaker = self.get_breaker()
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        with self.assertRaises(Exception) as context:
+            self.get_breaker().before_request()
+        self.assertEqual(
+            "Databricks instance instance1 is unavailable after 2 consecutive failures. "
+            "Please try again after 30 seconds.", str(context.exception))
+
+    @patch("databricks_circuit_breaker.time.time", return_value=1000)
+    def test_success_resets_failures(self, mock_time):
+        breaker = self.get_breaker()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.before_request()
+
+    @patch("databricks_circuit_breaker.time.time", return_value=1000)
+    def test_single_probe_after_cooldown(self, mock_time):
+        breaker = self.get_breaker()
+        breaker.record_failure()
+        breaker.record_failure()
+        mock_time.return_value = 1031
+        breaker.before_request()
+        with self.assertRaises(Exception):
+            self.get_breaker().before_request()
+        breaker.record_failure()
+        with self.assertRaises(Exception):
+            breaker.before_request()
+        mock_time.return_value = 1062
+        breaker.before_request()
+        breaker.record_success()
+        self.get_breaker().before_request()
+
+    def test_disabled(self):
+        breaker = self.circuit_breaker.CircuitBreaker("instance1", failure_threshold=0, cooldown=30)
+        for _ in range(5):
+            breaker.record_failure()
+        breaker.before_request()
+
+    @patch("databricks_circuit_breaker.time.time", return_value=1000)
+    def test_state_read_once_per_refresh_interval(self, mock_time):
+        breaker = self.get_breaker()
+        with patch.object(breaker.state_file, "read", wraps=breaker.state_file.read) as mock_read, \
+                patch.object(breaker.state_file, "update") as mock_update:
+            for _ in range(3):
+                breaker.before_request()
+                breaker.record_success()
+            self.assertEqual(mock_read.call_count, 1)
+            mock_time.return_value = 1001
+            breaker.before_request()
+            self.assertEqual(mock_read.call_count, 2)
+            mock_update.assert_not_called()
@@ -3,16 +3,22 @@ import os
 import sys
 import unittest
 import json
+import tempfile
 
 from utility import Response
+import databricks_const as const
 from importlib import import_module
 from mock import patch, MagicMock
 
 CLUSTER_LIST = {"clusters": [{"cluster_name": "test1", "cluster_id": "123","state":"running"}, {"cluster_name": "test2", "cluster_id": "345","state":"pending"}]}
 
 mocked_modules = {}
+splunk_home = None
 def setUpModule():
-    global mocked_modules
+    global mocked_modules, splunk_home
+
+    splunk_home = tempfile.TemporaryDirectory()
+    patch.dict(os.environ, {"SPLUNK_HOME": splunk_home.name}).start()
 
     module_to_be_mocked = [
         'log_manager',
@@ -30,6 +36,7 @@ def setUpModule():
 
 def tearDownModule():
     patch.stopall()
+    splunk_home.cleanup()
 
 class TestDatabricksUtils(unittest.TestCase):
     """Test Databricks utils."""
@@ -140,21 +147,57 @@ class TestDatabricksUtils(unittest.TestCase):
         self.assertEqual(obj.session.post.call_count, 1)
         self.assertEqual(resp, {"status_code": 200})
     
+    @patch("databricks_com.JitteredRetry.wait", side_effect=[True, False])
     @patch("solnlib.server_info", return_value=MagicMock()) 
     @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
     @patch("databricks_com.utils.get_databricks_configs", autospec=True)
-    def test_get_api_response_429(self, mock_conf, mock_session, mock_version):
+    def test_get_api_response_429(self, mock_conf, mock_session, mock_version, mock_wait):
         db_com = import_module('databricks_com')
         mock_conf.return_value = {"databricks_instance" : "123", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
         obj = db_com.DatabricksClient("account_name", "session_key")
         obj.session.post.return_value = Response(429)
         with self.assertRaises(Exception) as context:
             resp = obj.databricks_api("post", "endpoint", args="123", data={"p1": "v1"})
-        self.assertEqual(obj.session.post.call_count, 1)
+        self.assertEqual(obj.session.post.call_count, 2)
         self.assertEqual(
             "API limit exceeded. Please try again after some time.", str(context.exception))
 
 
+    @patch("databricks_com.time", autospec=True)
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_api_response_retry(self, mock_conf, mock_session, mock_version, mock_time):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "retry1", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("account_name", "session_key")
+        obj.session.get.side_effect = [Response(503), db_com.requests.exceptions.ConnectionError("reset"), Response(200)]
+        resp = obj.databricks_api("get", "endpoint")
+        self.assertEqual(resp, {"status_code": 200})
+        self.assertEqual(obj.session.get.call_count, 3)
+        self.assertEqual(mock_time.sleep.call_count, 2)
+
+    @patch("databricks_com.time", autospec=True)
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_api_response_circuit_open(self, mock_conf, mock_session, mock_version, mock_time):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "unhealthy1", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("account_name", "session_key")
+        obj.circuit_breaker.failure_threshold = 2
+        obj.session.get.return_value = Response(503)
+        with self.assertRaises(Exception) as context:
+            obj.databricks_api("get", "endpoint")
+        self.assertIn("Databricks instance unhealthy1 is unavailable", str(context.exception))
+        self.assertEqual(obj.session.get.call_count, 2)
+        other = db_com.DatabricksClient("other_account", "session_key")
+        other.circuit_breaker.failure_threshold = 2
+        with self.assertRaises(Exception) as context:
+            other.databricks_api("get", "endpoint")
+        self.assertIn("Databricks instance unhealthy1 is unavailable", str(context.exception))
+        self.assertEqual(obj.session.get.call_count, 2)
+
     @patch("databricks_com.utils.get_aad_access_token", return_value="new_access_token")
     @patch("solnlib.server_info", return_value=MagicMock()) 
     @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
@@ -186,7 +229,151 @@ class TestDatabricksUtils(unittest.TestCase):
         self.assertEqual(
             "Invalid access token. Please enter the valid access token.", str(context.exception))
 
+    @patch("databricks_com.requests.Session.get")
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_download_external_link(self, mock_conf, mock_session, mock_version, mock_get):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "123", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("account_name", "session_key")
+        mock_get.return_value.json.return_value = [["1", "2"]]
+        resp = obj.download_external_link("https://link0")
+        self.assertEqual(resp, [["1", "2"]])
+        self.assertNotIn("headers", mock_get.call_args[1])
+
+    @patch("databricks_com.utils.get_performance_settings", return_value=dict(const.PERFORMANCE_DEFAULTS, cluster_cache_ttl=300))
+    @patch("databricks_com.DatabricksClient.databricks_api")
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_cluster_id_cached(self, mock_conf, mock_session, mock_version, mock_response, mock_settings):
+        db_com = import_module('databricks_com')
+        clusters = {"123": {"cluster_name": "test1", "cluster_id": "123", "state": "RUNNING"}}
+        mock_response.side_effect = lambda method, endpoint, args=None: (
+            clusters[args["cluster_id"]] if endpoint == "/api/2.0/clusters/get" else {"clusters": list(clusters.values())})
+        mock_conf.return_value = {"databricks_instance" : "cache1", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("cache_account", "session_key")
+        self.assertEqual(obj.get_cluster_id("test1"), "123")
+        self.assertEqual(mock_response.call_count, 1)
+        obj = db_com.DatabricksClient("cache_account", "session_key")
+        self.assertEqual(obj.get_cluster_id("test1"), "123")
+        mock_response.assert_called_with("get", "/api/2.0/clusters/get", args={"cluster_id": "123"})
+        self.assertEqual(mock_response.call_count, 2)
 
+        # The cached cluster was terminated
+        clusters["123"]["state"] = "TERMINATED"
+        with self.assertRaises(Exception) as context:
+            obj.get_cluster_id("test1")
+        self.assertEqual(
+            "Ensure that the cluster is in running state. Current cluster state is TERMINATED.", str(context.exception))
+        mock_response.assert_called_with("get", "/api/2.0/clusters/list")
 
-    
-    
\ No newline at end of file
+    @patch("databricks_com.utils.get_performance_settings", return_value=dict(const.PERFORMANCE_DEFAULTS, cluster_cache_ttl=300))
+    @patch("databricks_com.DatabricksClient.databricks_api")
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_cluster_id_cache_invalidated(self, mock_conf, mock_session, mock_version, mock_response, mock_settings):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "cache2", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("cache_account", "session_key")
+        mock_response.return_value = {"clusters": [{"cluster_name": "test2", "cluster_id": "345", "state": "running"}]}
+        self.assertEqual(obj.get_cluster_id("test2"), "345")
+
+        # The cluster was recreated under the same name, the cached cluster does not exist anymore
+        mock_response.side_effect = [
+            Exception("Cluster 345 does not exist"),
+            {"clusters": [{"cluster_name": "test2", "cluster_id": "678", "state": "running"}]},
+        ]
+        self.assertEqual(obj.get_cluster_id("test2"), "678")
+        self.assertEqual(mock_response.call_count, 3)
+
+    @patch("databricks_com.utils.get_performance_settings", return_value=dict(const.PERFORMANCE_DEFAULTS, cluster_cache_ttl=0))
+    @patch("databricks_com.DatabricksClient.databricks_api", return_value=CLUSTER_LIST)
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_cluster_id_cache_disabled(self, mock_conf, mock_session, mock_version, mock_response, mock_settings):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "cache3", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("cache_account", "session_key")
+        obj.get_cluster_id("test1")
+        obj.get_cluster_id("test1")
+        self.assertEqual(mock_response.call_count, 2)
+
+
+class TestJitteredRetry(unittest.TestCase):
+    """Test JitteredRetry."""
+
+    @patch("databricks_com.time", autospec=True)
+    def test_waits_within_budget(self, mock_time):
+        db_com = import_module('databricks_com')
+        retry = db_com.JitteredRetry(30, base_interval=1, max_interval=8)
+        while retry.wait():
+            pass
+        sleeps = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertTrue(sleeps)
+        self.assertTrue(all(1 <= sleep <= 8 for sleep in sleeps))
+        self.assertLessEqual(sum(sleeps), 30)
+        self.assertEqual(retry.retry_count, len(sleeps))
+
+    @patch("databricks_com.time", autospec=True)
+    def test_honours_retry_after(self, mock_time):
+        db_com = import_module('databricks_com')
+        retry = db_com.JitteredRetry(30, base_interval=1, max_interval=2)
+        self.assertTrue(retry.wait(retry_after=10))
+        self.assertFalse(retry.wait(retry_after=25))
+        mock_time.sleep.assert_called_once_with(10)
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """Test AdaptivePoller."""
+
+    @patch("databricks_com.time", autospec=True)
+    def test_interval_grows_up_to_cap(self, mock_time):
+        db_com = import_module('databricks_com')
+        poller = db_com.AdaptivePoller(100, initial_interval=0.1, max_interval=0.4, backoff_factor=2)
+        for poll_count in poller:
+            if poll_count == 5:
+                break
+        sleeps = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEqual(sleeps, [0.1, 0.2, 0.4, 0.4])
+        self.assertEqual(poller.poll_count, 5)
+        self.assertAlmostEqual(poller.total_wait_time, 1.1)
+
+    @patch("databricks_com.time", autospec=True)
+    def test_stops_at_timeout(self, mock_time):
+        db_com = import_module('databricks_com')
+        poller = db_com.AdaptivePoller(1, initial_interval=0.4, max_interval=0.4, backoff_factor=1)
+        self.assertEqual(list(poller), [1, 2, 3, 4])
+        sleeps = [round(c[0][0], 2) for c in mock_time.sleep.call_args_list]
+        self.assertEqual(sleeps, [0.4, 0.4, 0.2])
+
+    @patch("databricks_com.time", autospec=True)
+    def test_honours_retry_after(self, mock_time):
+        db_com = import_module('databricks_com')
+        poller = db_com.AdaptivePoller(100, initial_interval=0.1, max_interval=5, backoff_factor=2)
+        for poll_count in poller:
+            if poll_count == 1:
+                poller.retry_after = 3.0
+            if poll_count == 3:
+                break
+        sleeps = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEqual(sleeps, [3.0, 0.2])
+
+    @patch("solnlib.server_info", return_value=MagicMock())
+    @patch("databricks_com.DatabricksClient.get_requests_retry_session", return_value=MagicMock())
+    @patch("databricks_com.utils.get_databricks_configs", autospec=True)
+    def test_get_retry_after(self, mock_conf, mock_session, mock_version):
+        db_com = import_module('databricks_com')
+        mock_conf.return_value = {"databricks_instance" : "123", "auth_type" : "PAT", "databricks_pat" : "token", "proxy_uri" : None}
+        obj = db_com.DatabricksClient("account_name", "session_key")
+        response = Response(200)
+        response.headers = {"Retry-After": "2"}
+        obj.session.get.return_value = response
+        obj.databricks_api("get", "endpoint")
+        self.assertEqual(obj.get_retry_after(), 2.0)
+        obj.session.get.return_value = Response(200)
+        obj.databricks_api("get", "endpoint")
+        self.assertIsNone(obj.get_retry_after())
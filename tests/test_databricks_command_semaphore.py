@@ -0,0 +1,114 @@
+import declare
+import os
+import unittest
+import time
+import tempfile
+import threading
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestCommandSemaphore(unittest.TestCase):
+    """Test the command semaphore shared by the searches."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.command_semaphore = import_module('databricks_command_semaphore')
+        self.interval_patcher = patch("databricks_command_semaphore.const.COMMAND_SEMAPHORE_POLL_INTERVAL_IN_SECONDS", 0.01)
+        self.interval_patcher.start()
+
+    def tearDown(self):
+        self.interval_patcher.stop()
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def get_semaphore(self, key="A1|c1"):
+        return self.command_semaphore.CommandSemaphore(key, 2, lease_timeout=60)
+
+    def test_slots_granted_in_order(self):
+        holders = [self.get_semaphore(), self.get_semaphore()]
+        for holder in holders:
+            self.assertLess(holder.acquire(1), 0.5)
+        self.assertLess(self.get_semaphore("A1|c2").acquire(1), 0.5)
+
+        granted = []
+        waiters = [self.get_semaphore() for _ in range(2)]
+
+        def wait(index):
+            waiters[index].acquire(5)
+            granted.append(index)
+
+        threads = []
+        for index in range(2):
+            threads.append(threading.Thread(target=wait, args=(index,)))
+            threads[-1].start()
+            # The first waiter is queued before the second one
+            while len(self.command_semaphore.shared_state.JsonStateFile(
+                    "command_semaphore.json").read().get("A1|c1", [])) < 3 + index:
+                time.sleep(0.01)
+        holders[0].release()
+        threads[0].join(5)
+        self.assertEqual(granted, [0])
+        holders[1].release()
+        threads[1].join(5)
+        self.assertEqual(granted, [0, 1])
+
+    def test_timeout(self):
+        for _ in range(2):
+            self.get_semaphore().acquire(1)
+        with self.assertRaises(Exception) as context:
+            self.get_semaphore().acquire(0.05)
+        self.assertEqual(
+            "Timed out after 0.05 seconds waiting for a command slot, 2 commands are already executing or queued. "
+            "Please try again later.", str(context.exception))
+        state = self.command_semaphore.shared_state.JsonStateFile("command_semaphore.json").read()
+        self.assertEqual(len(state["A1|c1"]), 2)
+
+    def test_expired_lease(self):
+        for _ in range(2):
+            self.command_semaphore.CommandSemaphore("A1|c1", 2, lease_timeout=-1).acquire(1)
+        self.assertLess(self.get_semaphore().acquire(1), 0.5)
+
+
+class TestAcquireCommandSlot(unittest.TestCase):
+    """Test the queueing of the executors."""
+
+    def setUp(self):
+        self.executors = import_module('databricks_query_executor')
+
+    def test_warns_queued_time(self):
+        semaphore = MagicMock(max_in_flight=4)
+        semaphore.acquire.return_value = 12.3
+        warn = MagicMock()
+        self.executors.acquire_command_slot(semaphore, 60, warn, "cluster c1")
+        semaphore.acquire.assert_called_once_with(60)
+        warn.assert_called_once_with("Query was queued 12 seconds waiting for one of the 4 command slots of cluster c1.")
+
+    def test_no_warning_without_queueing(self):
+        semaphore = MagicMock(max_in_flight=4)
+        semaphore.acquire.return_value = 0.01
+        warn = MagicMock()
+        self.executors.acquire_command_slot(semaphore, 60, warn, "cluster c1")
+        warn.assert_not_called()
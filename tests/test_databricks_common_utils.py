@@ -3,14 +3,21 @@ import os
 import sys
 import unittest
 import json
+import time
+import signal
+import tempfile
 from utility import Response
 
 from importlib import import_module
 from mock import patch, MagicMock
 
 mocked_modules = {}
+splunk_home = None
 def setUpModule():
-    global mocked_modules
+    global mocked_modules, splunk_home
+
+    splunk_home = tempfile.TemporaryDirectory()
+    patch.dict(os.environ, {"SPLUNK_HOME": splunk_home.name}).start()
 
     module_to_be_mocked = [
         'log_manager',
@@ -29,6 +36,7 @@ def setUpModule():
 
 def tearDownModule():
     patch.stopall()
+    splunk_home.cleanup()
 
 class TestDatabricksUtils(unittest.TestCase):
     """Test Databricks utils."""
@@ -52,6 +60,46 @@ class TestDatabricksUtils(unittest.TestCase):
         response = db_utils.get_current_user("session_key")
         self.assertEqual(response, "db_admin")
     
+    def test_handle_termination_signals(self):
+        db_utils = import_module('databricks_common_utils')
+        handlers = {name: signal.getsignal(getattr(signal, name)) for name in ("SIGTERM", "SIGINT")}
+        try:
+            db_utils.handle_termination_signals()
+            with self.assertRaises(Exception) as context:
+                os.kill(os.getpid(), signal.SIGTERM)
+                time.sleep(1)
+            self.assertEqual("Search was cancelled or finalized (signal 15).", str(context.exception))
+            self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_IGN)
+        finally:
+            for name, handler in handlers.items():
+                signal.signal(getattr(signal, name), handler)
+
+    def test_get_http_adapter_shared(self):
+        db_utils = import_module('databricks_common_utils')
+        adapter = db_utils.get_http_adapter()
+        self.assertIs(adapter, db_utils.get_http_adapter())
+        self.assertEqual(adapter._pool_maxsize, 10)
+        self.assertEqual(adapter.max_retries.total, 0)
+        session = db_utils.get_http_session()
+        self.assertIsNot(session, db_utils.get_http_session())
+        self.assertIs(session.get_adapter("https://example.com"), db_utils.get_http_adapter())
+
+    @patch("databricks_common_utils.get_current_user", return_value="db_admin")
+    def test_current_user_lazy(self, mock_user):
+        db_utils = import_module('databricks_common_utils')
+        user = db_utils.CurrentUser("lazy_session_key")
+        mock_user.assert_not_called()
+        self.assertEqual(str(user), "db_admin")
+        self.assertEqual(str(db_utils.CurrentUser("lazy_session_key")), "db_admin")
+        mock_user.assert_called_once_with("lazy_session_key")
+
+    @patch("databricks_common_utils.get_current_user")
+    def test_current_user_from_search_info(self, mock_user):
+        db_utils = import_module('databricks_common_utils')
+        db_utils.CurrentUser("search_session_key", "search_user")
+        self.assertEqual(str(db_utils.CurrentUser("search_session_key")), "search_user")
+        mock_user.assert_not_called()
+
     @patch("splunk.rest.simpleRequest")
     def test_get_mgmt_port(self, mock_rest):
         db_utils = import_module('databricks_common_utils')
@@ -70,7 +118,36 @@ class TestDatabricksUtils(unittest.TestCase):
         response = db_utils.get_databricks_configs("session_key", "account_name")
         self.assertEqual(response, {"databricks_instance" : "123", "databricks_access_token" : "pat123", "auth_type":"PAT"})
 
-    
+
+    @patch("databricks_common_utils.rest.simpleRequest")
+    def test_get_databricks_configs_cached(self, mock_request):
+        db_utils = import_module('databricks_common_utils')
+        db_utils._LOGGER = MagicMock()
+        mock_request.return_value = (200, json.dumps({"databricks_instance" : "123", "auth_type":"PAT"}))
+        response = db_utils.get_databricks_configs("session_key", "cached_account")
+        response["databricks_instance"] = "modified"
+        response = db_utils.get_databricks_configs("session_key", "cached_account")
+        self.assertEqual(response, {"databricks_instance" : "123", "auth_type":"PAT"})
+        self.assertEqual(mock_request.call_count, 1)
+        db_utils.save_databricks_aad_access_token("cached_account", "session_key", "access_token", "client_secret")
+        db_utils.get_databricks_configs("session_key", "cached_account")
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch("databricks_common_utils.rest.simpleRequest")
+    def test_get_databricks_configs_bulk(self, mock_request):
+        db_utils = import_module('databricks_common_utils')
+        db_utils._LOGGER = MagicMock()
+        mock_request.return_value = (200, json.dumps({
+            "bulk1": {"databricks_instance": "123", "proxy_enabled": "1", "proxy_type": "http", "proxy_url": "proxy"},
+            "bulk2": {"databricks_instance": "456"}}))
+        response = db_utils.get_databricks_configs_bulk("session_key", ["bulk1", "bulk2", "bulk3"])
+        self.assertEqual(sorted(response.keys()), ["bulk1", "bulk2"])
+        self.assertEqual(response["bulk1"]["proxy_uri"]["https"], "http://proxy")
+        mock_request.assert_called_once_with("/databricks_get_credentials", sessionKey="session_key",
+                                             postargs={"names": "bulk1,bulk2,bulk3"}, raiseAllErrors=True)
+        self.assertEqual(db_utils.get_databricks_configs("session_key", "bulk2"), {"databricks_instance": "456"})
+        self.assertEqual(mock_request.call_count, 1)
+
     @patch("databricks_common_utils.rest.simpleRequest")
     def test_save_databricks_aad_access_token(self, mock_manager):
         db_utils = import_module('databricks_common_utils')
@@ -125,14 +202,21 @@ class TestDatabricksUtils(unittest.TestCase):
         db_utils._LOGGER.info.assert_called_with("Proxy is disabled. Skipping proxy mechanism.")
         self.assertEqual(proxy_uri, None)
 
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
     def test_update_kv_store_collection_if(self, mock_post):
         db_utils = import_module('databricks_common_utils')
         mock_post.return_value.status_code =  200
         kv_resp = db_utils.update_kv_store_collection("splunk_uri", "run_collection","session_key", {})
         self.assertEqual(kv_resp, {"kv_status": "KV Store updated successfully"})
     
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
+    def test_update_kv_store_collection_key(self, mock_post):
+        db_utils = import_module('databricks_common_utils')
+        mock_post.return_value.status_code =  200
+        db_utils.update_kv_store_collection("splunk_uri", "run_collection", "session_key", {"_key": "k1"}, key="k1")
+        self.assertTrue(mock_post.call_args[0][0].endswith("/storage/collections/data/run_collection/k1"))
+
+    @patch("databricks_common_utils.requests.Session.post")
     def test_update_kv_store_collection_else(self, mock_post):
         db_utils = import_module('databricks_common_utils')
         mock_post.return_value.status_code =  400
@@ -154,7 +238,7 @@ class TestDatabricksUtils(unittest.TestCase):
     @patch("databricks_common_utils.get_proxy_uri")        
     @patch("databricks_common_utils.get_databricks_configs")        
     @patch("databricks_common_utils.save_databricks_aad_access_token")
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
     def test_get_aad_access_token(self, mock_post, mock_save, mock_conf, mock_proxy):
         db_utils = import_module('databricks_common_utils')
         mock_save.side_effect = MagicMock
@@ -168,7 +252,7 @@ class TestDatabricksUtils(unittest.TestCase):
     @patch("databricks_common_utils.get_proxy_uri")        
     @patch("databricks_common_utils.get_databricks_configs")        
     @patch("databricks_common_utils.save_databricks_aad_access_token")
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
     def test_get_aad_access_token_200(self, mock_post, mock_save, mock_conf, mock_proxy):
         db_utils = import_module('databricks_common_utils')
         mock_save.return_value = MagicMock()
@@ -182,7 +266,7 @@ class TestDatabricksUtils(unittest.TestCase):
     @patch("databricks_common_utils.get_proxy_uri")        
     @patch("databricks_common_utils.get_databricks_configs")        
     @patch("databricks_common_utils.save_databricks_aad_access_token")
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
     def test_get_aad_access_token_200(self, mock_post, mock_save, mock_conf, mock_proxy):
         db_utils = import_module('databricks_common_utils')
         mock_save.return_value = MagicMock()
@@ -197,7 +281,7 @@ class TestDatabricksUtils(unittest.TestCase):
     @patch("databricks_common_utils.get_proxy_uri")        
     @patch("databricks_common_utils.get_databricks_configs")        
     @patch("databricks_common_utils.save_databricks_aad_access_token")
-    @patch("databricks_common_utils.requests.post")
+    @patch("databricks_common_utils.requests.Session.post")
     def test_get_aad_access_token_403(self, mock_post, mock_save, mock_conf, mock_proxy):
         db_utils = import_module('databricks_common_utils')
         mock_save.return_value = MagicMock()
@@ -211,4 +295,31 @@ class TestDatabricksUtils(unittest.TestCase):
 
 
     
-    
\ No newline at end of file
+    
+    @patch("databricks_common_utils.cli.getConfStanza")
+    def test_get_performance_settings(self, mock_stanza):
+        db_utils = import_module('databricks_common_utils')
+        db_utils._LOGGER = MagicMock()
+        mock_stanza.return_value = {"context_pool_enabled": "true", "context_pool_max_per_cluster": "8", "context_pool_idle_timeout": "abc"}
+        db_utils._PERFORMANCE_SETTINGS = None
+        response = db_utils.get_performance_settings()
+        self.assertTrue(response["context_pool_enabled"])
+        self.assertEqual(response["context_pool_max_per_cluster"], 8)
+        self.assertEqual(response["context_pool_idle_timeout"], 600)
+        db_utils._LOGGER.warning.assert_called_once()
+
+    @patch("databricks_common_utils.time.time")
+    @patch("databricks_common_utils.cli.getConfStanza")
+    def test_get_performance_settings_cached(self, mock_stanza, mock_time):
+        db_utils = import_module('databricks_common_utils')
+        db_utils._PERFORMANCE_SETTINGS = None
+        mock_time.return_value = 1000
+        mock_stanza.return_value = {"fan_out_max_workers": "8"}
+        self.assertEqual(db_utils.get_performance_settings()["fan_out_max_workers"], 8)
+        mock_stanza.return_value = {"fan_out_max_workers": "2"}
+        mock_time.return_value = 1059
+        self.assertEqual(db_utils.get_performance_settings()["fan_out_max_workers"], 8)
+        mock_stanza.assert_called_once()
+        mock_time.return_value = 1060
+        self.assertEqual(db_utils.get_performance_settings()["fan_out_max_workers"], 2)
+        db_utils._PERFORMANCE_SETTINGS = None
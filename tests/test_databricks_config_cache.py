@@ -0,0 +1,118 @@
+import declare
+import os
+import json
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+CONFIGS = {"databricks_instance": "123", "databricks_pat": "pat123", "proxy_uri": {"use_for_oauth": "0"}}
+
+
+class TestConfigCache(unittest.TestCase):
+    """Test configuration cache."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.config_cache = import_module('databricks_config_cache')
+        self.config_cache._MEMORY_CACHE.clear()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def test_get_not_cached(self):
+        self.assertIsNone(self.config_cache.get("account", 60))
+
+    def test_put_and_get(self):
+        self.config_cache.put("account", CONFIGS)
+        configs = self.config_cache.get("account", 60)
+        self.assertEqual(configs, CONFIGS)
+        configs["proxy_uri"].pop("use_for_oauth")
+        self.assertEqual(self.config_cache.get("account", 60), CONFIGS)
+
+    @patch("databricks_config_cache.time")
+    def test_get_expired(self, mock_time):
+        mock_time.time.return_value = 100
+        self.config_cache.put("account", CONFIGS)
+        mock_time.time.return_value = 161
+        self.assertIsNone(self.config_cache.get("account", 60))
+
+    def test_invalidate(self):
+        self.config_cache.put("account", CONFIGS)
+        self.config_cache.invalidate()
+        self.assertIsNone(self.config_cache.get("account", 60))
+
+    def test_invalidate_from_other_process(self):
+        self.config_cache.put("account", CONFIGS)
+        store = self.config_cache._get_generation_file()
+        with store.update() as state:
+            state["generation"] = 5
+        self.assertIsNone(self.config_cache.get("account", 60))
+
+    def test_put_without_key_is_memory_only(self):
+        with patch("databricks_config_cache._get_key", return_value=None):
+            self.config_cache.put("account", CONFIGS)
+        cache_dir = import_module('databricks_shared_state').get_state_dir("config_cache")
+        self.assertFalse([f for f in os.listdir(cache_dir) if f.endswith(".bin")])
+
+    def write_secret(self):
+        auth_dir = os.path.join(self.splunk_home.name, "etc", "auth")
+        os.makedirs(auth_dir)
+        with open(os.path.join(auth_dir, "splunk.secret"), "w") as f:
+            f.write("secret\n")
+
+    def test_shared_between_processes(self):
+        self.write_secret()
+        self.config_cache.put("account", CONFIGS)
+        with open(self.config_cache._get_entry_path("account"), "rb") as f:
+            self.assertNotIn(b"proxy_uri", f.read())
+        self.config_cache._MEMORY_CACHE.clear()
+        self.assertEqual(self.config_cache.get("account", 60), CONFIGS)
+        self.config_cache.invalidate()
+        cache_dir = import_module('databricks_shared_state').get_state_dir("config_cache")
+        self.assertFalse([f for f in os.listdir(cache_dir) if f.endswith(".bin")])
+
+    def test_encrypt_round_trip(self):
+        data = json.dumps(CONFIGS).encode("utf-8") * 3
+        encrypted = self.config_cache._encrypt(b"key", data)
+        self.assertNotEqual(self.config_cache._encrypt(b"key", data), encrypted)
+        self.assertEqual(self.config_cache._decrypt(b"key", encrypted), data)
+        self.assertEqual(self.config_cache._decrypt(b"key", self.config_cache._encrypt(b"key", b"")), b"")
+
+        tampered = encrypted[:-1] + bytes([encrypted[-1] ^ 1])
+        for key, data in ((b"key", tampered), (b"other key", encrypted)):
+            with self.assertRaises(Exception) as context:
+                self.config_cache._decrypt(key, data)
+            self.assertEqual("The cached configurations failed the integrity check.", str(context.exception))
+
+    def test_get_tampered_entry(self):
+        self.write_secret()
+        self.config_cache.put("account", CONFIGS)
+        with open(self.config_cache._get_entry_path("account"), "ab") as f:
+            f.write(b"x")
+        self.config_cache._MEMORY_CACHE.clear()
+        self.assertIsNone(self.config_cache.get("account", 60))
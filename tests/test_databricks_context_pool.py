@@ -0,0 +1,132 @@
+import declare
+import os
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock, call
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestExecutionContextPool(unittest.TestCase):
+    """Test ExecutionContextPool."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name}).start()
+        self.pool_module = import_module('databricks_context_pool')
+        self.client = MagicMock()
+        self.client.account_name = "account1"
+
+    def tearDown(self):
+        patch.dict(os.environ).stop()
+        self.splunk_home.cleanup()
+
+    def get_pool(self, max_contexts=2, idle_timeout=600, user="admin"):
+        return self.pool_module.ExecutionContextPool(
+            self.client, "c1", "sql", max_contexts=max_contexts, idle_timeout=idle_timeout, lease_timeout=360,
+            user=user)
+
+    def test_create_and_reuse_context(self):
+        pool = self.get_pool()
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {"status": "Running"}]
+        context_id, pooled = pool.acquire()
+        self.assertEqual((context_id, pooled), ("ctx1", True))
+        pool.release(context_id, pooled)
+        context_id, pooled = self.get_pool().acquire()
+        self.assertEqual((context_id, pooled), ("ctx1", True))
+        self.assertEqual(self.client.databricks_api.call_count, 2)
+        self.client.databricks_api.assert_called_with(
+            "get", "/api/1.2/contexts/status", args={"clusterId": "c1", "contextId": "ctx1"})
+
+    def test_leased_context_not_shared(self):
+        pool = self.get_pool()
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {"id": "ctx2"}]
+        self.assertEqual(pool.acquire(), ("ctx1", True))
+        self.assertEqual(pool.acquire(), ("ctx2", True))
+
+    def test_pool_cap(self):
+        pool = self.get_pool(max_contexts=1)
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {"id": "ctx2"}, {}]
+        self.assertEqual(pool.acquire(), ("ctx1", True))
+        self.assertEqual(pool.acquire(), ("ctx2", False))
+        pool.release("ctx2", False)
+        self.client.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx2", "clusterId": "c1"})
+        self.assertEqual(len(pool.store.read()["account1|c1|sql|admin"]), 1)
+
+    def test_unhealthy_context_discarded(self):
+        pool = self.get_pool()
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}]
+        pool.release(*pool.acquire())
+        self.client.databricks_api.side_effect = [{"status": "Error"}, {}, {"id": "ctx2"}]
+        self.assertEqual(pool.acquire(), ("ctx2", True))
+        self.assertIn(
+            call("post", "/api/1.2/contexts/destroy", data={"contextId": "ctx1", "clusterId": "c1"}),
+            self.client.databricks_api.call_args_list)
+        self.assertEqual([e["context_id"] for e in pool.store.read()["account1|c1|sql|admin"]], ["ctx2"])
+
+    def test_idle_context_evicted(self):
+        pool = self.get_pool(idle_timeout=-1)
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}]
+        pool.release(*pool.acquire())
+        self.client.databricks_api.side_effect = [{}, {"id": "ctx2"}]
+        self.assertEqual(pool.acquire(), ("ctx2", True))
+        self.client.databricks_api.assert_any_call(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx1", "clusterId": "c1"})
+
+    def test_release_not_reusable(self):
+        pool = self.get_pool()
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {}]
+        context_id, pooled = pool.acquire()
+        pool.release(context_id, pooled, reusable=False)
+        self.assertEqual(pool.store.read()["account1|c1|sql|admin"], [])
+        self.client.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx1", "clusterId": "c1"})
+
+    def test_pool_scoped_per_user(self):
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {"id": "ctx2"}]
+        pool = self.get_pool()
+        pool.release(*pool.acquire())
+        self.assertEqual(self.get_pool(user="user2").acquire(), ("ctx2", True))
+
+    @patch("databricks_context_pool.time")
+    def test_evict_expired_contexts(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.client.databricks_api.side_effect = [{"id": "ctx1"}, {"id": "ctx2"}, {"id": "ctx3"}]
+        pool = self.get_pool()
+        leased = pool.acquire()
+        pool.acquire()
+        pool.release(*leased)
+        other_pool = self.get_pool(user="user2")
+        other_pool.release(*other_pool.acquire())
+
+        mock_time.time.return_value = 1200
+        self.assertEqual(self.pool_module.evict_expired_contexts(300), [])
+        # ctx2 is still leased, the idle ones are evicted
+        mock_time.time.return_value = 1350
+        self.assertEqual(
+            self.pool_module.evict_expired_contexts(300), [("account1", "c1", "ctx1"), ("account1", "c1", "ctx3")])
+        self.assertEqual(list(pool.store.read()), ["account1|c1|sql|admin"])
+        # ctx2 is abandoned by its search
+        mock_time.time.return_value = 1400
+        self.assertEqual(self.pool_module.evict_expired_contexts(300), [("account1", "c1", "ctx2")])
+        self.assertEqual(pool.store.read(), {})
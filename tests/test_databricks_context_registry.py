@@ -0,0 +1,66 @@
+import declare
+import json
+import unittest
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestContextRegistry(unittest.TestCase):
+    """Test ContextRegistry."""
+
+    def setUp(self):
+        self.registry_module = import_module('databricks_context_registry')
+        self.registry = self.registry_module.ContextRegistry("https://localhost:8089", "session_key", "sid1")
+
+    @patch("databricks_context_registry.time.time", return_value=1000)
+    @patch("requests.Session.request")
+    def test_register(self, mock_request, mock_time):
+        self.registry.register("A1", "c1", "ctx1", 60)
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args[0], "post")
+        self.assertTrue(args[1].endswith("/storage/collections/data/databricks_execution_context"))
+        record = json.loads(kwargs["data"])
+        self.assertEqual(record["_key"], "ctx1")
+        self.assertEqual(record["sid"], "sid1")
+        self.assertEqual(record["expires_time"], 1360)
+
+    @patch("requests.Session.request")
+    def test_register_failure_is_not_raised(self, mock_request):
+        mock_request.side_effect = Exception("KV store is down.")
+        self.registry.register("A1", "c1", "ctx1", 60)
+
+    @patch("requests.Session.request")
+    def test_unregister(self, mock_request):
+        self.registry.unregister("ctx1")
+        args, _ = mock_request.call_args
+        self.assertEqual(args[0], "delete")
+        self.assertTrue(args[1].endswith("/databricks_execution_context/ctx1"))
+
+    @patch("databricks_context_registry.time.time", return_value=1000)
+    @patch("requests.Session.request")
+    def test_get_expired(self, mock_request, mock_time):
+        mock_request.return_value.json.return_value = [{"_key": "ctx1"}]
+        self.assertEqual(self.registry.get_expired(), [{"_key": "ctx1"}])
+        _, kwargs = mock_request.call_args
+        self.assertEqual(json.loads(kwargs["params"]["query"]), {"expires_time": {"$lt": 1000}})
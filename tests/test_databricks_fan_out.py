@@ -0,0 +1,99 @@
+import declare
+import unittest
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+        'splunktalib.common.log',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestFanOutQueryExecutor(unittest.TestCase):
+    """Test FanOutQueryExecutor."""
+
+    def setUp(self):
+        self.fan_out = import_module('databricks_fan_out')
+        self.warn = MagicMock()
+
+    def get_target(self, account_name, rows=None, error=None):
+        executor = MagicMock()
+        if error:
+            executor.execute.side_effect = error
+        else:
+            executor.execute.return_value = iter([dict(row) for row in rows])
+        return {"databricks_account": account_name}, lambda warn: executor
+
+    def test_execute_merges_records(self):
+        targets = [self.get_target("A1", [{"f": "1"}, {"f": "2"}]), self.get_target("A2", [{"f": "3"}])]
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(2, warn=self.warn)
+        rows = list(fan_out_executor.execute(targets, "SELECT 1"))
+        self.assertEqual(sorted(rows, key=lambda row: row["f"]), [
+            {"f": "1", "databricks_account": "A1"},
+            {"f": "2", "databricks_account": "A1"},
+            {"f": "3", "databricks_account": "A2"}])
+        self.warn.assert_not_called()
+
+    def test_execute_partial_failure(self):
+        targets = [self.get_target("A1", [{"f": "1"}]), self.get_target("A2", error=Exception("Invalid API endpoint."))]
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(2, warn=self.warn)
+        rows = list(fan_out_executor.execute(targets, "SELECT 1"))
+        self.assertEqual(rows, [{"f": "1", "databricks_account": "A1"}])
+        self.warn.assert_called_once_with("Query execution failed for databricks_account=A2: Invalid API endpoint.")
+
+    def test_execute_all_failed(self):
+        targets = [self.get_target("A1", error=Exception("error")), self.get_target("A2", error=Exception("error"))]
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(1, warn=self.warn)
+        with self.assertRaises(Exception) as context:
+            list(fan_out_executor.execute(targets, "SELECT 1"))
+        self.assertEqual("Query execution failed on all the accounts.", str(context.exception))
+        self.assertEqual(self.warn.call_count, 2)
+
+    def test_execute_stopped_cancels_executors(self):
+        fields, create_executor = self.get_target("A1", [{"f": "1"}, {"f": "2"}])
+        executor = create_executor(None)
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(1)
+        resp = fan_out_executor.execute([(fields, create_executor)], "SELECT 1")
+        next(resp)
+        resp.close()
+        self.assertTrue(fan_out_executor.stopped.is_set())
+        executor.cancel.assert_called_once()
+
+    def test_execute_target_killed(self):
+        class Killed(BaseException):
+            pass
+
+        targets = [self.get_target("A1", [{"f": "1"}]), self.get_target("A2", error=Killed())]
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(2, warn=self.warn)
+        # The exception ends the worker thread
+        with patch("threading.excepthook"):
+            rows = list(fan_out_executor.execute(targets, "SELECT 1"))
+        self.assertEqual(rows, [{"f": "1", "databricks_account": "A1"}])
+        self.warn.assert_called_once_with("Query execution stopped unexpectedly for databricks_account=A2.")
+
+    @patch("databricks_fan_out.const.FAN_OUT_QUEUE_TIMEOUT_IN_SECONDS", 0.01)
+    @patch("databricks_fan_out.is_pool_alive", return_value=False)
+    @patch("databricks_fan_out.ThreadPool")
+    def test_execute_pool_dead(self, mock_pool, mock_alive):
+        fan_out_executor = self.fan_out.FanOutQueryExecutor(2, warn=self.warn)
+        with self.assertRaises(Exception) as context:
+            list(fan_out_executor.execute([self.get_target("A1", [{"f": "1"}])], "SELECT 1"))
+        self.assertEqual("Query execution stopped unexpectedly on 1 target(s).", str(context.exception))
+        mock_pool.return_value.tear_down.assert_called_once()
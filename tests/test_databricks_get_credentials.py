@@ -6,15 +6,20 @@ from utility import Response
 import json
 import traceback
 import base64
+import tempfile
 from importlib import import_module
 from mock import patch, MagicMock
 
 
 mocked_modules = {}
+splunk_home = None
 
 
 def setUpModule():
-    global mocked_modules
+    global mocked_modules, splunk_home
+
+    splunk_home = tempfile.TemporaryDirectory()
+    patch.dict(os.environ, {"SPLUNK_HOME": splunk_home.name}).start()
 
     module_to_be_mocked = [
         "log_manager",
@@ -33,6 +38,7 @@ def setUpModule():
 
 def tearDownModule():
     patch.stopall()
+    splunk_home.cleanup()
 
 
 class TestDatabricksGetCredentials(unittest.TestCase):
@@ -106,3 +112,55 @@ class TestDatabricksGetCredentials(unittest.TestCase):
         mock_request.return_value = (200, json.dumps({"entry":[{"content":{"auth_type":"PAT", "databricks_instance":"http", "cluster_name":"test"}},"test"]}))
         result = obj1.handle(input_string)
         db_cm._LOGGER.debug.assert_called_with("Account configurations read successfully from account.conf .")
+
+    @patch("databricks_get_credentials.CredentialManager")
+    @patch("databricks_get_credentials.rest.simpleRequest")
+    def test_handle_retrieve_config_cached(self, mock_request, mock_manager):
+        db_cm = import_module("databricks_get_credentials")
+        db_cm._clear_cache()
+        self.addCleanup(db_cm._clear_cache)
+        mock_manager.return_value.get_password.return_value = json.dumps({"databricks_pat": "pat123"})
+        mock_request.return_value = (200, json.dumps({"entry": [{"content": {"auth_type": "PAT", "databricks_instance": "http"}}]}))
+        input_string = json.dumps({"system_authtoken": "dummy_token", "form": {"name": "test"}})
+        obj1 = db_cm.DatabricksGetCredentials("command_line", "command_args")
+        result1 = obj1.handle(input_string)
+        result2 = db_cm.DatabricksGetCredentials("command_line", "command_args").handle(input_string)
+        self.assertEqual(result1["payload"]["databricks_pat"], "pat123")
+        self.assertEqual(result1, result2)
+        self.assertEqual(mock_request.call_count, 2)
+
+    @patch("databricks_get_credentials.CredentialManager")
+    @patch("databricks_get_credentials.rest.simpleRequest")
+    def test_handle_bulk(self, mock_request, mock_manager):
+        db_cm = import_module("databricks_get_credentials")
+        db_cm._clear_cache()
+        self.addCleanup(db_cm._clear_cache)
+        credential_manager_mock = mock_manager.return_value
+        credential_manager_mock.get_clear_passwords.return_value = [
+            {"realm": db_cm.ACCOUNT_REALM, "username": "acc1", "clear_password": json.dumps({"databricks_pat": "pat1"})},
+            {"realm": db_cm.ACCOUNT_REALM, "username": "acc2", "clear_password": json.dumps({"aad_client_secret": "sec2"})},
+            {"realm": db_cm.PROXY_REALM, "username": "proxy", "clear_password": json.dumps({"proxy_password": "pwd"})},
+        ]
+        mock_request.side_effect = [
+            (200, json.dumps({"entry": [
+                {"name": "acc1", "content": {"auth_type": "PAT", "databricks_instance": "http1"}},
+                {"name": "acc2", "content": {"auth_type": "AAD", "databricks_instance": "http2", "aad_client_id": "cid"}},
+                {"name": "acc3", "content": {"auth_type": "PAT", "databricks_instance": "http3"}},
+            ]})),
+            (200, json.dumps({"entry": [{"content": {"proxy_enabled": "1", "proxy_password": "******"}}]})),
+        ]
+        obj1 = db_cm.DatabricksGetCredentials("command_line", "command_args")
+        result = obj1.handle(json.dumps({"system_authtoken": "dummy_token", "form": {"names": "acc1, acc2,acc4"}}))
+        self.assertEqual(result["status"], 200)
+        self.assertEqual(sorted(result["payload"].keys()), ["acc1", "acc2"])
+        self.assertEqual(result["payload"]["acc1"]["databricks_pat"], "pat1")
+        self.assertEqual(result["payload"]["acc2"]["aad_client_secret"], "sec2")
+        self.assertEqual(result["payload"]["acc2"]["proxy_password"], "pwd")
+        credential_manager_mock.get_clear_passwords.assert_called_once()
+
+        # Served from the process cache
+        result = obj1.handle(json.dumps({"system_authtoken": "dummy_token", "form": {"names": "*"}}))
+        self.assertEqual(sorted(result["payload"].keys()), ["acc1", "acc2"])
+        result = obj1.handle(json.dumps({"system_authtoken": "dummy_token", "form": {"name": "acc1"}}))
+        self.assertEqual(result["payload"]["databricks_instance"], "http1")
+        self.assertEqual(mock_request.call_count, 2)
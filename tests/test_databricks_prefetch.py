@@ -0,0 +1,129 @@
+import declare
+import os
+import time
+import unittest
+import tempfile
+import threading
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+CHUNKS = [[["1", "a"]], [["2", "b"], ["3", "c"]], [], [["4", "d"]]]
+
+
+class TestPrefetchIterator(unittest.TestCase):
+    """Test PrefetchIterator."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.prefetch = import_module('databricks_prefetch')
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def test_in_memory(self):
+        iterator = self.prefetch.PrefetchIterator(iter(CHUNKS), 10, 1024)
+        self.assertEqual(list(iterator), CHUNKS)
+        self.assertEqual(iterator.spill_count, 0)
+
+    def test_spill_while_consumer_lags(self):
+        release = threading.Event()
+
+        def chunks():
+            yield from CHUNKS[:3]
+            release.wait(5)
+            yield CHUNKS[3]
+
+        iterator = self.prefetch.PrefetchIterator(chunks(), 1, 1024 * 1024)
+        items = iter(iterator)
+        self.assertEqual(next(items), CHUNKS[0])
+        # The first item is held by the consumer until it resumes, the next ones are spilled
+        while iterator.spill_count < 2:
+            time.sleep(0.01)
+        self.assertEqual(next(items), CHUNKS[1])
+        release.set()
+        self.assertEqual(list(items), CHUNKS[2:])
+        self.assertEqual(iterator.spill_count, 2)
+
+    def test_spill_limit_waits_for_consumer(self):
+        iterator = self.prefetch.PrefetchIterator(iter(CHUNKS), 1, 1)
+        items = iter(iterator)
+        self.assertEqual(next(items), CHUNKS[0])
+        iterator.thread.join(0.5)
+        self.assertEqual(list(items), CHUNKS[1:])
+        self.assertEqual(iterator.spill_count, 1)
+
+    def test_error(self):
+        def chunks():
+            yield CHUNKS[0]
+            raise Exception("Unable to download the chunk.")
+
+        iterator = self.prefetch.PrefetchIterator(chunks(), 2, 1024)
+        items = iter(iterator)
+        self.assertEqual(next(items), CHUNKS[0])
+        with self.assertRaises(Exception) as context:
+            next(items)
+        self.assertEqual("Unable to download the chunk.", str(context.exception))
+
+    def test_close_stops_fetching(self):
+        fetched = []
+
+        def chunks():
+            for chunk in CHUNKS:
+                fetched.append(chunk)
+                yield chunk
+
+        iterator = self.prefetch.PrefetchIterator(chunks(), 1, 0)
+        items = iter(iterator)
+        next(items)
+        items.close()
+        iterator.thread.join(5)
+        self.assertFalse(iterator.thread.is_alive())
+        self.assertLess(len(fetched), len(CHUNKS))
+
+    @patch("databricks_prefetch.const.PREFETCH_WAIT_INTERVAL_IN_SECONDS", 0.1)
+    def test_close_while_fetching_releases_spill_file(self):
+        release = threading.Event()
+
+        def chunks():
+            yield CHUNKS[0]
+            yield CHUNKS[1]
+            release.wait(5)
+            yield CHUNKS[2]
+
+        iterator = self.prefetch.PrefetchIterator(chunks(), 1, 1024 * 1024)
+        items = iter(iterator)
+        next(items)
+        while iterator.spill_count == 0:
+            time.sleep(0.01)
+        items.close()
+        self.assertTrue(iterator.thread.is_alive())
+        self.assertIsNotNone(iterator.spill_file)
+
+        release.set()
+        iterator.thread.join(5)
+        self.assertFalse(iterator.thread.is_alive())
+        self.assertIsNone(iterator.spill_file)
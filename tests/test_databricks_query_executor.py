@@ -0,0 +1,319 @@
+import declare
+import os
+import decimal
+import tempfile
+import datetime
+import unittest
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+splunk_home = None
+def setUpModule():
+    global mocked_modules, splunk_home
+
+    splunk_home = tempfile.TemporaryDirectory()
+    patch.dict(os.environ, {"SPLUNK_HOME": splunk_home.name}).start()
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+    splunk_home.cleanup()
+
+
+SCHEMA = {"columns": [{"name": "field1"}, {"name": "field2"}]}
+
+
+class TestRecordConverter(unittest.TestCase):
+    """Test the schema driven conversion of the rows."""
+
+    def setUp(self):
+        self.executors = import_module('databricks_query_executor')
+
+    def test_scalar_columns(self):
+        convert = self.executors.compile_record_converter([("a", None, None), ("b", None, None)])
+        self.assertEqual(convert([1, "x"]), {"a": 1, "b": "x"})
+
+    def test_cluster_complex_columns(self):
+        headers = [
+            {"name": "id", "type": '"integer"'},
+            {"name": "tags", "type": '{"type":"array","elementType":"string","containsNull":true}'},
+            {"name": "address", "type": '{"type":"struct","fields":[{"name":"city","type":"string"},'
+                                        '{"name":"geo","type":{"type":"struct","fields":[]}}]}'},
+            {"name": "props", "type": '{"type":"map","keyType":"string","valueType":"string"}'},
+        ]
+        convert = self.executors.compile_record_converter(
+            [self.executors.get_cluster_column(header) for header in headers])
+        self.assertEqual(
+            convert([1, ["a", "b"], ["Paris", {"lat": 1, "lon": 2}], {"k": "v"}]),
+            {"id": 1, "tags": ["a", "b"], "address.city": "Paris", "address.geo.lat": 1, "address.geo.lon": 2,
+             "props": '{"k": "v"}'})
+        self.assertEqual(convert([2, None, None, None]), {"id": 2, "tags": None, "address": None, "props": None})
+
+    def test_statement_complex_columns(self):
+        columns = [{"name": "id", "type_name": "INT"}, {"name": "tags", "type_name": "ARRAY"},
+                   {"name": "address", "type_name": "STRUCT"}]
+        convert = self.executors.compile_record_converter(
+            [self.executors.get_statement_column(column) for column in columns])
+        self.assertEqual(
+            convert(["1", '["a",{"b":1}]', '{"city":"Paris","zip":["75001"]}']),
+            {"id": "1", "tags": ["a", '{"b": 1}'], "address.city": "Paris", "address.zip": ["75001"]})
+
+
+class TestClusterQueryExecutor(unittest.TestCase):
+    """Test ClusterQueryExecutor."""
+
+    def setUp(self):
+        self.executors = import_module('databricks_query_executor')
+        self.client = MagicMock()
+
+    @patch("databricks_query_executor.ExecutionContextPool", autospec=True)
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_with_context_pool(self, mock_settings, mock_pool):
+        mock_settings.return_value = dict(import_module('databricks_const').PERFORMANCE_DEFAULTS,
+                                          context_pool_enabled=True)
+        pool = mock_pool.return_value
+        pool.acquire.return_value = ("ctx1", True)
+        self.client.databricks_api.side_effect = [
+            {"id": "command_id1"},
+            {"status": "Finished", "results": {"data": [["1"]], "resultType": "table", "truncated": False,
+                                               "schema": [{"name": "field1"}]}}]
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"field1": "1"}])
+        pool.release.assert_called_once_with("ctx1", True, reusable=True)
+        self.assertEqual(self.client.databricks_api.call_count, 2)
+
+    @patch("databricks_query_executor.ExecutionContextPool", autospec=True)
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_with_context_pool_error(self, mock_settings, mock_pool):
+        mock_settings.return_value = dict(import_module('databricks_const').PERFORMANCE_DEFAULTS,
+                                          context_pool_enabled=True)
+        pool = mock_pool.return_value
+        pool.acquire.return_value = ("ctx1", True)
+        self.client.databricks_api.side_effect = [{"id": "command_id1"}, {"status": "Error"}]
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60)
+        with self.assertRaises(Exception):
+            list(executor.execute("SELECT 1"))
+        pool.release.assert_called_once_with("ctx1", True, reusable=False)
+
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_registers_context(self, mock_settings):
+        mock_settings.return_value = import_module('databricks_const').PERFORMANCE_DEFAULTS
+        self.client.account_name = "A1"
+        self.client.databricks_api.side_effect = [
+            {"id": "ctx1"}, {"id": "command_id1"},
+            {"status": "Finished", "results": {"data": [["1"]], "resultType": "table", "truncated": False,
+                                               "schema": [{"name": "field1"}]}}, {}]
+        registry = MagicMock()
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60, registry=registry)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"field1": "1"}])
+        registry.register.assert_called_once_with("A1", "c1", "ctx1", 60)
+        registry.unregister.assert_called_once_with("ctx1")
+
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_context_left_to_reaper(self, mock_settings):
+        mock_settings.return_value = import_module('databricks_const').PERFORMANCE_DEFAULTS
+        self.client.databricks_api.side_effect = [
+            {"id": "ctx1"}, {"id": "command_id1"}, {"status": "Error"}, Exception("Unable to destroy.")]
+        registry = MagicMock()
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60, registry=registry)
+        with self.assertRaises(Exception) as context:
+            list(executor.execute("SELECT 1"))
+        self.assertEqual("Could not complete the query execution. Status: Error.", str(context.exception))
+        registry.register.assert_called_once()
+        registry.unregister.assert_not_called()
+
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_keeps_result_when_destroy_fails(self, mock_settings):
+        mock_settings.return_value = import_module('databricks_const').PERFORMANCE_DEFAULTS
+        self.client.databricks_api.side_effect = [
+            {"id": "ctx1"}, {"id": "command_id1"},
+            {"status": "Finished", "results": {"data": [["1"]], "resultType": "table", "truncated": False,
+                                               "schema": [{"name": "field1"}]}}, Exception("Unable to destroy.")]
+        registry = MagicMock()
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60, registry=registry)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"field1": "1"}])
+        registry.register.assert_called_once()
+        registry.unregister.assert_not_called()
+
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_cancelled_while_polling(self, mock_settings):
+        mock_settings.return_value = import_module('databricks_const').PERFORMANCE_DEFAULTS
+        self.client.databricks_api.side_effect = [
+            {"id": "ctx1"}, {"id": "command_id1"}, Exception("Search was cancelled or finalized (signal 15)."),
+            {}, {}]
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 60)
+        with self.assertRaises(Exception):
+            list(executor.execute("SELECT 1"))
+        self.client.databricks_api.assert_any_call(
+            "post", "/api/1.2/commands/cancel", data={"clusterId": "c1", "contextId": "ctx1", "commandId": "command_id1"})
+        self.client.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx1", "clusterId": "c1"})
+
+    @patch("databricks_com.time", autospec=True)
+    @patch("databricks_query_executor.utils.get_performance_settings")
+    def test_execute_timeout_cancels_command(self, mock_settings, mock_time):
+        mock_settings.return_value = import_module('databricks_const').PERFORMANCE_DEFAULTS
+        self.client.databricks_api.side_effect = [
+            {"id": "ctx1"}, {"id": "command_id1"}, {"status": "Running"}, {"status": "Running"}, {}, {}]
+        self.client.get_retry_after.return_value = None
+        executor = self.executors.ClusterQueryExecutor(self.client, "c1", 0.1)
+        with self.assertRaises(Exception) as context:
+            list(executor.execute("SELECT 1"))
+        self.assertEqual("Command execution timed out. Last status: Running.", str(context.exception))
+        self.client.databricks_api.assert_any_call(
+            "post", "/api/1.2/commands/cancel", data={"clusterId": "c1", "contextId": "ctx1", "commandId": "command_id1"})
+        self.client.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx1", "clusterId": "c1"})
+
+
+class TestStatementQueryExecutor(unittest.TestCase):
+    """Test StatementQueryExecutor."""
+
+    def setUp(self):
+        self.executors = import_module('databricks_query_executor')
+        self.client = MagicMock()
+        self.warn = MagicMock()
+
+    def test_execute_inline_chunks(self):
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": SCHEMA, "total_chunk_count": 2},
+             "result": {"chunk_index": 0, "data_array": [["1", "2"]], "next_chunk_index": 1}},
+            {"chunk_index": 1, "data_array": [["3", "4"]]},
+        ]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60, warn=self.warn)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"field1": "1", "field2": "2"}, {"field1": "3", "field2": "4"}])
+        self.client.databricks_api.assert_called_with("get", "/api/2.0/sql/statements/s1/result/chunks/1")
+        self.warn.assert_not_called()
+
+    def test_execute_external_links(self):
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": SCHEMA, "truncated": True},
+             "result": {"external_links": [{"chunk_index": 0, "external_link": "https://link0",
+                                            "next_chunk_index": 1}]}},
+            {"external_links": [{"chunk_index": 1, "external_link": "https://link1"}]},
+        ]
+        self.client.download_external_link.side_effect = [[["1", "2"]], [["3", "4"]]]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60, warn=self.warn)
+        resp = executor.execute("SELECT 1")
+        self.assertEqual(next(resp), {"field1": "1", "field2": "2"})
+        self.assertEqual(self.client.download_external_link.call_count, 1)
+        self.assertEqual(next(resp), {"field1": "3", "field2": "4"})
+        self.assertEqual(self.client.download_external_link.call_count, 2)
+        self.warn.assert_called_once_with("Results are truncated due to Databricks API limitations.")
+
+    @patch("databricks_com.time", autospec=True)
+    def test_execute_poll_until_succeeded(self, mock_time):
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "PENDING"}},
+            {"statement_id": "s1", "status": {"state": "RUNNING"}},
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": SCHEMA}, "result": {"data_array": [["1", "2"]]}},
+        ]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"field1": "1", "field2": "2"}])
+        self.assertEqual(mock_time.sleep.call_count, 2)
+
+    def test_execute_failed(self):
+        self.client.databricks_api.return_value = {
+            "statement_id": "s1",
+            "status": {"state": "FAILED", "error": {"message": "Table not found."}},
+        }
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        with self.assertRaises(Exception) as context:
+            list(executor.execute("SELECT 1"))
+        self.assertEqual("Table not found.", str(context.exception))
+
+    @patch("databricks_com.time", autospec=True)
+    def test_execute_timeout_cancels_statement(self, mock_time):
+        self.client.databricks_api.return_value = {"statement_id": "s1", "status": {"state": "RUNNING"}}
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 1)
+        with self.assertRaises(Exception) as context:
+            list(executor.execute("SELECT 1"))
+        self.assertEqual("Command execution timed out. Last status: RUNNING.", str(context.exception))
+        self.client.databricks_api.assert_called_with("post", "/api/2.0/sql/statements/s1/cancel")
+
+    def test_execute_cancelled_while_polling(self):
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "PENDING"}},
+            Exception("Search was cancelled or finalized (signal 15)."),
+            {},
+        ]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        with patch("databricks_com.time", autospec=True):
+            with self.assertRaises(Exception):
+                list(executor.execute("SELECT 1"))
+        self.client.databricks_api.assert_called_with("post", "/api/2.0/sql/statements/s1/cancel")
+        self.assertEqual(self.client.databricks_api.call_count, 3)
+
+    def test_execute_batches_cancels_last_statement(self):
+        # databrickslookup executes a statement per batch of keys with the same executor
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": SCHEMA}, "result": {"data_array": [["1", "2"]]}},
+            {"statement_id": "s2", "status": {"state": "PENDING"}},
+            Exception("Search was cancelled or finalized (signal 15)."),
+            {},
+        ]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        self.assertEqual(list(executor.execute("SELECT 1")), [{"field1": "1", "field2": "2"}])
+        with patch("databricks_com.time", autospec=True):
+            with self.assertRaises(Exception):
+                list(executor.execute("SELECT 2"))
+        self.client.databricks_api.assert_called_with("post", "/api/2.0/sql/statements/s2/cancel")
+
+    @patch("databricks_query_executor.pyarrow")
+    def test_execute_arrow_results(self, mock_pyarrow):
+        mock_pyarrow.types.is_temporal.side_effect = lambda data_type: data_type == "timestamp"
+        mock_pyarrow.types.is_decimal.side_effect = lambda data_type: data_type == "decimal"
+        mock_pyarrow.types.is_binary.return_value = False
+        mock_pyarrow.types.is_large_binary.return_value = False
+        columns = [MagicMock(type="timestamp"), MagicMock(type="decimal"), MagicMock(type="list")]
+        columns[0].to_pylist.return_value = [datetime.datetime(2024, 1, 1, 10, 30), None]
+        columns[1].to_pylist.return_value = [decimal.Decimal("1.50"), decimal.Decimal("2")]
+        columns[2].to_pylist.return_value = [["a", "b"], []]
+        batch = MagicMock(num_columns=3)
+        batch.column.side_effect = lambda index: columns[index]
+        mock_pyarrow.ipc.open_stream.return_value = iter([batch])
+        self.client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": {"columns": [{"name": "ts", "type_name": "TIMESTAMP"},
+                                                 {"name": "amount", "type_name": "DECIMAL"},
+                                                 {"name": "tags", "type_name": "ARRAY"}]}},
+             "result": {"external_links": [{"chunk_index": 0, "external_link": "https://link0"}]}},
+        ]
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        rows = list(executor.execute("SELECT 1"))
+        self.assertEqual(rows, [{"ts": "2024-01-01T10:30:00", "amount": "1.50", "tags": ["a", "b"]},
+                                {"ts": None, "amount": "2", "tags": []}])
+        self.assertEqual(self.client.databricks_api.call_args_list[0][1]["data"]["format"], "ARROW_STREAM")
+        self.client.stream_external_link.assert_called_once_with("https://link0")
+        self.client.download_external_link.assert_not_called()
+
+    @patch("databricks_query_executor.pyarrow", None)
+    def test_execute_without_pyarrow(self):
+        self.client.databricks_api.return_value = {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+                                                   "manifest": {"schema": SCHEMA}}
+        executor = self.executors.StatementQueryExecutor(self.client, "w1", 60)
+        self.assertEqual(list(executor.execute("SELECT 1")), [])
+        self.assertEqual(self.client.databricks_api.call_args_list[0][1]["data"]["format"], "JSON_ARRAY")
@@ -0,0 +1,71 @@
+import declare
+import os
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the rate limiter shared by the searches."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.rate_limiter = import_module('databricks_rate_limiter')
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def test_get_endpoint_class(self):
+        self.assertEqual(self.rate_limiter.get_endpoint_class("post", "/api/2.0/jobs/runs/submit"), "submit")
+        self.assertEqual(self.rate_limiter.get_endpoint_class("post", "/api/2.0/sql/statements/"), "submit")
+        self.assertEqual(self.rate_limiter.get_endpoint_class("get", "/api/1.2/commands/status"), "default")
+        self.assertEqual(self.rate_limiter.get_endpoint_class("post", "/api/1.2/commands/cancel"), "default")
+
+    @patch("databricks_rate_limiter.time", autospec=True)
+    def test_waits_beyond_burst(self, mock_time):
+        mock_time.time.return_value = 1000
+        limiter = self.rate_limiter.RateLimiter("instance1", rates={"submit": 2, "default": 0})
+        self.assertEqual(limiter.acquire("submit"), 0)
+        self.assertEqual(limiter.acquire("submit"), 0)
+        # The other processes share the bucket and queue behind the reserved tokens
+        other = self.rate_limiter.RateLimiter("instance1", rates={"submit": 2, "default": 0})
+        self.assertEqual(other.acquire("submit"), 0.5)
+        self.assertEqual(limiter.acquire("submit"), 1.0)
+        mock_time.sleep.assert_called_with(1.0)
+        self.assertEqual(limiter.acquire("default"), 0)
+        bucket = limiter.state_file.read()["submit"]
+        self.assertEqual((bucket["requests"], bucket["waits"], bucket["wait_time"]), (4, 2, 1.5))
+
+    @patch("databricks_rate_limiter.time", autospec=True)
+    def test_refills_over_time(self, mock_time):
+        mock_time.time.return_value = 1000
+        limiter = self.rate_limiter.RateLimiter("instance1", rates={"default": 1})
+        self.assertEqual(limiter.acquire("default"), 0)
+        self.assertEqual(limiter.acquire("default"), 1.0)
+        mock_time.time.return_value = 1010
+        self.assertEqual(limiter.acquire("default"), 0)
+        self.assertEqual(limiter.acquire("default"), 1.0)
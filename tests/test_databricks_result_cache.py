@@ -0,0 +1,82 @@
+import declare
+import os
+import time
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+RECORDS = [{"field1": "1", "field2": None}, {"field1": "2", "field2": "b"}]
+
+
+class TestResultCache(unittest.TestCase):
+    """Test query result cache."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.result_cache = import_module('databricks_result_cache')
+        self.settings_patcher = patch("databricks_result_cache.utils.get_performance_settings",
+                                      return_value={"result_cache_max_size_mb": 1})
+        self.settings_patcher.start()
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def get_stats(self):
+        return import_module('databricks_shared_state').JsonStateFile("stats.json", "result_cache").read()
+
+    def test_normalize_query(self):
+        self.assertEqual(
+            self.result_cache.normalize_query("  SELECT *\n  FROM t\tWHERE name = 'a  b' ;"),
+            "SELECT * FROM t WHERE name = 'a  b'")
+
+    def test_key(self):
+        key = self.result_cache.get_key("A1", ["cluster", "c1"], "SELECT 1", 60)
+        self.assertEqual(key, self.result_cache.get_key("A1", ["cluster", "c1"], "SELECT  1;", 60))
+        self.assertNotEqual(key, self.result_cache.get_key("A2", ["cluster", "c1"], "SELECT 1", 60))
+        with patch("databricks_result_cache.time.time", return_value=time.time() + 60):
+            self.assertNotEqual(key, self.result_cache.get_key("A1", ["cluster", "c1"], "SELECT 1", 60))
+
+    def test_get_put(self):
+        self.assertIsNone(self.result_cache.get("key1"))
+        self.result_cache.put("key1", RECORDS)
+        self.assertEqual(self.result_cache.get("key1"), RECORDS)
+        self.assertEqual(self.get_stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(self.result_cache.get_stats(), {"hits": 1, "misses": 1})
+
+    def test_evict_least_recently_used(self):
+        records = [{"field1": os.urandom(250 * 1024).hex()}]
+        for key in ("key1", "key2", "key3"):
+            self.result_cache.put(key, records)
+            path = self.result_cache._get_entry_path(key)
+            os.utime(path, (time.time() - 10, time.time() - 10))
+        self.result_cache.get("key1")
+        self.result_cache.put("key4", records)
+        self.assertIsNotNone(self.result_cache.get("key1"))
+        self.assertIsNone(self.result_cache.get("key2"))
+        self.assertIsNotNone(self.result_cache.get("key4"))
@@ -0,0 +1,184 @@
+import declare
+import os
+import json
+import time
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+def get_run(run_id, end_time, result_state="SUCCESS"):
+    return {
+        "run_id": run_id,
+        "end_time": end_time,
+        "state": {"life_cycle_state": "TERMINATED", "result_state": result_state, "state_message": ""},
+    }
+
+
+class TestRunStatusCollector(unittest.TestCase):
+    """Test the collector of the run status."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.collector_module = import_module('databricks_run_status_collector')
+        self.created_time = time.time() - 600
+        self.collections = {
+            "databricks_submit_run_log": MagicMock(),
+            "databricks_execute_job_log": MagicMock(),
+        }
+        self.collections["databricks_submit_run_log"].data.query.return_value = [
+            {"_key": "k1", "_user": "nobody", "run_id": "1", "account_name": "A1", "created_time": self.created_time},
+            {"_key": "k2", "_user": "nobody", "run_id": "2", "account_name": "A1", "created_time": self.created_time},
+        ]
+        self.collections["databricks_execute_job_log"].data.query.return_value = [
+            {"_key": "k3", "run_id": "3", "account_name": "A1", "created_time": self.created_time + 60},
+        ]
+        self.service = MagicMock()
+        self.service.kvstore.__getitem__.side_effect = lambda name: self.collections[name]
+        self.client = MagicMock()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def get_collector(self):
+        return self.collector_module.RunStatusCollector(self.service, "session_key", "A1", self.client)
+
+    def test_collect(self):
+        self.client.databricks_api.side_effect = [
+            {"runs": [get_run(1, 1000), get_run(9, 1500)], "has_more": True},
+            {"runs": [get_run(3, 2000, "FAILED")], "has_more": True},
+            {"runs": [], "has_more": False},
+        ]
+        self.assertEqual(self.get_collector().collect(), 2)
+
+        args = self.client.databricks_api.call_args_list[0][1]["args"]
+        self.assertEqual(args["completed_only"], "true")
+        self.assertEqual(args["start_time_from"], int((self.created_time - 300) * 1000))
+        self.assertEqual(self.client.databricks_api.call_args_list[1][1]["args"]["offset"], 2)
+
+        query = json.loads(self.collections["databricks_submit_run_log"].data.query.call_args[1]["query"])
+        self.assertIn({"account_name": "A1"}, query["$and"])
+        self.assertIn({"life_cycle_state": {"$ne": "TERMINATED"}}, query["$and"])
+
+        self.collections["databricks_submit_run_log"].data.batch_save.assert_called_once()
+        entry = self.collections["databricks_submit_run_log"].data.batch_save.call_args[0][0]
+        self.assertEqual(entry["_key"], "k1")
+        self.assertNotIn("_user", entry)
+        self.assertEqual(entry["life_cycle_state"], "TERMINATED")
+        self.assertEqual(entry["result_state"], "SUCCESS")
+        entry = self.collections["databricks_execute_job_log"].data.batch_save.call_args[0][0]
+        self.assertEqual(entry["result_state"], "FAILED")
+        self.assertEqual(list(self.get_collector().checkpoint.read()["unmatched"]), ["2"])
+
+    def test_collect_stops_paging_once_all_runs_found(self):
+        self.client.databricks_api.side_effect = [
+            {"runs": [get_run(3, 2000), get_run(2, 500)], "has_more": True},
+            {"runs": [get_run(1, 100)], "has_more": True},
+        ]
+        self.assertEqual(self.get_collector().collect(), 3)
+        self.assertEqual(self.client.databricks_api.call_count, 2)
+        self.assertEqual(self.get_collector().checkpoint.read(), {})
+
+    def test_collect_applies_runs_completed_before_newer_runs(self):
+        self.client.databricks_api.return_value = {"runs": [get_run(3, 2000)]}
+        self.assertEqual(self.get_collector().collect(), 1)
+
+        # Run 1 completed before run 3, it is still applied by the next collection
+        self.collections["databricks_execute_job_log"].data.query.return_value = []
+        self.client.databricks_api.return_value = {"runs": [get_run(1, 1000)]}
+        self.assertEqual(self.get_collector().collect(), 1)
+        entry = self.collections["databricks_submit_run_log"].data.batch_save.call_args[0][0]
+        self.assertEqual(entry["_key"], "k1")
+
+    def set_runs(self, listed_runs, runs):
+        def databricks_api(method, endpoint, args=None):
+            if endpoint == "/api/2.0/jobs/runs/get":
+                run = runs[args["run_id"]]
+                if isinstance(run, Exception):
+                    raise run
+                return run
+            return {"runs": listed_runs}
+
+        self.client.databricks_api.side_effect = databricks_api
+
+    def test_collect_checks_runs_unmatched_for_long(self):
+        with self.get_collector().checkpoint.update() as checkpoint:
+            checkpoint["unmatched"] = {"1": time.time() - 90000, "2": time.time() - 60, "8": time.time() - 90000}
+        running = {"run_id": 1, "state": {"life_cycle_state": "RUNNING"}}
+        self.set_runs([get_run(1, 1000)], {"1": running})
+        self.assertEqual(self.get_collector().collect(), 0)
+
+        args = self.client.databricks_api.call_args[1]["args"]
+        self.assertEqual(args["start_time_from"], int((self.created_time - 300) * 1000))
+        self.collections["databricks_submit_run_log"].data.batch_save.assert_not_called()
+        unmatched = self.get_collector().checkpoint.read()["unmatched"]
+        # Run 8 is no longer pending in the KV store
+        self.assertEqual(sorted(unmatched), ["1", "2", "3"])
+
+        # Run 1 completes after more than a day
+        self.set_runs([], {"1": get_run(1, 1000, "FAILED")})
+        self.assertEqual(self.get_collector().collect(), 1)
+        entry = self.collections["databricks_submit_run_log"].data.batch_save.call_args[0][0]
+        self.assertEqual(entry["_key"], "k1")
+        self.assertEqual(entry["result_state"], "FAILED")
+        self.assertEqual(sorted(self.get_collector().checkpoint.read()["unmatched"]), ["2", "3"])
+
+    def test_collect_stops_looking_for_missing_runs(self):
+        with self.get_collector().checkpoint.update() as checkpoint:
+            checkpoint["unmatched"] = {"1": time.time() - 90000}
+        self.set_runs([], {"1": Exception("Run 1 does not exist.")})
+        self.assertEqual(self.get_collector().collect(), 0)
+        checkpoint = self.get_collector().checkpoint.read()
+        self.assertEqual(checkpoint["missing"], ["1"])
+        self.assertNotIn("1", checkpoint["unmatched"])
+
+        self.client.databricks_api.reset_mock()
+        self.get_collector().collect()
+        for call in self.client.databricks_api.call_args_list:
+            self.assertNotEqual(call[0][1], "/api/2.0/jobs/runs/get")
+
+    def test_collect_keeps_runs_unmatched_on_error(self):
+        with self.get_collector().checkpoint.update() as checkpoint:
+            checkpoint["unmatched"] = {"1": time.time() - 90000}
+        self.set_runs([], {"1": Exception("Internal server error.")})
+        self.get_collector().collect()
+        checkpoint = self.get_collector().checkpoint.read()
+        self.assertEqual(checkpoint["missing"], [])
+        self.assertIn("1", checkpoint["unmatched"])
+
+    def test_collect_without_pending_runs(self):
+        for collection in self.collections.values():
+            collection.data.query.return_value = []
+        self.assertEqual(self.get_collector().collect(), 0)
+        self.client.databricks_api.assert_not_called()
+
+    @patch("databricks_run_status_collector.const.KV_BATCH_SAVE_SIZE", 2)
+    def test_save_entries_in_batches(self):
+        entries = [{"_key": str(index)} for index in range(5)]
+        self.assertEqual(self.get_collector().save_entries("databricks_submit_run_log", entries), 5)
+        calls = self.collections["databricks_submit_run_log"].data.batch_save.call_args_list
+        self.assertEqual([len(call[0]) for call in calls], [2, 2, 1])
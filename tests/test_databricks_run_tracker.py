@@ -0,0 +1,75 @@
+import declare
+import unittest
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+def get_run(run_id, life_cycle_state, result_state=None):
+    state = {"life_cycle_state": life_cycle_state}
+    if result_state:
+        state["result_state"] = result_state
+    return {"run_id": run_id, "state": state}
+
+
+class TestRunTracker(unittest.TestCase):
+    """Test RunTracker."""
+
+    def setUp(self):
+        self.run_tracker = import_module('databricks_run_tracker')
+        self.client = MagicMock()
+        self.client.get_retry_after.return_value = None
+
+    @patch("databricks_com.time", autospec=True)
+    def test_wait_single_run(self, mock_time):
+        self.client.databricks_api.side_effect = [
+            get_run(1, "PENDING"), get_run(1, "RUNNING"), get_run(1, "TERMINATED", "SUCCESS"),
+            {"notebook_output": {"result": "42", "truncated": False}}]
+        runs, pending = self.run_tracker.RunTracker(self.client, 60).wait([1])
+        self.assertEqual(pending, set())
+        self.assertEqual(self.run_tracker.get_run_fields(runs[1]), {
+            "life_cycle_state": "TERMINATED", "result_state": "SUCCESS", "state_message": "-",
+            "notebook_result": "42"})
+        self.client.databricks_api.assert_called_with(
+            "get", "/api/2.0/jobs/runs/get-output", args={"run_id": 1})
+        self.assertEqual(mock_time.sleep.call_count, 2)
+
+    @patch("databricks_com.time", autospec=True)
+    def test_wait_many_runs(self, mock_time):
+        def databricks_api(method, endpoint, args=None):
+            if endpoint == "/api/2.0/jobs/runs/get":
+                return get_run(args["run_id"], "TERMINATED", "FAILED")
+            raise Exception("Retrieving the output of runs with multiple tasks is not supported.")
+
+        self.client.databricks_api.side_effect = databricks_api
+        runs, pending = self.run_tracker.RunTracker(self.client, 60).wait([1, 2])
+        self.assertEqual(pending, set())
+        self.assertEqual(runs[2]["notebook_output"], {})
+        self.assertEqual(self.run_tracker.get_run_fields(runs[2])["result_state"], "FAILED")
+
+    @patch("databricks_com.time", autospec=True)
+    def test_wait_timeout(self, mock_time):
+        self.client.databricks_api.return_value = get_run(1, "RUNNING")
+        runs, pending = self.run_tracker.RunTracker(self.client, 0.2).wait([1])
+        self.assertEqual(pending, {1})
+        self.assertEqual(self.run_tracker.get_run_fields(runs[1])["life_cycle_state"], "RUNNING")
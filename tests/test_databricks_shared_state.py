@@ -0,0 +1,82 @@
+import declare
+import os
+import json
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+class TestSharedState(unittest.TestCase):
+    """Test shared state helpers."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name}).start()
+        self.shared_state = import_module('databricks_shared_state')
+
+    def tearDown(self):
+        patch.dict(os.environ).stop()
+        self.splunk_home.cleanup()
+
+    def test_get_state_dir(self):
+        state_dir = self.shared_state.get_state_dir("cache")
+        app_name = import_module('databricks_const').APP_NAME
+        self.assertEqual(state_dir, os.path.join(self.splunk_home.name, "var", "run", app_name, "cache"))
+        self.assertTrue(os.path.isdir(state_dir))
+
+    def test_update_and_read(self):
+        store = self.shared_state.JsonStateFile("state.json")
+        self.assertEqual(store.read(), {})
+        with store.update() as state:
+            state["key"] = "value"
+        self.assertEqual(store.read(), {"key": "value"})
+        with open(store.path) as f:
+            self.assertEqual(json.load(f), {"key": "value"})
+
+    def test_update_not_saved_on_exception(self):
+        store = self.shared_state.JsonStateFile("state.json")
+        with self.assertRaises(ValueError):
+            with store.update() as state:
+                state["key"] = "value"
+                raise ValueError("error")
+        self.assertEqual(store.read(), {})
+
+    def test_lock_non_blocking(self):
+        path = os.path.join(self.shared_state.get_state_dir(), "test.lock")
+        lock1 = self.shared_state.FileLock(path)
+        lock2 = self.shared_state.FileLock(path)
+        self.assertTrue(lock1.acquire())
+        self.assertFalse(lock2.acquire(blocking=False))
+        lock1.release()
+        self.assertTrue(lock2.acquire(blocking=False))
+        lock2.release()
+
+    def test_lock_timeout(self):
+        path = os.path.join(self.shared_state.get_state_dir(), "test.lock")
+        lock1 = self.shared_state.FileLock(path)
+        lock2 = self.shared_state.FileLock(path, timeout=0.1)
+        with lock1:
+            with self.assertRaises(Exception) as context:
+                lock2.acquire()
+        self.assertEqual("Timed out while waiting for lock {}.".format(path), str(context.exception))
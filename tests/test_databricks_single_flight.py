@@ -0,0 +1,102 @@
+import declare
+import os
+import time
+import unittest
+import tempfile
+import threading
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+RECORDS = [{"field1": "1"}, {"field1": "2"}]
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test single-flight coalescing of identical queries."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.single_flight = import_module('databricks_single_flight')
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def get_flight(self, query="SELECT 1", timeout=10):
+        return self.single_flight.SingleFlight("A1", ["cluster", "c1"], query, timeout)
+
+    def test_is_shareable(self):
+        for query in ["SELECT 1", " -- comment\n(select * from t)", "/* a */ WITH t AS (SELECT 1) SELECT * FROM t",
+                      "SHOW TABLES", "describe t"]:
+            self.assertTrue(self.single_flight.is_shareable(query), query)
+        for query in ["INSERT INTO t VALUES (1)", "MERGE INTO t USING s ON t.a = s.a", "DELETE FROM t", "",
+                      "SELECT rand() FROM t", "SELECT * FROM t TABLESAMPLE (10 PERCENT)"]:
+            self.assertFalse(self.single_flight.is_shareable(query), query)
+
+    def test_leader(self):
+        flight = self.get_flight()
+        self.assertIsNone(flight.join())
+        self.assertTrue(flight.leader)
+        flight.leave()
+        self.assertIsNone(self.get_flight().join())
+
+    def test_follower_shares_leader_result(self):
+        leader = self.get_flight()
+        leader.join()
+        result = {}
+        follower = threading.Thread(target=lambda: result.update(records=self.get_flight("SELECT  1;").join()))
+        follower.start()
+        time.sleep(0.2)
+        leader.share(RECORDS)
+        leader.leave()
+        follower.join(5)
+        self.assertEqual(result["records"], RECORDS)
+
+    def test_follower_executes_when_leader_failed(self):
+        leader = self.get_flight()
+        leader.join()
+        result = {}
+        follower = threading.Thread(target=lambda: result.update(records=self.get_flight().join()))
+        follower.start()
+        time.sleep(0.2)
+        leader.leave()
+        follower.join(5)
+        self.assertIsNone(result["records"])
+
+    def test_follower_timeout(self):
+        leader = self.get_flight()
+        leader.join()
+        follower = self.get_flight(timeout=0.1)
+        self.assertIsNone(follower.join())
+        self.assertFalse(follower.leader)
+        leader.leave()
+
+    def test_leader_removes_previous_result(self):
+        leader = self.get_flight()
+        leader.join()
+        leader.share(RECORDS)
+        leader.leave()
+        self.get_flight().join()
+        self.assertFalse(os.path.exists(leader.spool_path))
@@ -0,0 +1,87 @@
+import declare
+import os
+import json
+import time
+import base64
+import unittest
+import tempfile
+from importlib import import_module
+from mock import patch, MagicMock
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'splunklib.client',
+        'splunklib.results',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+
+def tearDownModule():
+    patch.stopall()
+
+
+def make_token(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode("utf-8")).decode("utf-8").rstrip("=")
+    return "header.{}.signature".format(payload)
+
+
+class TestAadTokenManager(unittest.TestCase):
+    """Test AadTokenManager."""
+
+    def setUp(self):
+        self.splunk_home = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"SPLUNK_HOME": self.splunk_home.name})
+        self.env_patcher.start()
+        self.token_manager = import_module('databricks_token_manager')
+        self.manager = self.token_manager.AadTokenManager("session_key", "account", "tenant", "client", "secret")
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.splunk_home.cleanup()
+
+    def test_get_token_expiry(self):
+        self.assertEqual(self.token_manager.get_token_expiry(make_token(1700000000)), 1700000000)
+        self.assertIsNone(self.token_manager.get_token_expiry("opaque_token"))
+
+    @patch("databricks_token_manager.utils")
+    def test_get_token_not_expiring(self, mock_utils):
+        token = make_token(time.time() + 3600)
+        self.assertEqual(self.manager.get_token(token), token)
+        self.assertEqual(self.manager.get_token("opaque_token"), "opaque_token")
+        mock_utils.get_aad_access_token.assert_not_called()
+
+    @patch("databricks_token_manager.utils")
+    def test_get_token_refreshed_ahead_of_expiry(self, mock_utils):
+        token = make_token(time.time() + 60)
+        mock_utils.get_databricks_configs.return_value = {"aad_access_token": token}
+        mock_utils.get_aad_access_token.return_value = "new_token"
+        self.assertEqual(self.manager.get_token(token), "new_token")
+        mock_utils.save_databricks_aad_access_token.assert_called_once_with(
+            "account", "session_key", "new_token", "secret")
+
+    @patch("databricks_token_manager.utils")
+    def test_refresh_uses_token_refreshed_by_other_search(self, mock_utils):
+        new_token = make_token(time.time() + 3600)
+        mock_utils.get_databricks_configs.return_value = {"aad_access_token": new_token}
+        self.assertEqual(self.manager.refresh("stale_token"), new_token)
+        mock_utils.get_aad_access_token.assert_not_called()
+
+    @patch("databricks_token_manager.utils")
+    def test_refresh_error(self, mock_utils):
+        mock_utils.get_databricks_configs.return_value = {"aad_access_token": "stale_token"}
+        mock_utils.get_aad_access_token.return_value = ("Invalid client secret.", False)
+        with self.assertRaises(Exception) as context:
+            self.manager.refresh("stale_token")
+        self.assertEqual("Invalid client secret.", str(context.exception))
+        mock_utils.save_databricks_aad_access_token.assert_not_called()
@@ -157,7 +157,7 @@ class TestDatabricksUtils(unittest.TestCase):
     
     @patch("databricks_validators.utils.get_proxy_uri", return_value=None)
     @patch("databricks_validators.Validator.put_msg", return_value=MagicMock())
-    @patch("requests.get", return_value=Response(500))
+    @patch("requests.Session.get", return_value=Response(500))
     @patch("databricks_common_utils.get_user_agent")
     def test_validate_instance_false(self, mock_user_agent, mock_get, mock_put, mock_proxy):
         db_val = import_module('databricks_validators')
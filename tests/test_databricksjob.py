@@ -162,8 +162,54 @@ class TestDatabricksjob(unittest.TestCase):
         self.assertEqual(client.databricks_api.call_count,3)
         mock_utils.update_kv_store_collection.assert_called_once()
         assert return_val == ret_val
-    
 
+    @patch("databricks_run_tracker.RunTracker", autospec=True)
+    @patch("databricksjob.com.DatabricksClient", autospec=True)
+    @patch("databricksjob.utils", autospec=True)
+    def test_wait_for_completion(self, mock_utils, mock_com, mock_tracker):
+        db_job_obj = self.DatabricksJobCommand()
+        db_job_obj._metadata = MagicMock()
+        db_job_obj.job_id = "123"
+        db_job_obj.wait = True
+        db_job_obj.command_timeout = 600
+        client = mock_com.return_value = MagicMock()
+        db_job_obj.write_error = MagicMock()
+        db_job_obj.write_warning = MagicMock()
+        client.databricks_api.side_effect = [{"settings": {"notebook_task": "test"}}, {"run_id": "1234"}, {"run_page_url": "/test/"}]
+        def wait(run_ids):
+            # The submission is logged before waiting
+            mock_utils.update_kv_store_collection.assert_called_once()
+            return ({"1234": {
+                "state": {"life_cycle_state": "TERMINATED", "result_state": "SUCCESS", "state_message": ""},
+                "notebook_output": {"result": "done"}}}, set())
+        mock_tracker.return_value.wait.side_effect = wait
+        resp = db_job_obj.generate()
+        next(resp)
+        mock_tracker.assert_called_once_with(client, 600)
+        self.assertEqual(mock_utils.update_kv_store_collection.call_count, 2)
+        kv_log_info = mock_utils.update_kv_store_collection.call_args[0][3]
+        self.assertEqual(mock_utils.update_kv_store_collection.call_args[1]["key"], kv_log_info["_key"])
+        self.assertEqual(kv_log_info["result_state"], "SUCCESS")
+        self.assertEqual(kv_log_info["notebook_result"], "done")
+        db_job_obj.write_warning.assert_not_called()
+        db_job_obj.write_error.assert_not_called()
 
-    
-    
\ No newline at end of file
+    @patch("databricks_run_tracker.RunTracker", autospec=True)
+    @patch("databricksjob.com.DatabricksClient", autospec=True)
+    @patch("databricksjob.utils", autospec=True)
+    def test_wait_for_completion_error(self, mock_utils, mock_com, mock_tracker):
+        db_job_obj = self.DatabricksJobCommand()
+        db_job_obj._metadata = MagicMock()
+        db_job_obj.job_id = "123"
+        db_job_obj.wait = True
+        client = mock_com.return_value = MagicMock()
+        db_job_obj.write_error = MagicMock()
+        db_job_obj.write_warning = MagicMock()
+        client.databricks_api.side_effect = [{"settings": {"notebook_task": "test"}}, {"run_id": "1234"}, {"run_page_url": "/test/"}]
+        mock_tracker.return_value.wait.side_effect = Exception("Service unavailable")
+        mock_utils.update_kv_store_collection.side_effect = lambda uri, name, key, kv_log_info, **kwargs: kv_log_info
+        resp = db_job_obj.generate()
+        self.assertEqual(next(resp)["command_status"], "Success")
+        mock_utils.update_kv_store_collection.assert_called_once()
+        db_job_obj.write_warning.assert_called_once_with("Unable to get the state of run 1234: Service unavailable")
+        db_job_obj.write_error.assert_not_called()
@@ -0,0 +1,133 @@
+import declare
+import unittest
+from mock import patch, MagicMock
+
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+def tearDownModule():
+    patch.stopall()
+
+class TestDatabricksLookupCommand(unittest.TestCase):
+    """Test databrickslookup."""
+
+    @classmethod
+    def setUp(cls):
+        import databrickslookup
+        cls.databrickslookup = databrickslookup
+        cls.DatabricksLookupCommand = databrickslookup.DatabricksLookupCommand
+
+    def get_command(self, **options):
+        lookup_obj = self.DatabricksLookupCommand()
+        lookup_obj._metadata = MagicMock()
+        lookup_obj.write_error = MagicMock()
+        lookup_obj.account_name = "A1"
+        lookup_obj.table = "main.assets.owners"
+        lookup_obj.key_field = "host"
+        for name, value in options.items():
+            setattr(lookup_obj, name, value)
+        return lookup_obj
+
+    @patch("databrickslookup.executors.StatementQueryExecutor", autospec=True)
+    @patch("databrickslookup.com.DatabricksClient", autospec=True)
+    @patch("databrickslookup.utils", autospec=True)
+    def test_batched_lookup(self, mock_utils, mock_com, mock_executor):
+        mock_utils.get_databricks_configs.return_value = {"warehouse_id": "w1"}
+        rows = {"h1": [{"host": "h1", "owner": "alice"}],
+                "h2": [{"host": "h2", "owner": "bob"}, {"host": "h2", "owner": "carol"}]}
+        mock_executor.return_value.execute.side_effect = lambda query: iter(
+            [dict(row) for key, key_rows in rows.items() if "'{}'".format(key) in query for row in key_rows])
+        lookup_obj = self.get_command(batch_size=2)
+        records = [{"host": "h1"}, {"host": "h2"}, {"host": "h1"}, {"host": "h3"}, {"user": "u1"}]
+        resp = list(lookup_obj.stream(iter(records)))
+        self.assertEqual(resp, [
+            {"host": "h1", "owner": "alice"},
+            {"host": "h2", "owner": ["bob", "carol"]},
+            {"host": "h1", "owner": "alice"},
+            {"host": "h3"},
+            {"user": "u1"}])
+        queries = [call[0][0] for call in mock_executor.return_value.execute.call_args_list]
+        self.assertEqual(queries, [
+            "SELECT * FROM main.assets.owners WHERE `host` IN ('h1', 'h2')",
+            "SELECT * FROM main.assets.owners WHERE `host` IN ('h3')"])
+        mock_executor.assert_called_once()
+        lookup_obj.write_error.assert_not_called()
+
+    @patch("databrickslookup.executors.StatementQueryExecutor", autospec=True)
+    @patch("databrickslookup.com.DatabricksClient", autospec=True)
+    @patch("databrickslookup.utils", autospec=True)
+    def test_multivalue_and_numeric_keys(self, mock_utils, mock_com, mock_executor):
+        mock_utils.get_databricks_configs.return_value = {"warehouse_id": "w1"}
+        rows = {"h1": [{"host": "h1", "owner": "alice"}], "h2": [{"host": "h2", "owner": "bob"}],
+                "7": [{"host": "7", "owner": "dave"}]}
+        mock_executor.return_value.execute.side_effect = lambda query: iter(
+            [dict(row) for key, key_rows in rows.items() if "'{}'".format(key) in query for row in key_rows])
+        lookup_obj = self.get_command()
+        records = [{"host": ["h1", "h2", "h1"]}, {"host": 7}]
+        resp = list(lookup_obj.stream(iter(records)))
+        self.assertEqual(resp, [
+            {"host": ["h1", "h2"], "owner": ["alice", "bob"]},
+            {"host": "7", "owner": "dave"}])
+        mock_executor.return_value.execute.assert_called_once_with(
+            "SELECT * FROM main.assets.owners WHERE `host` IN ('7', 'h1', 'h2')")
+
+    @patch("databrickslookup.executors.StatementQueryExecutor", autospec=True)
+    @patch("databrickslookup.com.DatabricksClient", autospec=True)
+    @patch("databrickslookup.utils", autospec=True)
+    def test_cache_across_chunks(self, mock_utils, mock_com, mock_executor):
+        mock_utils.get_databricks_configs.return_value = {"warehouse_id": "w1"}
+        mock_executor.return_value.execute.side_effect = lambda query: iter([{"asset": "h1", "risk": 5}])
+        lookup_obj = self.get_command(key_column="asset", columns="risk")
+        list(lookup_obj.stream(iter([{"host": "h1"}])))
+        resp = list(lookup_obj.stream(iter([{"host": "h1"}])))
+        self.assertEqual(resp, [{"host": "h1", "asset": "h1", "risk": 5}])
+        mock_executor.return_value.execute.assert_called_once_with(
+            "SELECT `risk`, `asset` FROM main.assets.owners WHERE `asset` IN ('h1')")
+
+    @patch("databrickslookup.time.time")
+    @patch("databrickslookup.executors.StatementQueryExecutor", autospec=True)
+    @patch("databrickslookup.com.DatabricksClient", autospec=True)
+    @patch("databrickslookup.utils", autospec=True)
+    def test_cache_expiry(self, mock_utils, mock_com, mock_executor, mock_time):
+        mock_utils.get_databricks_configs.return_value = {"warehouse_id": "w1"}
+        mock_executor.return_value.execute.side_effect = lambda query: iter([])
+        mock_time.return_value = 1000
+        lookup_obj = self.get_command(cache_ttl=60)
+        list(lookup_obj.stream(iter([{"host": "h1"}])))
+        mock_time.return_value = 1061
+        list(lookup_obj.stream(iter([{"host": "h1"}])))
+        self.assertEqual(mock_executor.return_value.execute.call_count, 2)
+
+    @patch("databrickslookup.ContextRegistry", autospec=True)
+    @patch("databrickslookup.executors.ClusterQueryExecutor", autospec=True)
+    @patch("databrickslookup.com.DatabricksClient", autospec=True)
+    @patch("databrickslookup.utils", autospec=True)
+    def test_cluster_lookup(self, mock_utils, mock_com, mock_executor, mock_registry):
+        mock_utils.get_databricks_configs.return_value = {"cluster_name": "test_cluster"}
+        mock_com.return_value.get_cluster_id.return_value = "c1"
+        mock_executor.return_value.execute.side_effect = lambda query: iter([])
+        lookup_obj = self.get_command()
+        self.assertEqual(list(lookup_obj.stream(iter([{"host": "it's"}]))), [{"host": "it's"}])
+        mock_com.return_value.get_cluster_id.assert_called_once_with("test_cluster")
+        mock_executor.return_value.execute.assert_called_once_with(
+            "SELECT * FROM main.assets.owners WHERE `host` IN ('it\\'s')")
+
+    def test_invalid_table(self):
+        lookup_obj = self.get_command(table="t; DROP TABLE t")
+        self.assertEqual(list(lookup_obj.stream(iter([{"host": "h1"}]))), [])
+        lookup_obj.write_error.assert_called_once_with("Invalid table name t; DROP TABLE t.")
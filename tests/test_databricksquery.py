@@ -1,10 +1,16 @@
 import declare
+import os
 import unittest
+import tempfile
 from mock import patch, MagicMock
 
 mocked_modules = {}
+splunk_home = None
 def setUpModule():
-    global mocked_modules
+    global mocked_modules, splunk_home
+
+    splunk_home = tempfile.TemporaryDirectory()
+    patch.dict(os.environ, {"SPLUNK_HOME": splunk_home.name}).start()
 
     module_to_be_mocked = [
         'log_manager',
@@ -13,7 +19,8 @@ def setUpModule():
         'splunk.clilib',
         'solnlib.server_info',
         'splunk_aoblib',
-        'splunk_aoblib.rest_migration'
+        'splunk_aoblib.rest_migration',
+        'splunktalib.common.log'
     ]
 
     mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
@@ -21,9 +28,13 @@ def setUpModule():
     for module, magicmock in mocked_modules.items():
         patch.dict('sys.modules', **{module: magicmock}).start()
 
+    # Identical queries of the tests are not coalesced
+    patch("databricksquery.SingleFlight", **{"return_value.join.return_value": None}).start()
+
 
 def tearDownModule():
     patch.stopall()
+    splunk_home.cleanup()
 
 class TestDatabricksQuery(unittest.TestCase):
     """Test databricksquery."""
@@ -38,6 +49,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_cluster_exception(self, mock_utils):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.write_error = MagicMock()
         mock_utils.get_databricks_configs.return_value = {"type": "pat"}
         resp = db_query_obj.generate()
@@ -53,6 +65,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_get_cluster_id_exception(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.write_error = MagicMock()
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
@@ -65,11 +78,27 @@ class TestDatabricksQuery(unittest.TestCase):
         client.get_cluster_id.assert_called_once()
         db_query_obj.write_error.assert_called_once_with("error getting cluster id")
     
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_single_target_names_stripped(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.account_name = " A1 "
+        db_query_obj.cluster = " test_cluster "
+        client = mock_com.return_value = MagicMock()
+        client.get_cluster_id.side_effect = Exception("error getting cluster id")
+        db_query_obj.write_error = MagicMock()
+        list(db_query_obj.generate())
+        self.assertEqual(mock_com.call_args[0][0], "A1")
+        client.get_cluster_id.assert_called_once_with("test_cluster")
+
     @patch("databricksquery.com.DatabricksClient", autospec=True)
     @patch("databricksquery.utils", autospec=True)
     def test_create_context_exception(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -88,6 +117,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_submit_query_exception(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -107,6 +137,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_fetch_data_exception(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -126,6 +157,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_fetch_data_status_error(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -145,6 +177,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_fetch_data_status_finished_error(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -164,6 +197,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_fetch_data_status_finished_not_table(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -183,6 +217,7 @@ class TestDatabricksQuery(unittest.TestCase):
     def test_fetch_data_status_finished_truncated(self, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -200,10 +235,11 @@ class TestDatabricksQuery(unittest.TestCase):
     
     @patch("databricksquery.com.DatabricksClient", autospec=True)
     @patch("databricksquery.utils", autospec=True)
-    @patch("databricksquery.time", autospec=True)
+    @patch("databricks_com.time", autospec=True)
     def test_fetch_data_status_finished_loop(self,mock_time, mock_utils, mock_com):
         db_query_obj = self.DatabricksQueryCommand()
         db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
         db_query_obj.cluster = "test_cluster"
         client = mock_com.return_value = MagicMock()
         client.get_cluster_id.return_value = "c1"
@@ -219,4 +255,260 @@ class TestDatabricksQuery(unittest.TestCase):
         self.assertEqual(client.databricks_api.call_count,4)
         db_query_obj.write_warning.assert_called_once_with("Results are truncated due to Databricks API limitations.")
         self.assertEqual(row1 , {'field1': '1', 'field2': '2'})
-        self.assertEqual(row2 , {'field1': '3', 'field2': '4'})
\ No newline at end of file
+        self.assertEqual(row2 , {'field1': '3', 'field2': '4'})
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_warehouse_streams_results(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.warehouse_id = "w1"
+        client = mock_com.return_value = MagicMock()
+        client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": {"columns": [{"name": "field1"}, {"name": "field2"}]}},
+             "result": {"external_links": [{"chunk_index": 0, "external_link": "https://link0"}]}}]
+        client.download_external_link.return_value = [["1", "2"], ["3", "4"]]
+        db_query_obj.write_error = MagicMock()
+        resp = db_query_obj.generate()
+        row1 = next(resp)
+        row2 = next(resp)
+        self.assertEqual(row1 , {'field1': '1', 'field2': '2'})
+        self.assertEqual(row2 , {'field1': '3', 'field2': '4'})
+        client.get_cluster_id.assert_not_called()
+        mock_utils.get_databricks_configs.assert_not_called()
+        db_query_obj.write_error.assert_not_called()
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_cluster_id_skips_lookup(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.cluster_id = "c1"
+        client = mock_com.return_value = MagicMock()
+        client.databricks_api.side_effect = [{"id": "context1"},
+            {"id": "command_id1"},
+            {"status":"Finished", "results": {"data": [["1", "2"]],"resultType": "table", "truncated": False, "schema":[{"name": "field1"},{"name": "field2"}]}},
+            {}]
+        db_query_obj.write_error = MagicMock()
+        resp = db_query_obj.generate()
+        row1 = next(resp)
+        self.assertEqual(row1 , {'field1': '1', 'field2': '2'})
+        client.get_cluster_id.assert_not_called()
+        mock_utils.get_databricks_configs.assert_not_called()
+        client.databricks_api.assert_called_with("post", "/api/1.2/contexts/destroy", data={"contextId": "context1", "clusterId": "c1"})
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_sql_backend_uses_account_warehouse(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.backend = "sql"
+        db_query_obj.wait_timeout = 0
+        mock_utils.get_databricks_configs.return_value = {"warehouse_id": "w2"}
+        client = mock_com.return_value = MagicMock()
+        client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": {"columns": [{"name": "field1"}]}},
+             "result": {"data_array": [["1"]]}}]
+        db_query_obj.write_error = MagicMock()
+        resp = db_query_obj.generate()
+        row1 = next(resp)
+        self.assertEqual(row1 , {'field1': '1'})
+        payload = client.databricks_api.call_args_list[0][1]["data"]
+        self.assertEqual(payload["warehouse_id"], "w2")
+        self.assertEqual(payload["wait_timeout"], "0s")
+        db_query_obj.write_error.assert_not_called()
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_sql_backend_warehouse_exception(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.backend = "sql"
+        mock_utils.get_databricks_configs.return_value = {"cluster_name": "test_cluster"}
+        db_query_obj.write_error = MagicMock()
+        resp = db_query_obj.generate()
+        try:
+            next(resp)
+        except StopIteration:
+            pass
+        mock_com.assert_not_called()
+        db_query_obj.write_error.assert_called_once_with("Databricks SQL warehouse is required to execute this custom command with sql backend. Provide a warehouse_id parameter or configure the warehouse in the TA's configuration page.")
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_sql_backend_invalid_wait_timeout(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.warehouse_id = "w1"
+        db_query_obj.wait_timeout = 3
+        db_query_obj.write_error = MagicMock()
+        resp = db_query_obj.generate()
+        try:
+            next(resp)
+        except StopIteration:
+            pass
+        mock_com.assert_not_called()
+        db_query_obj.write_error.assert_called_once_with("Wait timeout must be 0 or between 5 and 50 seconds.")
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_multiple_accounts(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.account_name = "A1, A2"
+        db_query_obj.backend = "sql"
+        mock_utils.get_performance_settings.return_value = {"fan_out_max_workers": 2, "single_flight_enabled": False}
+        mock_utils.get_databricks_configs_bulk.return_value = {
+            "A1": {"warehouse_id": "w1"}, "A2": {"warehouse_id": "w2"}}
+        client = mock_com.return_value = MagicMock()
+        client.databricks_api.side_effect = lambda method, endpoint, data=None, args=None: {
+            "statement_id": data["warehouse_id"], "status": {"state": "SUCCEEDED"},
+            "manifest": {"schema": {"columns": [{"name": "field1"}]}},
+            "result": {"data_array": [[data["warehouse_id"]]]}}
+        db_query_obj.write_error = MagicMock()
+        rows = list(db_query_obj.generate())
+        self.assertEqual(sorted(rows, key=lambda row: row["field1"]), [
+            {"field1": "w1", "databricks_account": "A1"}, {"field1": "w2", "databricks_account": "A2"}])
+        mock_utils.get_databricks_configs_bulk.assert_called_once()
+        mock_utils.get_databricks_configs.assert_not_called()
+        db_query_obj.write_error.assert_not_called()
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_multiple_accounts_not_found(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.account_name = "A1,A2"
+        mock_utils.get_databricks_configs_bulk.return_value = {"A1": {"cluster_name": "test_cluster"}}
+        db_query_obj.write_error = MagicMock()
+        self.assertEqual(list(db_query_obj.generate()), [])
+        mock_com.assert_not_called()
+        db_query_obj.write_error.assert_called_once_with(
+            "Account 'A2' not found. Please provide valid Databricks account.")
+
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_multiple_accounts_with_cluster_id(self, mock_utils, mock_com):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.account_name = "A1,A2"
+        db_query_obj.cluster_id = "c1"
+        db_query_obj.write_error = MagicMock()
+        self.assertEqual(list(db_query_obj.generate()), [])
+        db_query_obj.write_error.assert_called_once_with(
+            "The cluster_id and warehouse_id parameters can not be used with multiple accounts or clusters.")
+
+    @patch("databricksquery.result_cache", autospec=True)
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_cache_hit(self, mock_utils, mock_com, mock_cache):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.warehouse_id = "w1"
+        db_query_obj.cache_ttl = 60
+        mock_cache.get.return_value = [{"field1": "1"}]
+        mock_cache.get_stats.return_value = {"hits": 3, "misses": 1}
+        db_query_obj.write_error = MagicMock()
+        db_query_obj.write_info = MagicMock()
+        self.assertEqual(list(db_query_obj.generate()), [{"field1": "1"}])
+        mock_com.assert_not_called()
+        mock_cache.put.assert_not_called()
+        db_query_obj.write_info.assert_called_once_with(
+            "Returning 1 cached record(s). Result cache hits=3, misses=1.")
+
+    @patch("databricksquery.result_cache", autospec=True)
+    @patch("databricksquery.com.DatabricksClient", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_cache_miss(self, mock_utils, mock_com, mock_cache):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj.query = "SELECT 1"
+        db_query_obj.warehouse_id = "w1"
+        db_query_obj.cache_ttl = 60
+        mock_cache.get.return_value = None
+        mock_cache.get_key.return_value = "key1"
+        client = mock_com.return_value = MagicMock()
+        client.databricks_api.side_effect = [
+            {"statement_id": "s1", "status": {"state": "SUCCEEDED"},
+             "manifest": {"schema": {"columns": [{"name": "field1"}]}},
+             "result": {"data_array": [["1"]]}}]
+        mock_cache.get_stats.return_value = {"hits": 3, "misses": 2}
+        db_query_obj.write_error = MagicMock()
+        db_query_obj.write_info = MagicMock()
+        self.assertEqual(list(db_query_obj.generate()), [{"field1": "1"}])
+        mock_cache.put.assert_called_once_with("key1", [{"field1": "1"}])
+        db_query_obj.write_info.assert_called_once_with(
+            "Result not cached, executing the query. Result cache hits=3, misses=2.")
+
+    @patch("databricksquery.result_cache", autospec=True)
+    @patch("databricksquery.utils", autospec=True)
+    def test_cache_key_of_relative_time_range(self, mock_utils, mock_cache):
+        mock_cache.get.return_value = [{"field1": "1"}]
+        mock_cache.get_stats.return_value = {"hits": 1, "misses": 0}
+        keys = []
+        for earliest_time, latest_time in ((1700000005.25, 1700086405.25), (1700000015.75, 1700086415.75),
+                                           (1700000065.5, 1700086465.5)):
+            db_query_obj = self.DatabricksQueryCommand()
+            db_query_obj._metadata = MagicMock()
+            db_query_obj._metadata.searchinfo.earliest_time = earliest_time
+            db_query_obj._metadata.searchinfo.latest_time = latest_time
+            db_query_obj.query = "SELECT * FROM t"
+            db_query_obj.warehouse_id = "w1"
+            db_query_obj.time_column = "event_time"
+            db_query_obj.cache_ttl = 60
+            db_query_obj.write_error = MagicMock()
+            db_query_obj.write_info = MagicMock()
+            self.assertEqual(list(db_query_obj.generate()), [{"field1": "1"}])
+            keys.append(mock_cache.get_key.call_args[0])
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[1], keys[2])
+        self.assertEqual(keys[0][2], "SELECT * FROM t")
+
+    def test_time_range_key_without_time_range(self):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj._metadata.searchinfo.earliest_time = 1700000005
+        db_query_obj._metadata.searchinfo.latest_time = 0
+        self.assertEqual(db_query_obj.get_time_range_key("SELECT * FROM t", 60), [])
+        self.assertEqual(
+            db_query_obj.get_time_range_key("SELECT * FROM t WHERE ts >= {{earliest}}", 60), [None, 28333333, None])
+
+    def test_time_range_placeholders(self):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj._metadata.searchinfo.earliest_time = 1700000000.5
+        db_query_obj._metadata.searchinfo.latest_time = 0
+        query = db_query_obj.apply_time_range("SELECT * FROM t WHERE ts >= {{earliest}} AND ts < {{latest}}")
+        self.assertEqual(
+            query,
+            "SELECT * FROM t WHERE ts >= timestamp_seconds(1700000000.500000) AND ts < current_timestamp()")
+
+    def test_time_range_time_column(self):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj._metadata.searchinfo.earliest_time = 1700000000
+        db_query_obj._metadata.searchinfo.latest_time = 1700003600
+        db_query_obj.time_column = "event_time"
+        query = db_query_obj.apply_time_range("SELECT * FROM t;")
+        self.assertEqual(
+            query,
+            "SELECT * FROM (SELECT * FROM t) AS splunk_query WHERE `event_time` >= "
+            "timestamp_seconds(1700000000.000000) AND `event_time` < timestamp_seconds(1700003600.000000)")
+
+    def test_time_range_all_time(self):
+        db_query_obj = self.DatabricksQueryCommand()
+        db_query_obj._metadata = MagicMock()
+        db_query_obj._metadata.searchinfo.earliest_time = 0
+        db_query_obj._metadata.searchinfo.latest_time = 0
+        db_query_obj.time_column = "event_time"
+        self.assertEqual(db_query_obj.apply_time_range("SELECT * FROM t"), "SELECT * FROM t")
@@ -0,0 +1,95 @@
+import declare
+import unittest
+from mock import patch, MagicMock
+
+
+mocked_modules = {}
+def setUpModule():
+    global mocked_modules
+
+    module_to_be_mocked = [
+        'log_manager',
+        'splunk',
+        'splunk.rest',
+        'splunk.clilib',
+        'solnlib.server_info',
+    ]
+
+    mocked_modules = {module: MagicMock() for module in module_to_be_mocked}
+
+    for module, magicmock in mocked_modules.items():
+        patch.dict('sys.modules', **{module: magicmock}).start()
+
+def tearDownModule():
+    patch.stopall()
+
+class TestDatabricksReapContextCommand(unittest.TestCase):
+    """Test databricksreapcontext."""
+
+    @classmethod
+    def setUp(cls):
+        import databricksreapcontext
+        cls.databricksreapcontext = databricksreapcontext
+        cls.DatabricksReapContextCommand = databricksreapcontext.DatabricksReapContextCommand
+
+    def get_command(self):
+        reap_obj = self.DatabricksReapContextCommand()
+        reap_obj._metadata = MagicMock()
+        reap_obj.write_error = MagicMock()
+        return reap_obj
+
+    @patch("databricksreapcontext.evict_expired_contexts", return_value=[])
+    @patch("databricksreapcontext.ContextRegistry")
+    @patch("databricksreapcontext.com.DatabricksClient")
+    def test_reap_contexts(self, mock_client, mock_registry, mock_evict):
+        registry = mock_registry.return_value
+        registry.get_expired.return_value = [
+            {"_key": "ctx1", "account_name": "A1", "cluster_id": "c1", "context_id": "ctx1", "sid": "s1"},
+            {"_key": "ctx2", "account_name": "A1", "cluster_id": "c1", "context_id": "ctx2", "sid": "s2"},
+        ]
+        resp = list(self.get_command().generate())
+        self.assertEqual([r["status"] for r in resp], ["Destroyed", "Destroyed"])
+        self.assertEqual(mock_client.call_count, 1)
+        mock_client.return_value.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx2", "clusterId": "c1"})
+        self.assertEqual(registry.unregister.call_count, 2)
+
+    @patch("databricksreapcontext.evict_expired_contexts", return_value=[])
+    @patch("databricksreapcontext.time.time", return_value=1000)
+    @patch("databricksreapcontext.ContextRegistry")
+    @patch("databricksreapcontext.com.DatabricksClient")
+    def test_reap_contexts_failure(self, mock_client, mock_registry, mock_time, mock_evict):
+        registry = mock_registry.return_value
+        registry.get_expired.return_value = [
+            {"_key": "ctx1", "account_name": "A1", "cluster_id": "c1", "context_id": "ctx1", "expires_time": 900},
+            {"_key": "ctx2", "account_name": "A1", "cluster_id": "c1", "context_id": "ctx2",
+             "expires_time": 1000 - 86400},
+        ]
+        mock_client.return_value.databricks_api.side_effect = Exception("Cluster not running.")
+        resp = list(self.get_command().generate())
+        self.assertEqual([r["status"] for r in resp], ["Failed: Cluster not running."] * 2)
+        registry.unregister.assert_called_once_with("ctx2")
+
+    @patch("databricksreapcontext.evict_expired_contexts", return_value=[])
+    @patch("databricksreapcontext.ContextRegistry")
+    def test_reap_contexts_registry_error(self, mock_registry, mock_evict):
+        mock_registry.return_value.get_expired.side_effect = Exception("KV store is down.")
+        reap_obj = self.get_command()
+        self.assertEqual(list(reap_obj.generate()), [])
+        reap_obj.write_error.assert_called_once_with(
+            "Unable to read the registered execution contexts: KV store is down.")
+
+    @patch("databricksreapcontext.utils.get_performance_settings", return_value={"context_pool_idle_timeout": 600})
+    @patch("databricksreapcontext.evict_expired_contexts")
+    @patch("databricksreapcontext.ContextRegistry")
+    @patch("databricksreapcontext.com.DatabricksClient")
+    def test_reap_pooled_contexts(self, mock_client, mock_registry, mock_evict, mock_settings):
+        mock_registry.return_value.get_expired.return_value = []
+        mock_evict.return_value = [("A1", "c1", "ctx1"), ("A2", "c2", "ctx2")]
+        mock_client.return_value.databricks_api.side_effect = [{}, Exception("Cluster not running.")]
+        resp = list(self.get_command().generate())
+        mock_evict.assert_called_once_with(600)
+        self.assertEqual([(r["context_id"], r["status"]) for r in resp],
+                         [("ctx1", "Destroyed"), ("ctx2", "Failed: Cluster not running.")])
+        mock_client.return_value.databricks_api.assert_called_with(
+            "post", "/api/1.2/contexts/destroy", data={"contextId": "ctx2", "clusterId": "c2"})
@@ -177,4 +177,48 @@ class TestDatabricksrun(unittest.TestCase):
         return_val  = next(resp)
         self.assertEqual(client.databricks_api.call_count,2)
         mock_utils.update_kv_store_collection.assert_called_once()
-        assert return_val == ret_val
\ No newline at end of file
+        assert return_val == ret_val
+    @patch("databricksrun.com.DatabricksClient", autospec=True)
+    @patch("databricksrun.utils", autospec=True)
+    def test_cluster_id_skips_lookup(self, mock_utils, mock_com):
+        db_run_obj = self.DatabricksRunCommand()
+        db_run_obj._metadata = MagicMock()
+        db_run_obj.notebook_path = "/test"
+        db_run_obj.cluster_id = " c1 "
+        client = mock_com.return_value = MagicMock()
+        mock_utils.format_to_json_parameters.return_value = {}
+        db_run_obj.write_error = MagicMock()
+        client.databricks_api.side_effect = [{"run_id": "123"},{"run_page_url": "/test/"}]
+        resp = db_run_obj.generate()
+        next(resp)
+        client.get_cluster_id.assert_not_called()
+        mock_utils.get_databricks_configs.assert_not_called()
+        self.assertEqual(client.databricks_api.call_args_list[0][1]["data"]["existing_cluster_id"], "c1")
+
+    @patch("databricks_run_tracker.RunTracker", autospec=True)
+    @patch("databricksrun.com.DatabricksClient", autospec=True)
+    @patch("databricksrun.utils", autospec=True)
+    def test_wait_for_completion(self, mock_utils, mock_com, mock_tracker):
+        db_run_obj = self.DatabricksRunCommand()
+        db_run_obj._metadata = MagicMock()
+        db_run_obj.notebook_path = "/test"
+        db_run_obj.cluster_id = "c1"
+        db_run_obj.wait = True
+        client = mock_com.return_value = MagicMock()
+        mock_utils.format_to_json_parameters.return_value = {}
+        db_run_obj.write_error = MagicMock()
+        db_run_obj.write_warning = MagicMock()
+        client.databricks_api.side_effect = [{"run_id": "123"}, {"run_page_url": "/test/"}]
+        mock_tracker.return_value.wait.return_value = (
+            {"123": {"state": {"life_cycle_state": "RUNNING"}}}, {"123"})
+        resp = db_run_obj.generate()
+        next(resp)
+        mock_tracker.assert_called_once_with(client, 3600)
+        mock_tracker.return_value.wait.assert_called_once_with(["123"])
+        self.assertEqual(mock_utils.update_kv_store_collection.call_count, 2)
+        kv_log_info = mock_utils.update_kv_store_collection.call_args[0][3]
+        self.assertEqual(mock_utils.update_kv_store_collection.call_args[1]["key"], kv_log_info["_key"])
+        self.assertEqual(kv_log_info["life_cycle_state"], "RUNNING")
+        self.assertEqual(kv_log_info["notebook_result"], "-")
+        self.assertEqual(kv_log_info["command_status"], "Success")
+        db_run_obj.write_warning.assert_called_once_with("Run 123 did not complete within 3600 seconds.")